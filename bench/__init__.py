@@ -0,0 +1,7 @@
+"""
+Gas and storage benchmarks for the market and share contracts.
+
+Runs fixed scenarios against a local Tezos sandbox and records, per
+entrypoint call, the gas consumed, the storage bytes paid and the size of
+the signed operation. See docs/BENCHMARKS.md.
+"""
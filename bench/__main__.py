@@ -0,0 +1,83 @@
+"""
+Usage:
+  python -m bench [--variants split,combined] [--report bench_report.json]
+                  [--baseline bench/baseline.json] [--save-baseline]
+
+Runs the benchmark scenarios against the sandbox, prints a table, writes
+the JSON report and, with --baseline, exits non-zero when a number
+regressed past the stored baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+from bench.octez import Sandbox
+from bench.report import compare, format_diff, format_table, load_report, make_report, write_report
+from bench.scenarios import Bench
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_rpc_url():
+    try:
+        with open(os.path.join(ROOT, ".taq", "config.json")) as f:
+            config = json.load(f)
+        return config["environments"][config["environmentDefault"]]["rpcUrl"]
+    except (OSError, KeyError, ValueError):
+        return "http://localhost:20000"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Contract gas and storage benchmarks")
+    parser.add_argument("--rpc-url", default=default_rpc_url())
+    parser.add_argument("--client", default=os.environ.get("OCTEZ_CLIENT", "octez-client"),
+                        help="octez-client command, e.g. 'docker exec -i <container> octez-client'")
+    parser.add_argument("--artifacts", default=os.path.join(ROOT, "artifacts"))
+    parser.add_argument("--variants", default=",".join(Bench.VARIANTS))
+    parser.add_argument("--transfer-sizes", default="1,10,50",
+                        help="batch sizes for the transfer and mint_batch scenarios")
+    parser.add_argument("--report", default="bench_report.json")
+    parser.add_argument("--diff", action="append", default=[], metavar="BASE,OTHER",
+                        help="print per-step differences between two variants, e.g. split,lazy")
+    parser.add_argument("--baseline", help="fail if a result regressed past this report")
+    parser.add_argument("--save-baseline", action="store_true", help="write the report to --baseline instead of comparing")
+    parser.add_argument("--gas-tolerance", type=float, default=None,
+                        help="allowed relative gas increase (default 0.01)")
+    args = parser.parse_args(argv)
+
+    sandbox = Sandbox(args.rpc_url, args.client)
+    bench = Bench(sandbox, args.artifacts, transfer_sizes=[int(n) for n in args.transfer_sizes.split(",")])
+    results = bench.run([v for v in args.variants.split(",") if v])
+
+    report = make_report(results, rpc_url=args.rpc_url, protocol=sandbox.protocol())
+    write_report(args.report, report)
+    print()
+    print(format_table(results))
+    for pair in args.diff:
+        base, other = pair.split(",")
+        print()
+        print(format_diff(results, base, other))
+    print("\nreport written to %s" % args.report)
+
+    if args.baseline:
+        if args.save_baseline:
+            write_report(args.baseline, report)
+            print("baseline saved to %s" % args.baseline)
+            return 0
+        tolerance = {} if args.gas_tolerance is None else {"gas": args.gas_tolerance}
+        regressions = compare(report, load_report(args.baseline), tolerance)
+        if regressions:
+            print("\nREGRESSIONS against %s:" % args.baseline)
+            for r in regressions:
+                print("  " + r)
+            return 1
+        print("no regressions against %s" % args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
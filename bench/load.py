@@ -0,0 +1,93 @@
+"""
+Sandbox driver for the synthetic load runs (sim/loadgen.py).
+
+Replays every generated call on a fresh split deployment and returns its
+receipt metrics, so `python -m sim load --sandbox` reports measured gas,
+paid storage and operation size next to the model's storage growth. Model
+accounts (artist0, buyer17, ...) become generated, funded sandbox keys;
+each listed NFT is minted to its artist and approved for the market first,
+outside the measurements.
+
+Every call waits for its inclusion, so a run costs about one block per
+call: use it at the scales you want gas numbers for, and the model alone
+for the growth curves.
+"""
+
+from __future__ import annotations
+
+from bench.report import operation_metrics
+from bench.scenarios import (ADMIN_PLACEHOLDER, ARTIST, SHARE_PLACEHOLDER, TEZ, m_add_operator, m_basket,
+                             m_create_piece, m_list, m_str, m_transfer)
+
+# transfers per funding batch
+FUND_BATCH = 100
+
+
+class SandboxDriver:
+    def __init__(self, bench, accounts, target="market_v1", fund=10 * TEZ, funder=ARTIST, prefix="load_", log=print):
+        self.bench = bench
+        self.sb = bench.sb
+        self.accounts = accounts
+        self.target = target
+        self.fund = fund
+        self.funder = funder
+        self.prefix = prefix
+        self.log = log
+        self.aliases = {}
+        self.addresses = {}
+
+    def setup(self):
+        sb, b = self.sb, self.bench
+        admin = sb.address(ARTIST)
+        for name in self.accounts:
+            self.aliases[name] = self.prefix + name
+            self.addresses[name] = sb.gen_account(self.prefix + name)
+        names = list(self.accounts)
+        for i in range(0, len(names), FUND_BATCH):
+            sb.find_operation(sb.fund(self.funder, [(self.addresses[n], self.fund) for n in names[i:i + FUND_BATCH]]))
+        self.log("funded %d accounts with %s tez each from %s" % (len(names), self.fund / TEZ, self.funder))
+
+        share = b.originate(None, "load_share", "share_fa2", {ADMIN_PLACEHOLDER: admin}, measure=False)
+        market = b.originate(None, "load_market", self.target, {SHARE_PLACEHOLDER: share}, measure=False)
+        b.call(None, ARTIST, share, "set_admin", m_str(market))
+        nft = b.originate(None, "load_nft", "test_mock_nft", measure=False)
+        self.addresses.update(share=share, market=market, nft=nft)
+        self.log("share %s, market %s (%s), nft %s" % (share, market, self.target, nft))
+
+    def _listing(self, artist, token_id):
+        """Mints the NFT to `artist` and lets the market escrow it."""
+        a = self.addresses
+        self.bench.call(None, ARTIST, a["nft"], "mint", "Pair %s %d" % (m_str(a[artist]), token_id))
+        self.bench.call(None, self.aliases[artist], a["nft"], "update_operators",
+                        m_add_operator(a[artist], a["market"], token_id))
+
+    def arg(self, op):
+        """Michelson argument of `op` with model names replaced by addresses."""
+        a = self.addresses
+        entrypoint = op.kind.split(".")[1]
+        if entrypoint == "create_collection":
+            return str(op.args[0])
+        if entrypoint == "create_piece_from_nft":
+            cid, nft, token_id, price = op.args
+            return m_create_piece(cid, a[nft], token_id, price)
+        if entrypoint == "buy_piece":
+            return str(op.args[0])
+        if entrypoint == "buy_pieces":
+            return m_basket(op.args[0])
+        if entrypoint == "withdraw":
+            return "Unit"
+        if entrypoint == "finalize_piece":
+            pid, buyers = op.args
+            return "Pair %d %s" % (pid, m_list([m_str(a[b]) for b in buyers]))
+        if entrypoint == "transfer":
+            (owner, txs), = op.args[0]
+            return m_transfer(a[owner], [(a[to], tid, amount) for to, tid, amount in txs])
+        raise ValueError("no sandbox encoding for %s" % op.kind)
+
+    def __call__(self, op):
+        contract, entrypoint = op.kind.split(".")
+        if entrypoint == "create_piece_from_nft":
+            self._listing(op.sender, op.args[2])
+        op_hash = self.sb.call(self.aliases[op.sender], self.addresses[contract], entrypoint, self.arg(op), op.amount)
+        receipt = self.sb.find_operation(op_hash)
+        return operation_metrics(receipt, self.sb.forged_size(receipt))
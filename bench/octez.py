@@ -0,0 +1,150 @@
+"""
+Sandbox driver: octez-client signs and injects, the node RPC serves receipts.
+
+The client command is configurable so the benchmarks can use the client
+inside the Taqueria/Flextesa container, e.g.
+`--client "docker exec -i <container> octez-client"`. The account aliases
+(bob, alice, ...) must be known to that client.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import shlex
+import subprocess
+import time
+import urllib.request
+
+from bench.report import strip_metadata
+from michelson.base58 import PREFIXES, b58check_encode
+
+OP_HASH_RE = re.compile(r"Operation hash is '(o[1-9A-HJ-NP-Za-km-z]{50})'")
+NEW_CONTRACT_RE = re.compile(r"New contract (KT1[1-9A-HJ-NP-Za-km-z]{33}) originated")
+ADDRESS_RE = re.compile(r"Hash: ((?:tz[1-4]|KT1)[1-9A-HJ-NP-Za-km-z]{33})")
+
+
+class OctezError(Exception):
+    pass
+
+
+def synthetic_tz1(seed):
+    """A valid tz1 address derived from `seed`; nobody holds its key, it only receives tokens."""
+    return b58check_encode(PREFIXES["tz1"] + hashlib.sha256(b"bench:%d" % seed).digest()[:20])
+
+
+def tez_arg(mutez):
+    return "%d.%06d" % divmod(mutez, 1_000_000)
+
+
+class Sandbox:
+    def __init__(self, rpc_url, client="octez-client", timeout=120, poll_interval=1.0):
+        self.rpc_url = rpc_url.rstrip("/")
+        self.client_cmd = shlex.split(client)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._addresses = {}
+
+    # --------------------
+    # RPC
+    # --------------------
+
+    def rpc(self, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        req = urllib.request.Request(self.rpc_url + path, data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return json.loads(resp.read())
+
+    def protocol(self):
+        return self.rpc("/chains/main/blocks/head/metadata")["protocol"]
+
+    def find_operation(self, op_hash, depth=5):
+        """Looks for `op_hash` in the manager pass of the last `depth` blocks."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for i in range(depth):
+                for op in self.rpc("/chains/main/blocks/head~%d/operations/3" % i):
+                    if op["hash"] == op_hash:
+                        return op
+            if time.monotonic() > deadline:
+                raise OctezError("operation %s not included after %ss" % (op_hash, self.timeout))
+            time.sleep(self.poll_interval)
+
+    def constants(self):
+        return self.rpc("/chains/main/blocks/head/context/constants")
+
+    def forged_size(self, op):
+        forged = self.rpc("/chains/main/blocks/head/helpers/forge/operations", strip_metadata(op))
+        return len(forged) // 2
+
+    # --------------------
+    # octez-client
+    # --------------------
+
+    def client(self, *args):
+        proc = subprocess.run(self.client_cmd + list(args), capture_output=True, text=True)
+        out = proc.stdout + proc.stderr
+        if proc.returncode != 0:
+            raise OctezError("%s failed:\n%s" % (" ".join(args[:2]), out))
+        return out
+
+    def address(self, alias):
+        if alias not in self._addresses:
+            m = ADDRESS_RE.search(self.client("show", "address", alias))
+            if not m:
+                raise OctezError("unknown account alias %r" % alias)
+            self._addresses[alias] = m.group(1)
+        return self._addresses[alias]
+
+    def originate(self, alias, source, script, storage):
+        """Originates `script` (Michelson source text) and returns (address, op_hash)."""
+        out = self.client(
+            "originate", "contract", alias, "transferring", "0", "from", source,
+            "running", script, "--init", storage, "--burn-cap", "20", "--force",
+        )
+        contract = NEW_CONTRACT_RE.search(out)
+        op_hash = OP_HASH_RE.search(out)
+        if not contract or not op_hash:
+            raise OctezError("could not parse origination output:\n%s" % out)
+        return contract.group(1), op_hash.group(1)
+
+    def call(self, source, destination, entrypoint, arg, amount=0):
+        """Calls `destination%entrypoint` with Michelson `arg`, sending `amount` mutez. Returns the op hash."""
+        out = self.client(
+            "transfer", tez_arg(amount), "from", source, "to", destination,
+            "--entrypoint", entrypoint, "--arg", arg, "--burn-cap", "5",
+        )
+        m = OP_HASH_RE.search(out)
+        if not m:
+            raise OctezError("could not parse transfer output:\n%s" % out)
+        return m.group(1)
+
+    def transfer_ticket(self, source, destination, entrypoint, ticketer, contents, ty, quantity):
+        """transfer_ticket operation moving `quantity` of (ticketer, contents: ty) held by `source`. Returns the op hash."""
+        out = self.client(
+            "transfer", str(quantity), "tickets", "from", source, "to", destination,
+            "with", "entrypoint", entrypoint, "and", "contents", contents, "and", "type", ty,
+            "and", "ticketer", ticketer, "--burn-cap", "5",
+        )
+        m = OP_HASH_RE.search(out)
+        if not m:
+            raise OctezError("could not parse transfer output:\n%s" % out)
+        return m.group(1)
+
+    def gen_account(self, alias):
+        """Generates (or keeps) a key under `alias` and returns its address."""
+        try:
+            return self.address(alias)
+        except OctezError:
+            self.client("gen", "keys", alias)
+            return self.address(alias)
+
+    def fund(self, source, transfers):
+        """Sends plain tez transfers [(address, mutez)] from `source` in one batch. Returns the op hash."""
+        batch = [{"destination": dest, "amount": tez_arg(amount)} for dest, amount in transfers]
+        out = self.client("multiple", "transfers", "from", source, "using", json.dumps(batch), "--burn-cap", "5")
+        m = OP_HASH_RE.search(out)
+        if not m:
+            raise OctezError("could not parse transfer output:\n%s" % out)
+        return m.group(1)
@@ -0,0 +1,159 @@
+"""
+Benchmark metrics, JSON reports and baseline comparison.
+
+Metrics are extracted from operation receipts as returned by the node RPC
+(`/chains/main/blocks/<block>/operations/3`), so this module has no sandbox
+dependency and is unit tested on recorded receipts.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+
+from michelson.base58 import SIGNATURE_SIZE
+
+METRICS = ("gas", "storage_bytes", "op_size")
+
+# Allowed relative increase over the baseline before a number counts as a
+# regression. Gas moves slightly between protocol versions; storage and
+# operation size are exact.
+DEFAULT_TOLERANCE = {"gas": 0.01, "storage_bytes": 0.0, "op_size": 0.0}
+
+class OperationFailed(Exception):
+    def __init__(self, op_hash, errors):
+        super().__init__("operation %s failed: %s" % (op_hash, json.dumps(errors)))
+        self.op_hash = op_hash
+        self.errors = errors
+
+
+def _result_totals(result):
+    milligas = int(result.get("consumed_milligas", 0))
+    storage = int(result.get("paid_storage_size_diff", 0))
+    return milligas, storage
+
+
+def operation_metrics(op, forged_size=None):
+    """
+    Sums gas and paid storage over every content of `op` and its internal
+    operations (mints, NFT escrow transfers, payouts).
+
+    `forged_size` is the length in bytes of the forged, unsigned operation;
+    when given, op_size is that plus the signature.
+    """
+    milligas = 0
+    storage = 0
+    for content in op["contents"]:
+        metadata = content.get("metadata", {})
+        result = metadata.get("operation_result")
+        if result is None:
+            continue
+        if result.get("status") != "applied":
+            raise OperationFailed(op.get("hash"), result.get("errors", []))
+        gas, paid = _result_totals(result)
+        milligas += gas
+        storage += paid
+        for internal in metadata.get("internal_operation_results", []):
+            gas, paid = _result_totals(internal["result"])
+            milligas += gas
+            storage += paid
+
+    metrics = {
+        "gas": round(milligas / 1000, 3),
+        "storage_bytes": storage,
+    }
+    if forged_size is not None:
+        metrics["op_size"] = forged_size + SIGNATURE_SIZE
+    return metrics
+
+
+def strip_metadata(op):
+    """Operation contents as accepted by `helpers/forge/operations`."""
+    contents = []
+    for content in op["contents"]:
+        contents.append({k: v for k, v in content.items() if k != "metadata"})
+    return {"branch": op["branch"], "contents": contents}
+
+
+def make_report(results, rpc_url=None, protocol=None):
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "rpc_url": rpc_url,
+        "protocol": protocol,
+        "results": dict(sorted(results.items())),
+    }
+
+
+def write_report(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current, baseline, tolerance=None):
+    """
+    Compares two reports' results. Returns a list of human readable
+    regressions: a metric above baseline * (1 + tolerance), or a benchmark
+    present in the baseline that did not run.
+    """
+    tol = dict(DEFAULT_TOLERANCE)
+    tol.update(tolerance or {})
+
+    regressions = []
+    cur = current["results"]
+    for name, base in sorted(baseline["results"].items()):
+        if name not in cur:
+            regressions.append("%s: missing from current run" % name)
+            continue
+        for metric in METRICS:
+            if metric not in base or metric not in cur[name]:
+                continue
+            limit = base[metric] * (1 + tol[metric])
+            if cur[name][metric] > limit:
+                regressions.append("%s: %s %s > baseline %s (+%.2f%%)" % (
+                    name, metric, cur[name][metric], base[metric],
+                    100.0 * (cur[name][metric] - base[metric]) / base[metric] if base[metric] else 100.0
+                ))
+    return regressions
+
+
+def variant_diff(results, base, other):
+    """
+    Pairs the benchmarks two variants have in common (e.g. split/buy_piece/first
+    and lazy/buy_piece/first) and returns {step: {metric: (base, other, delta)}}.
+    """
+    diff = {}
+    prefix = base + "/"
+    for name, m in sorted(results.items()):
+        if not name.startswith(prefix):
+            continue
+        step = name[len(prefix):]
+        o = results.get(other + "/" + step)
+        if o is None:
+            continue
+        diff[step] = {k: (m[k], o[k], round(o[k] - m[k], 3)) for k in METRICS if k in m and k in o}
+    return diff
+
+
+def format_diff(results, base, other):
+    lines = ["%s -> %s" % (base, other)]
+    for step, metrics in variant_diff(results, base, other).items():
+        parts = ["%s %s -> %s (%+g)" % (k, b, o, d) for k, (b, o, d) in metrics.items()]
+        lines.append("  %-30s %s" % (step, ", ".join(parts)))
+    return "\n".join(lines)
+
+
+def format_table(results):
+    rows = [("benchmark", "gas", "storage_bytes", "op_size")]
+    for name, m in sorted(results.items()):
+        rows.append((name, str(m.get("gas", "")), str(m.get("storage_bytes", "")), str(m.get("op_size", ""))))
+    widths = [max(len(r[i]) for r in rows) for i in range(4)]
+    lines = []
+    for r in rows:
+        lines.append("  ".join([r[0].ljust(widths[0])] + [r[i].rjust(widths[i]) for i in range(1, 4)]))
+    return "\n".join(lines)
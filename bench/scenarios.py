@@ -0,0 +1,246 @@
+"""
+Fixed benchmark scenarios.
+
+Every deployment variant runs the same story so numbers are comparable:
+an artist (bob) lists pieces, buyers fund them (first buy, repeat buy,
+new buyer, closing buy, a two-item basket), the artist withdraws, the
+closed piece's contributions are pruned (finalize_piece) and a holder
+moves shares in transfer batches of several sizes. The tickets variant
+also moves share tickets directly and through the FA2 wrapper.
+
+Contracts are originated from the compiled artifacts (`<target>.tz` and
+`<target>.default_storage.tz`); the placeholder addresses of the
+compilation targets are replaced with the sandbox addresses.
+"""
+
+from __future__ import annotations
+
+import os
+
+from bench.octez import synthetic_tz1
+from bench.report import operation_metrics
+
+SHARE_PLACEHOLDER = "KT1-share-placeholder-address-1234"
+ADMIN_PLACEHOLDER = "tz1-admin-placeholder-address-1234"
+
+ARTIST = "bob"
+BUYERS = ("alice", "john", "jane", "joe")
+
+TEZ = 1_000_000
+
+
+# --------------------
+# Michelson arguments (match the layouts declared in contracts/)
+# --------------------
+
+def m_str(s):
+    return '"%s"' % s
+
+
+def m_list(items):
+    return "{ %s }" % " ; ".join(items) if items else "{}"
+
+
+def m_transfer(from_, txs):
+    return m_list(["Pair %s %s" % (m_str(from_), m_list(["Pair %s (Pair %d %d)" % (m_str(to), tid, amt) for to, tid, amt in txs]))])
+
+
+def m_mint(to, token_id, amount):
+    return "Pair %s (Pair %d %d)" % (m_str(to), token_id, amount)
+
+
+def m_add_operator(owner, operator, token_id):
+    return m_list(["Left (Pair %s (Pair %s %d))" % (m_str(owner), m_str(operator), token_id)])
+
+
+def m_create_piece(collection_id, nft_fa2, nft_token_id, price):
+    return "Pair %d (Pair %s (Pair %d %d))" % (collection_id, m_str(nft_fa2), nft_token_id, price)
+
+
+def m_basket(items):
+    return m_list(["Pair %d %d" % (pid, amount) for pid, amount in items])
+
+
+def m_unwrap(token_id, amount, receiver):
+    return "Pair %d (Pair %d %s)" % (token_id, amount, m_str(receiver))
+
+
+class Bench:
+    def __init__(self, sandbox, artifacts_dir, transfer_sizes=(1, 10, 50), log=print):
+        self.sb = sandbox
+        self.artifacts_dir = artifacts_dir
+        self.transfer_sizes = transfer_sizes
+        self.log = log
+        self.results = {}
+
+    def artifact(self, target):
+        with open(os.path.join(self.artifacts_dir, target + ".tz")) as f:
+            code = f.read()
+        with open(os.path.join(self.artifacts_dir, target + ".default_storage.tz")) as f:
+            storage = f.read()
+        return code, storage
+
+    def measure(self, name, op_hash):
+        op = self.sb.find_operation(op_hash)
+        metrics = operation_metrics(op, self.sb.forged_size(op))
+        self.results[name] = metrics
+        self.log("%-45s gas=%-10s storage=%-6s size=%s" % (name, metrics["gas"], metrics["storage_bytes"], metrics["op_size"]))
+        return metrics
+
+    def originate(self, name, alias, target, replace=None, measure=True):
+        code, storage = self.artifact(target)
+        for placeholder, value in (replace or {}).items():
+            storage = storage.replace(placeholder, value)
+        address, op_hash = self.sb.originate(alias, ARTIST, code, storage)
+        if measure:
+            self.measure(name, op_hash)
+        else:
+            self.sb.find_operation(op_hash)
+        return address
+
+    def call(self, name, source, destination, entrypoint, arg, amount=0):
+        op_hash = self.sb.call(source, destination, entrypoint, arg, amount)
+        if name is None:
+            self.sb.find_operation(op_hash)
+        else:
+            self.measure(name, op_hash)
+
+    # --------------------
+    # Building blocks
+    # --------------------
+
+    def deploy_share(self, variant, admin):
+        return self.originate(variant + "/originate_share_fa2", "bench_share_" + variant, "share_fa2",
+                              {ADMIN_PLACEHOLDER: admin})
+
+    def deploy_nft(self, variant, market, token_ids):
+        artist = self.sb.address(ARTIST)
+        nft = self.originate(None, "bench_nft_" + variant, "test_mock_nft", measure=False)
+        for tid in token_ids:
+            self.call(None, ARTIST, nft, "mint", "Pair %s %d" % (m_str(artist), tid))
+            self.call(None, ARTIST, nft, "update_operators", m_add_operator(artist, market, tid))
+        return nft
+
+    def market_flow(self, variant, market, nft):
+        """Listing and funding steps shared by every market variant."""
+        self.call(variant + "/create_collection", ARTIST, market, "create_collection", "50")
+
+        # piece 0: 4 tez, cap 2 tez per buyer; pieces 1 and 2 for the basket
+        self.call(variant + "/create_piece_from_nft", ARTIST, market, "create_piece_from_nft",
+                  m_create_piece(0, nft, 0, 4 * TEZ))
+        for pid in (1, 2):
+            self.call(None, ARTIST, market, "create_piece_from_nft", m_create_piece(0, nft, pid, 4 * TEZ))
+
+        alice, john, jane, joe = BUYERS
+        self.call(variant + "/buy_piece/first", alice, market, "buy_piece", "0", TEZ)
+        self.call(variant + "/buy_piece/repeat", alice, market, "buy_piece", "0", TEZ // 2)
+        self.call(variant + "/buy_piece/new_buyer", john, market, "buy_piece", "0", TEZ)
+        self.call(variant + "/buy_piece/closing", jane, market, "buy_piece", "0", 3 * TEZ // 2)
+        self.call(variant + "/buy_pieces/2_items", joe, market, "buy_pieces",
+                  m_basket([(1, TEZ), (2, TEZ)]), 2 * TEZ)
+        self.call(variant + "/withdraw", ARTIST, market, "withdraw", "Unit")
+
+    def finalize_flow(self, variant, market):
+        """Prunes the contributions of piece 0, closed by alice, john and jane."""
+        buyers = [m_str(self.sb.address(b)) for b in BUYERS[:3]]
+        self.call(variant + "/finalize_piece/3_buyers", BUYERS[0], market, "finalize_piece",
+                  "Pair 0 %s" % m_list(buyers))
+
+    def ticket_flow(self, variant, market, wrapper):
+        """alice holds a 1_500_000 ticket of token 0: moves 1 unit, wraps 1000, unwraps 100."""
+        alice = self.sb.address(BUYERS[0])
+        self.measure(variant + "/transfer_ticket/1_unit",
+                     self.sb.transfer_ticket(BUYERS[0], self.sb.address(BUYERS[1]), "default", market, "0", "nat", 1))
+        self.measure(variant + "/wrap",
+                     self.sb.transfer_ticket(BUYERS[0], wrapper, "wrap", market, "0", "nat", 1000))
+        self.call(variant + "/unwrap", BUYERS[0], wrapper, "unwrap", m_unwrap(0, 100, alice))
+
+    def transfer_flow(self, variant, share):
+        """alice holds 1_500_000 units of token 0; moves 1 unit to each of N recipients."""
+        alice = self.sb.address(BUYERS[0])
+        seed = 0
+        for n in self.transfer_sizes:
+            txs = []
+            for _ in range(n):
+                txs.append((synthetic_tz1(seed), 0, 1))
+                seed += 1
+            self.call("%s/transfer/%d_txs" % (variant, n), BUYERS[0], share, "transfer", m_transfer(alice, txs))
+
+    # --------------------
+    # Variants
+    # --------------------
+
+    def run_split(self):
+        variant = "split"
+        share = self.deploy_share(variant, self.sb.address(ARTIST))
+        market = self.originate(variant + "/originate_market", "bench_market_" + variant, "market_v1",
+                                {SHARE_PLACEHOLDER: share})
+        self.call(None, ARTIST, share, "set_admin", m_str(market))
+        nft = self.deploy_nft(variant, market, (0, 1, 2))
+        self.market_flow(variant, market, nft)
+        self.finalize_flow(variant, market)
+        self.transfer_flow(variant, share)
+
+    def run_lazy(self):
+        """split deployment with the lazy-entry-points market build."""
+        variant = "lazy"
+        share = self.deploy_share(variant, self.sb.address(ARTIST))
+        market = self.originate(variant + "/originate_market", "bench_market_" + variant, "market_v1_lazy",
+                                {SHARE_PLACEHOLDER: share})
+        self.call(None, ARTIST, share, "set_admin", m_str(market))
+        nft = self.deploy_nft(variant, market, (0, 1, 2))
+        self.market_flow(variant, market, nft)
+        self.finalize_flow(variant, market)
+
+    def run_combined(self):
+        variant = "combined"
+        market = self.originate(variant + "/originate_market", "bench_market_" + variant, "market_v1_combined")
+        nft = self.deploy_nft(variant, market, (0, 1, 2))
+        self.market_flow(variant, market, nft)
+        self.finalize_flow(variant, market)
+        self.transfer_flow(variant, market)
+
+    def run_deferred(self):
+        variant = "deferred"
+        share = self.deploy_share(variant, self.sb.address(ARTIST))
+        market = self.originate(variant + "/originate_market", "bench_market_" + variant, "market_v1_deferred",
+                                {SHARE_PLACEHOLDER: share})
+        self.call(None, ARTIST, share, "set_admin", m_str(market))
+        nft = self.deploy_nft(variant, market, (0, 1, 2))
+        self.market_flow(variant, market, nft)
+        buyers = [m_str(self.sb.address(b)) for b in BUYERS[:3]]
+        self.call(variant + "/claim_shares/3_buyers", BUYERS[0], market, "claim_shares",
+                  "Pair 0 %s" % m_list(buyers))
+        self.finalize_flow(variant, market)
+        self.transfer_flow(variant, share)
+
+    def run_tickets(self):
+        """Ticket shares: funding sends tickets; FA2 transfers run on the wrapper's ledger."""
+        variant = "tickets"
+        wrapper = self.originate(variant + "/originate_wrapper", "bench_wrapper_" + variant, "share_ticket_wrapper",
+                                 {ADMIN_PLACEHOLDER: self.sb.address(ARTIST)})
+        market = self.originate(variant + "/originate_market", "bench_market_" + variant, "market_v1_tickets",
+                                {SHARE_PLACEHOLDER: wrapper})
+        self.call(None, ARTIST, wrapper, "set_ticketer", m_str(market))
+        nft = self.deploy_nft(variant, market, (0, 1, 2))
+        self.market_flow(variant, market, nft)
+        # finalize_piece is disabled on this build
+        self.ticket_flow(variant, market, wrapper)
+        self.transfer_flow(variant, wrapper)
+
+    def run_mint(self):
+        """ShareFA2.mint against mint_batch, with bob as admin so both can be called directly."""
+        variant = "mint"
+        artist = self.sb.address(ARTIST)
+        share = self.originate(None, "bench_share_" + variant, "share_fa2", {ADMIN_PLACEHOLDER: artist}, measure=False)
+        self.call(variant + "/mint", ARTIST, share, "mint", m_mint(synthetic_tz1(10_000), 0, 1))
+        for n in self.transfer_sizes:
+            records = [m_mint(synthetic_tz1(20_000 + n * 1000 + i), 0, 1) for i in range(n)]
+            self.call("%s/mint_batch/%d_records" % (variant, n), ARTIST, share, "mint_batch", m_list(records))
+
+    VARIANTS = ("split", "lazy", "combined", "deferred", "tickets", "mint")
+
+    def run(self, variants=VARIANTS):
+        for v in variants:
+            getattr(self, "run_" + v)()
+        return self.results
@@ -0,0 +1,11 @@
+"""
+Python client for reading the market and share contracts over the node RPC.
+
+AsyncRpc keeps a pool of keep-alive connections and runs requests
+concurrently with asyncio; MarketClient reads big_map keys through it,
+caching what cannot change (bounded LRU) and stamping the rest with the
+head level; key hashes are packed locally (michelson.pack). BuyPreflight
+checks buy_piece calls against snapshots, BatchQueue sends calls as
+operation groups. StandinNode is a local HTTP stand-in for tests. See
+docs/CLIENT.md.
+"""
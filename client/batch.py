@@ -0,0 +1,455 @@
+"""
+Batched submission of contract calls from one account.
+
+BatchQueue takes calls (buy_piece, create_piece_from_nft, ShareFA2
+transfer, or any Call) and sends them as operation groups: one signed
+operation holding many transactions, with consecutive counters. A group
+is packed up to the protocol limits read from the node:
+  - the gas limits of its transactions add up to at most
+    hard_gas_limit_per_block, each at most hard_gas_limit_per_operation
+  - forged bytes plus signature at most max_operation_data_length
+Each group is simulated first (run_operation). A call that fails there
+is reported and the rest are simulated again, so a doomed call does not
+take the group down. Gas and storage limits are what the simulation
+consumed plus a margin. Fees follow the default mempool minimums.
+
+A source may have one operation in the mempool: the next group is sent
+once the previous one is included (its counter is then known). Calls
+wait meanwhile, so groups grow with the load. On inclusion each call
+gets its Result from the receipt. Calls backtracked because another
+call of the group failed on chain are sent again in the next group.
+submit() waits while `max_pending` calls are queued (backpressure).
+
+Signing is left to the caller: `sign(forged_bytes)` is a coroutine
+returning the 64-byte signature (a remote signer, an HSM, a key in
+memory). The source must be revealed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import time
+
+from client.rpc import RpcError
+from michelson.base58 import EDSIG_PREFIX, SIGNATURE_SIZE, b58check_encode
+
+HEAD = "/chains/main/blocks/head"
+
+# Default mempool filter of the node: 100 mutez, plus 0.1 mutez per gas
+# unit and 1 mutez per byte
+MINIMAL_FEE = 100
+NANOTEZ_PER_GAS = 100
+NANOTEZ_PER_BYTE = 1000
+
+# run_operation checks every field but the signature
+DUMMY_SIGNATURE = b58check_encode(EDSIG_PREFIX + bytes(SIGNATURE_SIZE))
+
+# Fee placeholder while sizing a group: zarith takes as many bytes for
+# it as for any fee below 2.09 tez, so the final group is not larger
+FEE_PLACEHOLDER = 2 ** 21 - 1
+
+
+def fee(gas_limit, size):
+    """Minimal fee in mutez of a transaction with `gas_limit` gas and `size` bytes."""
+    return MINIMAL_FEE + -(-(gas_limit * NANOTEZ_PER_GAS + size * NANOTEZ_PER_BYTE) // 1000)
+
+
+class Call:
+    """A contract call: `value` is the Micheline JSON parameter, `amount` in mutez."""
+
+    __slots__ = ("destination", "entrypoint", "value", "amount")
+
+    def __init__(self, destination, entrypoint, value, amount=0):
+        self.destination = destination
+        self.entrypoint = entrypoint
+        self.value = value
+        self.amount = amount
+
+    def __repr__(self):
+        return "Call(%s%%%s, %d mutez)" % (self.destination, self.entrypoint, self.amount)
+
+
+def _nat(n):
+    return {"int": str(n)}
+
+
+def _pair(*args):
+    # right comb, as the layouts declared in contracts/
+    out = args[-1]
+    for a in reversed(args[:-1]):
+        out = {"prim": "Pair", "args": [a, out]}
+    return out
+
+
+def buy_piece(market, piece_id, amount):
+    return Call(market, "buy_piece", _nat(piece_id), amount)
+
+
+def create_piece_from_nft(market, collection_id, nft_fa2, nft_token_id, price):
+    value = _pair(_nat(collection_id), {"string": nft_fa2}, _nat(nft_token_id), _nat(price))
+    return Call(market, "create_piece_from_nft", value)
+
+
+def transfer(share, from_, txs):
+    """ShareFA2 transfer of one batch: txs is [(to_, token_id, amount)]."""
+    batch = [_pair({"string": to}, _nat(token_id), _nat(amount)) for to, token_id, amount in txs]
+    return Call(share, "transfer", [_pair({"string": from_}, batch)])
+
+
+class Result:
+    """
+    status: "applied"; "failed" (by the simulation, the node before
+    injection or on chain; `error` is the contract's error string or the
+    node's error id); "rejected" (by the pre-flight check, never sent);
+    "unconfirmed" (injected as `op_hash`, not seen in a block before the
+    timeout or before the node stopped answering).
+    """
+
+    __slots__ = ("status", "error", "op_hash", "level", "gas")
+
+    def __init__(self, status, error=None, op_hash=None, level=None, gas=None):
+        self.status = status
+        self.error = error
+        self.op_hash = op_hash
+        self.level = level
+        self.gas = gas
+
+    @property
+    def ok(self):
+        return self.status == "applied"
+
+    def __repr__(self):
+        return "Result(%s%s)" % (self.status, ", " + self.error if self.error else "")
+
+
+class _Item:
+    __slots__ = ("call", "future", "attempts", "gas", "storage")
+
+    def __init__(self, call, future):
+        self.call = call
+        self.future = future
+        self.attempts = 0
+        self.gas = None
+        self.storage = None
+
+
+def _consumed(content):
+    """(milligas, paid storage bytes) of a content and its internal operations."""
+    metadata = content["metadata"]
+    results = [metadata["operation_result"]] + [i["result"] for i in metadata.get("internal_operation_results", [])]
+    milligas = sum(int(r.get("consumed_milligas", 0)) for r in results)
+    storage = sum(int(r.get("paid_storage_size_diff", 0)) for r in results)
+    return milligas, storage
+
+
+def _status(content):
+    """(status, error) of a content: the error string a contract failed with, else the last error id."""
+    metadata = content["metadata"]
+    results = [metadata["operation_result"]] + [i["result"] for i in metadata.get("internal_operation_results", [])]
+    status = metadata["operation_result"]["status"]
+    errors = [e for r in results for e in r.get("errors", [])]
+    if not errors:
+        return status, None
+    for e in errors:
+        if "with" in e:
+            w = e["with"]
+            return status, w.get("string", w.get("int", str(w))) if isinstance(w, dict) else str(w)
+    return status, errors[-1].get("id")
+
+
+def _node_error(e):
+    """The id of the node's error in an RpcError body, else the message."""
+    try:
+        errors = json.loads(e.body)
+        return errors[-1]["id"]
+    except (ValueError, LookupError, TypeError):
+        return str(e)
+
+
+class BatchQueue:
+    """
+    Use as `async with BatchQueue(rpc, source, sign) as q:` then
+    `result = await (await q.submit(call))`. Leaving the block sends every
+    call submitted so far and waits for their results.
+
+    preflight: a BuyPreflight; buy_piece calls to its market are checked
+    (and recorded) before they are simulated.
+    """
+
+    def __init__(self, rpc, source, sign, preflight=None, max_pending=1000, max_batch=200,
+                 gas_margin=100, storage_margin=20, max_attempts=3, confirm_timeout=120.0, poll_interval=1.0):
+        self.rpc = rpc
+        self.source = source
+        self.sign = sign
+        self.preflight = preflight
+        self.max_batch = max_batch
+        self.gas_margin = gas_margin
+        self.storage_margin = storage_margin
+        self.max_attempts = max_attempts
+        self.confirm_timeout = confirm_timeout
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.constants = None
+        self.chain_id = None
+        self.counter = None
+        # gas to simulate each entrypoint with: the operation limit until one was seen
+        self.gas_hints = {}
+        self._queue = None
+        self._carry = collections.deque()
+        self._worker = None
+        self._closing = False
+        # stats
+        self.groups = 0
+        self.sent = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        self._queue = asyncio.Queue(self.max_pending)
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        """Sends what is queued, waits for the results and stops."""
+        self._closing = True
+        await self._queue.put(None)
+        await self._worker
+
+    async def submit(self, call):
+        """Queues `call`, waiting for room if `max_pending` calls are queued. Returns a future of its Result."""
+        if self._closing:
+            raise RuntimeError("submit() after close()")
+        item = _Item(call, asyncio.get_running_loop().create_future())
+        await self._queue.put(item)
+        if self._worker.done():
+            # surface a worker that died (e.g. the node was unreachable at start)
+            self._worker.result()
+        return item.future
+
+    # --------------------
+    # Worker
+    # --------------------
+
+    async def _run(self):
+        self.constants = await self.rpc.get(HEAD + "/context/constants")
+        self.chain_id = await self.rpc.get("/chains/main/chain_id")
+        await self._read_counter()
+        while True:
+            items = await self._take()
+            if not items:
+                return
+            try:
+                await self._send(items)
+            except RpcError as e:
+                # the node refused the group or failed before injecting it (_confirm rides
+                # out errors after): report it, start again from its counter
+                self._finish(items, Result("failed", _node_error(e)))
+                await self._read_counter()
+            except BaseException as e:
+                # e.g. the signer failed: nothing more can be sent
+                self._abort(items + list(self._carry), e)
+                raise
+
+    async def _read_counter(self):
+        self.counter = int(await self.rpc.get(HEAD + "/context/contracts/%s/counter" % self.source))
+
+    async def _take(self):
+        """The calls of the next group: carried over first, then queued, at most max_batch."""
+        items = []
+        while self._carry and len(items) < self.max_batch:
+            items.append(self._carry.popleft())
+        if not items and not self._closing:
+            item = await self._queue.get()
+            if item is None:
+                return items
+            items.append(item)
+        while len(items) < self.max_batch and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                items.append(item)
+        return items
+
+    def _finish(self, items, result):
+        for item in items:
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def _abort(self, items, e):
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        for item in items:
+            if item is not None and not item.future.done():
+                item.future.set_exception(e)
+
+    def _retry(self, item, error):
+        item.attempts += 1
+        if item.attempts >= self.max_attempts:
+            self._finish([item], Result("failed", error))
+        else:
+            self._carry.append(item)
+
+    # --------------------
+    # One group
+    # --------------------
+
+    async def _send(self, items):
+        items = await self._preflight(items)
+        items = self._fit_gas(items)
+        items = await self._simulate(items)
+        if not items:
+            return
+        header = await self.rpc.get(HEAD + "/header")
+        branch = header["hash"]
+        items, contents = await self._fit_size(items, branch)
+        forged = bytes.fromhex(await self.rpc.post(HEAD + "/helpers/forge/operations",
+                                                   {"branch": branch, "contents": contents}))
+        signature = await self.sign(forged)
+        op_hash = await self.rpc.post("/injection/operation?chain=main", (forged + signature).hex())
+        self.groups += 1
+        self.sent += len(items)
+        self.counter += len(items)
+        await self._confirm(items, op_hash, header["level"])
+
+    async def _preflight(self, items):
+        if self.preflight is None:
+            return items
+        market = self.preflight.client.market
+        buys = [(i, int(i.call.value["int"])) for i in items
+                if i.call.destination == market and i.call.entrypoint == "buy_piece"]
+        if not buys:
+            return items
+        await self.preflight.refresh([(pid, self.source) for _, pid in buys])
+        rejected = set()
+        for item, pid in buys:
+            verdict = self.preflight.check(pid, self.source, item.call.amount)
+            if verdict.ok:
+                self.preflight.record(pid, self.source, item.call.amount)
+            else:
+                rejected.add(item)
+                self._finish([item], Result("rejected", verdict.error, level=verdict.level))
+        return [i for i in items if i not in rejected]
+
+    def _hint(self, item):
+        return self.gas_hints.get(item.call.entrypoint, int(self.constants["hard_gas_limit_per_operation"]))
+
+    def _fit_gas(self, items):
+        """The longest prefix whose simulation gas fits in a block; the rest is carried over."""
+        budget = int(self.constants["hard_gas_limit_per_block"])
+        for n, item in enumerate(items):
+            budget -= self._hint(item)
+            if budget < 0:
+                self._carry.extendleft(reversed(items[n:]))
+                return items[:n]
+        return items
+
+    def _contents(self, items, fees=None, limits=True):
+        out = []
+        for n, item in enumerate(items):
+            c = item.call
+            out.append({
+                "kind": "transaction",
+                "source": self.source,
+                "fee": str(fees[n] if fees else FEE_PLACEHOLDER),
+                "counter": str(self.counter + 1 + n),
+                "gas_limit": str(item.gas if limits else self._hint(item)),
+                "storage_limit": str(item.storage if limits else self.constants["hard_storage_limit_per_operation"]),
+                "amount": str(c.amount),
+                "destination": c.destination,
+                "parameters": {"entrypoint": c.entrypoint, "value": c.value},
+            })
+        return out
+
+    async def _simulate(self, items):
+        """
+        Runs the group until every call applies, dropping the failing ones.
+        Sets each call's gas and storage limits from what it consumed.
+        """
+        per_op = int(self.constants["hard_gas_limit_per_operation"])
+        while items:
+            op = {"branch": (await self.rpc.get(HEAD + "/header"))["hash"],
+                  "contents": self._contents(items, limits=False), "signature": DUMMY_SIGNATURE}
+            receipt = await self.rpc.post(HEAD + "/helpers/scripts/run_operation",
+                                          {"operation": op, "chain_id": self.chain_id})
+            kept = []
+            for item, content in zip(items, receipt["contents"]):
+                status, error = _status(content)
+                if status == "failed":
+                    if error and "gas_exhausted" in error and self._hint(item) < per_op:
+                        # simulated with a hint that was too low: the operation limit next time
+                        self.gas_hints.pop(item.call.entrypoint, None)
+                        self._retry(item, error)
+                    else:
+                        self._finish([item], Result("failed", error))
+                    continue
+                kept.append(item)
+                if status == "applied":
+                    milligas, storage = _consumed(content)
+                    # within the simulated limit, so the group stays within the block's
+                    item.gas = min(-(-milligas // 1000) + self.gas_margin, int(content["gas_limit"]))
+                    item.storage = storage + self.storage_margin
+                    ep = item.call.entrypoint
+                    self.gas_hints[ep] = max(min(2 * item.gas, per_op), self.gas_hints.get(ep, 0))
+            if len(kept) == len(items):
+                return items
+            items = kept
+        return items
+
+    async def _fit_size(self, items, branch):
+        """
+        Fees for the group, dropping calls from its end (carried over) until
+        it fits in max_operation_data_length with the signature.
+        """
+        limit = int(self.constants["max_operation_data_length"]) - SIGNATURE_SIZE
+        while True:
+            contents = self._contents(items)
+            size = len(await self.rpc.post(HEAD + "/helpers/forge/operations",
+                                           {"branch": branch, "contents": contents})) // 2
+            if size <= limit or len(items) == 1:
+                break
+            n = max(len(items) * limit // size, 1)
+            self._carry.extendleft(reversed(items[n:]))
+            items = items[:n]
+        share = -(-size // len(items))
+        fees = [fee(item.gas, share) for item in items]
+        return items, self._contents(items, fees)
+
+    async def _confirm(self, items, op_hash, seen):
+        """Waits for `op_hash` in a block after level `seen` and reports each call from its receipt."""
+        deadline = time.monotonic() + self.confirm_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                level = (await self.rpc.get(HEAD + "/header"))["level"]
+                blocks = [(block, await self.rpc.get("/chains/main/blocks/%d/operations/3" % block))
+                          for block in range(seen + 1, level + 1)]
+            except RpcError:
+                # the node did not answer this poll: the operation is still on its way, ask again
+                continue
+            for block, ops in blocks:
+                for op in ops:
+                    if op["hash"] == op_hash:
+                        self._report(items, op, block)
+                        if self.preflight is not None:
+                            await self.preflight.client.refresh()
+                        return
+            seen = level
+        self._finish(items, Result("unconfirmed", op_hash=op_hash))
+        await self._read_counter()
+
+    def _report(self, items, op, level):
+        for item, content in zip(items, op["contents"]):
+            status, error = _status(content)
+            if status == "applied":
+                milligas, _ = _consumed(content)
+                self._finish([item], Result("applied", op_hash=op["hash"], level=level, gas=milligas / 1000))
+            elif status == "failed":
+                self._finish([item], Result("failed", error, op["hash"], level))
+            else:
+                # backtracked or skipped: another call of the group failed
+                self._retry(item, status.upper())
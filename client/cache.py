@@ -0,0 +1,79 @@
+"""
+Bounded caches for RPC reads.
+
+LRUCache holds values that cannot change (key hashes, listing fields,
+closed pieces): entries stay until evicted by newer ones. LevelCache
+holds values that can change: an entry answers only for the block level
+it was read at, so a new head invalidates it without a sweep.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+
+# Cached values may be None (an absent big_map key), so misses use a sentinel
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """The cached value (now most recently used) or MISSING."""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class LevelCache(LRUCache):
+    """LRU entries stamped with the level they were read at."""
+
+    def get(self, key, level):
+        entry = LRUCache.get(self, key)
+        if entry is MISSING:
+            return MISSING
+        stamped, value = entry
+        if stamped != level:
+            # read at another level: stale for this one
+            self.hits -= 1
+            self.misses += 1
+            if stamped < level:
+                self.pop(key)
+            return MISSING
+        return value
+
+    def put(self, key, level, value):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > level:
+            # a read at a newer level already landed
+            return
+        LRUCache.put(self, key, (level, value))
@@ -0,0 +1,269 @@
+"""
+Cached, concurrent reads of the market and share big_maps.
+
+Keys are read straight from the node's big_map context (one GET per key,
+all keys of a call in flight together) at one pinned level, so a page
+is a consistent snapshot. What is cached, and for how long:
+  - key hashes: forever (LRU), they only depend on the key; they are
+    computed locally (michelson.pack), a batch at a time, with no RPC
+  - `collections` and `pieces` entries, `funding` entries of closed
+    pieces, and present `finalized` / `claimed` markers: forever (LRU),
+    the contracts never change them again
+  - everything else (open funding, contributions, payouts, balances,
+    supply, absent keys): for the level it was read at only
+The head level is re-read at most every `head_ttl` seconds (or on refresh()).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from client.cache import MISSING, LevelCache, LRUCache
+from indexer.layouts import BIG_MAPS
+from michelson.micheline import big_map_ids, storage_section
+from michelson.pack import key_hashes
+
+NAT = {"prim": "nat"}
+ADDRESS = {"prim": "address"}
+
+
+def _pair(*types):
+    return {"prim": "pair", "args": list(types)}
+
+
+class KeyType:
+    """Michelson type of a big_map key and its encoder from Python values."""
+
+    def __init__(self, michelson_type, encode):
+        self.type = michelson_type
+        self.encode = encode
+
+
+def _nat(n):
+    return {"int": str(n)}
+
+
+def _address(a):
+    return {"string": a}
+
+
+def _piece_user(k):
+    return {"prim": "Pair", "args": [_nat(k[0]), _address(k[1])]}
+
+
+# big_map name -> key type (key fields in the order of the contracts' sp.pair / .layout)
+KEYS = {
+    "collections": KeyType(NAT, _nat),
+    "pieces": KeyType(NAT, _nat),
+    "funding": KeyType(NAT, _nat),
+    "contributions": KeyType(_pair(NAT, ADDRESS), _piece_user),
+    "finalized": KeyType(NAT, _nat),
+    # deferred build only
+    "claimed": KeyType(_pair(NAT, ADDRESS), _piece_user),
+    "pending_payouts": KeyType(ADDRESS, _address),
+    "ledger": KeyType(_pair(ADDRESS, NAT),
+                      lambda k: {"prim": "Pair", "args": [_address(k[0]), _nat(k[1])]}),
+    "total_supply": KeyType(NAT, _nat),
+    # (owner, operator, token_id) record
+    "operators": KeyType(_pair(ADDRESS, ADDRESS, NAT),
+                         lambda k: {"prim": "Pair", "args": [_address(k[0]), _address(k[1]), _nat(k[2])]}),
+}
+
+# big_maps of the share token contract
+SHARE_MAPS = ("ledger", "total_supply", "operators")
+
+
+# market big_maps with unit values the contracts never remove
+MARKERS = ("finalized", "claimed")
+
+
+def _decode(name, node):
+    # Unit values: present means approved (operators) or marked
+    return True if name == "operators" or name in MARKERS else BIG_MAPS[name].decode_value(node)
+
+
+class MarketClient:
+    """
+    market: any build of the market; share: its ShareFA2 (or wrapper), None
+    for the combined build (the ledger is in the market).
+    """
+
+    def __init__(self, rpc, market, share=None, cache_size=10_000, head_ttl=1.0):
+        self.rpc = rpc
+        self.market = market
+        self.share = share or market
+        self.head_ttl = head_ttl
+        self.level = None
+        self._head_at = 0.0
+        self._ids = {}
+        self.hashes = LRUCache(cache_size)
+        self.fixed = LRUCache(cache_size)
+        self.live = LevelCache(cache_size)
+        # stats
+        self.reads = 0
+
+    # --------------------
+    # Level and big_map ids
+    # --------------------
+
+    async def refresh(self):
+        """Reads the head level; later reads are pinned to it."""
+        header = await self.rpc.get("/chains/main/blocks/head/header")
+        self.level = header["level"]
+        self._head_at = time.monotonic()
+        return self.level
+
+    async def current_level(self):
+        """The head level, re-read once `head_ttl` has passed."""
+        if self.level is None or time.monotonic() - self._head_at >= self.head_ttl:
+            await self.refresh()
+        return self.level
+
+    async def _big_map_ids(self, address):
+        script = await self.rpc.get("/chains/main/blocks/head/context/contracts/%s/script" % address)
+        return big_map_ids(storage_section(script), script["storage"])
+
+    async def _ids_of(self, name):
+        address = self.share if name in SHARE_MAPS else self.market
+        if address not in self._ids:
+            self._ids[address] = asyncio.ensure_future(self._big_map_ids(address))
+        return address, await self._ids[address]
+
+    async def has_big_map(self, name):
+        """Whether the owning contract has big_map `name` (e.g. `claimed`, deferred build only)."""
+        _, ids = await self._ids_of(name)
+        return name in ids
+
+    async def big_map_id(self, name):
+        """Id of big_map `name`, from the owning contract's script (fetched once per contract)."""
+        address, ids = await self._ids_of(name)
+        if name not in ids:
+            raise KeyError("no %s big_map in %s" % (name, address))
+        return ids[name]
+
+    # --------------------
+    # Keys
+    # --------------------
+
+    def key_hashes(self, name, keys):
+        """script_expr hashes of `keys` in big_map `name`; new ones are packed together."""
+        hashes = [self.hashes.get((name, k)) for k in keys]
+        new = [k for k, h in zip(keys, hashes) if h is MISSING]
+        if new:
+            kt = KEYS[name]
+            computed = dict(zip(new, key_hashes([kt.encode(k) for k in new], kt.type)))
+            for k in new:
+                self.hashes.put((name, k), computed[k])
+            hashes = [computed[k] if h is MISSING else h for k, h in zip(keys, hashes)]
+        return hashes
+
+    # --------------------
+    # Reads
+    # --------------------
+
+    @staticmethod
+    def _immutable(name, value):
+        if value is None:
+            return False
+        return name in ("collections", "pieces") + MARKERS or (name == "funding" and value["closed"])
+
+    def _cached(self, name, key, level):
+        value = self.fixed.get((name, key))
+        if value is MISSING:
+            value = self.live.get((name, key), level)
+        return value
+
+    async def _read(self, name, key, h, level):
+        big_map_id = await self.big_map_id(name)
+        node = await self.rpc.get("/chains/main/blocks/%d/context/big_maps/%d/%s" % (level, big_map_id, h))
+        self.reads += 1
+        value = None if node is None else _decode(name, node)
+        if self._immutable(name, value):
+            self.fixed.put((name, key), value)
+        else:
+            self.live.put((name, key), level, value)
+        return value
+
+    async def get_many(self, name, keys, level=None):
+        """
+        Values of big_map `name` for `keys` (decoded like the indexer's rows,
+        None if absent), in order, read concurrently at `level` (default head).
+        """
+        if name not in KEYS:
+            raise KeyError("unknown big_map %r" % name)
+        level = level if level is not None else await self.current_level()
+        keys = list(keys)
+        found = {}
+        for k in dict.fromkeys(keys):
+            found[k] = self._cached(name, k, level)
+        misses = [k for k, v in found.items() if v is MISSING]
+        if misses:
+            values = await asyncio.gather(*[self._read(name, k, h, level)
+                                            for k, h in zip(misses, self.key_hashes(name, misses))])
+            found.update(zip(misses, values))
+        return [found[k] for k in keys]
+
+    async def get(self, name, key, level=None):
+        return (await self.get_many(name, [key], level))[0]
+
+    # --------------------
+    # View-like helpers (same answers as the contract views)
+    # --------------------
+
+    async def collections(self, collection_ids):
+        """get_collections: {artist, cap_percent} or None per id."""
+        return await self.get_many("collections", collection_ids)
+
+    async def pieces(self, piece_ids):
+        """get_pieces: listing and funding fields of each piece (plus piece_id), or None."""
+        level = await self.current_level()
+        listings, funding = await asyncio.gather(self.get_many("pieces", piece_ids, level),
+                                                 self.get_many("funding", piece_ids, level))
+        out = []
+        for pid, p, f in zip(piece_ids, listings, funding):
+            out.append(None if p is None or f is None else dict(p, **f, piece_id=pid, share_token_id=pid))
+        return out
+
+    async def balances(self, requests):
+        """Share balances of (owner, token_id) pairs; unknown read as 0."""
+        return [b["balance"] if b else 0 for b in await self.get_many("ledger", requests)]
+
+    async def contributions(self, user, piece_ids):
+        """
+        get_user_contributions: until a piece is finalized, the recorded
+        contribution of `user` (0 if none); once it is, the share balance
+        of `user` (plus the contribution not claimed yet on the deferred
+        build); None for unknown pieces.
+        """
+        level = await self.current_level()
+        funding, recorded, finalized = await asyncio.gather(
+            self.get_many("funding", piece_ids, level),
+            self.get_many("contributions", [(pid, user) for pid in piece_ids], level),
+            self.get_many("finalized", piece_ids, level))
+        done = [pid for pid, m in zip(piece_ids, finalized) if m]
+        # deferred build: a recorded contribution of a finalized piece is still owed until claimed
+        owed = [pid for pid, m, c in zip(piece_ids, finalized, recorded) if m and c]
+        if owed and not await self.has_big_map("claimed"):
+            owed = []
+        balances, claimed = await asyncio.gather(
+            self.get_many("ledger", [(user, pid) for pid in done], level),
+            self.get_many("claimed", [(pid, user) for pid in owed], level))
+        shares = {pid: b["balance"] if b else 0 for pid, b in zip(done, balances)}
+        unclaimed = {pid for pid, m in zip(owed, claimed) if not m}
+        out = []
+        for pid, f, c in zip(piece_ids, funding, recorded):
+            if f is None:
+                out.append(None)
+            elif pid in shares:
+                out.append(shares[pid] + (c["amount"] if pid in unclaimed else 0))
+            else:
+                out.append(c["amount"] if c else 0)
+        return out
+
+    async def is_operator(self, owner, operator, token_id):
+        return bool(await self.get("operators", (owner, operator, token_id)))
+
+    async def pending_payout(self, artist):
+        p = await self.get("pending_payouts", artist)
+        return p["amount"] if p else 0
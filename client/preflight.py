@@ -0,0 +1,153 @@
+"""
+Pre-flight checks for buy_piece, from local level-stamped snapshots.
+
+check() runs the checks of the market's _fund_piece, in the contract's
+order and with its error strings, against the cached funding record of
+the piece and the buyer's recorded contribution:
+  NO_PIECE, PIECE_CLOSED, SEND_TEZ, OVER_CAP_SHARE, OVER_PRICE
+It is a couple of dict lookups and comparisons, so a doomed call is
+dropped before simulation or injection. The per-buyer cap is the
+piece's cap_amount, fixed at creation, so the collection is not read.
+
+Snapshots are read with refresh() at one block level (through
+MarketClient, so closed pieces come from its cache) and every Verdict
+carries the oldest level it was computed from: the answer holds for
+that level; calls of other senders included since can still reject it.
+record() applies a call sent from here to the snapshots, so calls
+queued behind it are checked against the state they will meet.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from client.cache import MISSING, LRUCache
+
+
+class PieceSnapshot:
+    __slots__ = ("level", "price", "cap_amount", "total_raised", "closed")
+
+    def __init__(self, level, price, cap_amount, total_raised, closed):
+        self.level = level
+        self.price = price
+        self.cap_amount = cap_amount
+        self.total_raised = total_raised
+        self.closed = closed
+
+
+class Verdict:
+    """
+    error: the contract's error string, or None if the call passes.
+    max_amount: the largest amount that passes now (0 if none does).
+    level: the block level the snapshots were read at.
+    """
+
+    __slots__ = ("error", "max_amount", "level")
+
+    def __init__(self, error, max_amount, level):
+        self.error = error
+        self.max_amount = max_amount
+        self.level = level
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "Verdict(%s, max_amount=%d, level=%s)" % (self.error or "ok", self.max_amount, self.level)
+
+
+def check_buy(piece, contributed, amount, level=None):
+    """
+    _fund_piece for one contribution. piece: PieceSnapshot or None (no
+    such piece); contributed: the buyer's recorded mutez.
+    """
+    if piece is None:
+        return Verdict("NO_PIECE", 0, level)
+    if piece.closed:
+        return Verdict("PIECE_CLOSED", 0, level)
+    room = min(piece.cap_amount - contributed, piece.price - piece.total_raised)
+    max_amount = room if room > 0 else 0
+    if amount <= 0:
+        return Verdict("SEND_TEZ", max_amount, level)
+    if contributed + amount > piece.cap_amount:
+        return Verdict("OVER_CAP_SHARE", max_amount, level)
+    if piece.total_raised + amount > piece.price:
+        return Verdict("OVER_PRICE", max_amount, level)
+    return Verdict(None, max_amount, level)
+
+
+class BuyPreflight:
+    def __init__(self, client, cache_size=100_000):
+        self.client = client
+        # piece_id -> PieceSnapshot, or (level, None) for an unknown piece
+        self.pieces = LRUCache(cache_size)
+        # (piece_id, buyer) -> (level, mutez)
+        self.contributions = LRUCache(cache_size)
+
+    def _put_piece(self, piece_id, level, f):
+        held = self.pieces.get(piece_id)
+        if held is not MISSING and _level(held) > level:
+            return
+        if f is None:
+            self.pieces.put(piece_id, (level, None))
+        else:
+            self.pieces.put(piece_id, PieceSnapshot(level, f["price"], f["cap_amount"], f["total_raised"], f["closed"]))
+
+    def _put_contribution(self, key, level, amount):
+        held = self.contributions.get(key)
+        if held is MISSING or held[0] <= level:
+            self.contributions.put(key, (level, amount))
+
+    async def refresh(self, calls, level=None):
+        """
+        Snapshots the pieces and contributions of `calls` ((piece_id, buyer)
+        pairs) at `level` (default: the client's head), reading them concurrently.
+        """
+        calls = list(calls)
+        level = level if level is not None else await self.client.current_level()
+        piece_ids = list(dict.fromkeys(pid for pid, _ in calls))
+        funding, recorded = await asyncio.gather(
+            self.client.get_many("funding", piece_ids, level),
+            self.client.get_many("contributions", calls, level))
+        for pid, f in zip(piece_ids, funding):
+            self._put_piece(pid, level, f)
+        for key, c in zip(calls, recorded):
+            self._put_contribution(key, level, c["amount"] if c else 0)
+        return level
+
+    def check(self, piece_id, buyer, amount):
+        """
+        Verdict for buy_piece(piece_id) from `buyer` with `amount` mutez.
+        Raises LookupError if refresh() did not snapshot this call.
+        """
+        piece = self.pieces.get(piece_id)
+        c = self.contributions.get((piece_id, buyer))
+        if piece is MISSING or c is MISSING:
+            raise LookupError("no snapshot of piece %d for %s: refresh() first" % (piece_id, buyer))
+        level = min(_level(piece), c[0])
+        return check_buy(piece if isinstance(piece, PieceSnapshot) else None, c[1], amount, level)
+
+    async def check_now(self, piece_id, buyer, amount):
+        """refresh() of this one call, then check()."""
+        await self.refresh([(piece_id, buyer)])
+        return self.check(piece_id, buyer, amount)
+
+    def record(self, piece_id, buyer, amount):
+        """
+        Applies a passing call to the snapshots (total_raised, closed and the
+        buyer's contribution), as the contract will once it is included.
+        """
+        verdict = self.check(piece_id, buyer, amount)
+        if not verdict.ok:
+            raise ValueError("cannot record a rejected call: %s" % verdict.error)
+        piece = self.pieces.get(piece_id)
+        piece.total_raised += amount
+        piece.closed = piece.total_raised == piece.price
+        level, c = self.contributions.get((piece_id, buyer))
+        self.contributions.put((piece_id, buyer), (level, c + amount))
+        return verdict
+
+
+def _level(entry):
+    return entry.level if isinstance(entry, PieceSnapshot) else entry[0]
@@ -0,0 +1,152 @@
+"""
+Asyncio JSON client for the node RPC with pooled keep-alive connections.
+
+Plain HTTP/1.1 over asyncio streams (stdlib only): up to `pool_size`
+requests run at once, each on its own connection, and connections are
+kept open and reused for later requests instead of reconnecting per
+call. A reused connection the node closed in the meantime is replaced
+and the request retried once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import ssl
+import urllib.parse
+
+
+class RpcError(Exception):
+    def __init__(self, method, path, status, body):
+        super().__init__("%s %s: HTTP %s %s" % (method, path, status, body[:200]))
+        self.status = status
+        self.body = body
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    async def request(self, host, method, path, body):
+        head = ["%s %s HTTP/1.1" % (method, path), "Host: %s" % host,
+                "Accept: application/json", "Connection: keep-alive"]
+        if body is not None:
+            head += ["Content-Type: application/json", "Content-Length: %d" % len(body)]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by the node")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # trailers, then the blank line
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b"".join(chunks)
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            self.reusable = False
+        if headers.get("connection", "").lower() == "close":
+            self.reusable = False
+        return status, data
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+
+class AsyncRpc:
+    """
+    Use as `async with AsyncRpc(url) as rpc:` (or call close()).
+    get/post return the decoded JSON, or None for 404 (absent context data,
+    e.g. a big_map key that is not set); other errors raise RpcError.
+    """
+
+    def __init__(self, rpc_url, pool_size=8, timeout=30):
+        url = urllib.parse.urlsplit(rpc_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.base = url.path.rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        self._slots = None
+        # stats
+        self.requests = 0
+        self.connections = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.connections += 1
+        return _Connection(reader, writer)
+
+    async def request(self, method, path, payload=None):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        body = None if payload is None else json.dumps(payload).encode()
+        host = self.host if self.port in (80, 443) else "%s:%d" % (self.host, self.port)
+        async with self._slots:
+            self.requests += 1
+            for attempt in range(2):
+                reused = bool(self._idle)
+                conn = self._idle.pop() if reused else await self._connect()
+                try:
+                    status, data = await asyncio.wait_for(
+                        conn.request(host, method, self.base + path, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                if conn.reusable:
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                break
+
+        if status == 404:
+            return None
+        text = data.decode("utf-8", "replace")
+        if status != 200:
+            raise RpcError(method, path, status, text)
+        return json.loads(text)
+
+    async def get(self, path):
+        return await self.request("GET", path)
+
+    async def post(self, path, payload):
+        return await self.request("POST", path, payload)
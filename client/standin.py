@@ -0,0 +1,311 @@
+"""
+Local HTTP stand-in for the node RPC, for tests and offline runs.
+
+Serves the few RPCs the client uses from in-memory state, over HTTP/1.1
+keep-alive like the node:
+  GET  /chains/main/blocks/head/header
+  GET  /chains/main/blocks/<block>/context/contracts/<address>/script
+  GET  /chains/main/blocks/<block>/context/big_maps/<id>/<key hash>
+  POST /chains/main/blocks/<block>/helpers/scripts/pack_data
+and, for BatchQueue, manager operations:
+  GET  /chains/main/chain_id
+  GET  /chains/main/blocks/<block>/context/constants
+  GET  /chains/main/blocks/<block>/context/contracts/<address>/counter
+  POST /chains/main/blocks/<block>/helpers/forge/operations
+  POST /chains/main/blocks/<block>/helpers/scripts/run_operation
+  POST /injection/operation
+  GET  /chains/main/blocks/<level>/operations/3
+Big_map values are the current ones whatever level is asked for. Every
+request and the number of client connections are recorded.
+
+Transactions run through `executor(state, content)`, which updates
+`state` in place and returns the milligas and storage bytes it used, or
+raises ScriptRejected. A group is atomic: `state` is restored if one of
+its transactions fails. Injection checks what the node's mempool does
+for counters (consecutive, one operation per source in the mempool) and
+limits (`constants`); bake() includes the mempool. Forged operations are
+the JSON of the operation, not the binary encoding: sizes are close to
+the node's, not equal.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import re
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from michelson.base58 import SIGNATURE_SIZE, operation_hash, script_expr_hash
+from michelson.pack import pack
+
+BLOCK = r"/chains/main/blocks/(?:head|\d+)"
+CHAIN_ID = "NetXstandinNode"
+
+CONSTANTS = {
+    "hard_gas_limit_per_operation": "1040000",
+    "hard_gas_limit_per_block": "2600000",
+    "hard_storage_limit_per_operation": "60000",
+    "max_operation_data_length": 32768,
+}
+
+
+class ScriptRejected(Exception):
+    """FAILWITH of a transaction run by the executor; `value` is the Micheline value."""
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+
+def _error(kind, **fields):
+    return dict({"kind": "temporary", "id": "proto.standin." + kind}, **fields)
+
+
+class _Exhausted(Exception):
+    pass
+
+
+class StandinNode:
+    def __init__(self, scripts=None, level=1, chunked=False, state=None, executor=None):
+        self.scripts = dict(scripts or {})
+        self.level = level
+        self.chunked = chunked
+        self.big_maps = {}
+        self.requests = []
+        self.connections = set()
+        self.fail_paths = {}
+        self.constants = dict(CONSTANTS)
+        self.state = state
+        self.executor = executor
+        self.counters = {}
+        self.mempool = []
+        self.blocks = {}       # level -> included operations with receipts
+        self.injected = []     # every injected operation, as decoded
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # --------------------
+    # State
+    # --------------------
+
+    def set(self, big_map_id, key, key_type, value):
+        """Sets (value node) or removes (None) a big_map entry by its Micheline key."""
+        h = script_expr_hash(pack(key, key_type))
+        entries = self.big_maps.setdefault(big_map_id, {})
+        if value is None:
+            entries.pop(h, None)
+        else:
+            entries[h] = value
+
+    def bake(self, n=1):
+        """Bakes `n` blocks; the first includes the mempool."""
+        with self._lock:
+            self.level += 1
+            included = []
+            for op_hash, op in self.mempool:
+                contents = self._apply(op["contents"], commit=True)
+                included.append({"hash": op_hash, "branch": op["branch"], "contents": contents})
+            self.blocks[self.level] = included
+            self.mempool = []
+            self.level += n - 1
+            return self.level
+
+    def count(self, pattern):
+        """Number of recorded requests whose path matches `pattern` (regex)."""
+        return sum(1 for _, path in self.requests if re.search(pattern, path))
+
+    # --------------------
+    # Manager operations
+    # --------------------
+
+    def _apply(self, contents, commit):
+        """Receipts of a group run against `state`; kept only if `commit` and every transaction applied."""
+        saved = self.state
+        self.state = copy.deepcopy(saved)
+        out, failed = [], False
+        for content in contents:
+            content = dict(content)
+            if commit:
+                source = content["source"]
+                self.counters[source] = int(content["counter"])
+            if failed:
+                content["metadata"] = {"operation_result": {"status": "skipped"}}
+                out.append(content)
+                continue
+            try:
+                milligas, storage = self.executor(self.state, content)
+                if milligas > int(content["gas_limit"]) * 1000:
+                    raise _Exhausted(_error("gas_exhausted.operation"))
+                if storage > int(content["storage_limit"]):
+                    raise _Exhausted(_error("storage_exhausted.operation"))
+                result = {"status": "applied", "consumed_milligas": str(milligas),
+                          "paid_storage_size_diff": str(storage)}
+            except ScriptRejected as e:
+                result = {"status": "failed", "errors": [_error("michelson_v1.script_rejected", **{"with": e.value})]}
+            except _Exhausted as e:
+                result = {"status": "failed", "errors": [e.args[0]]}
+            if result["status"] == "failed":
+                failed = True
+                for done in out:
+                    done["metadata"]["operation_result"] = {"status": "backtracked"}
+            content["metadata"] = {"operation_result": result}
+            out.append(content)
+        if failed or not commit:
+            self.state = saved
+        return out
+
+    def _check(self, contents):
+        """Node errors of a group, as the mempool would find them: [] if it is accepted."""
+        per_op = int(self.constants["hard_gas_limit_per_operation"])
+        total = 0
+        for c in contents:
+            gas = int(c["gas_limit"])
+            if gas > per_op:
+                return [_error("gas_limit_too_high")]
+            if int(c["storage_limit"]) > int(self.constants["hard_storage_limit_per_operation"]):
+                return [_error("storage_limit_too_high")]
+            total += gas
+        if total > int(self.constants["hard_gas_limit_per_block"]):
+            return [_error("block_quota_exceeded")]
+        if len({c["source"] for c in contents}) != 1:
+            return [_error("inconsistent_sources")]
+        return []
+
+    def _inject(self, signed):
+        data = bytes.fromhex(signed)
+        if len(data) > self.constants["max_operation_data_length"]:
+            return 500, [_error("oversized_operation", size=len(data))]
+        op = json.loads(data[:-SIGNATURE_SIZE])
+        contents = op["contents"]
+        errors = self._check(contents)
+        if errors:
+            return 500, errors
+        source = contents[0]["source"]
+        if any(pending["contents"][0]["source"] == source for _, pending in self.mempool):
+            return 500, [_error("operation_conflict")]
+        expected = self.counters.get(source, 0) + 1
+        for n, c in enumerate(contents):
+            if int(c["counter"]) != expected + n:
+                kind = "counter_in_the_past" if int(c["counter"]) < expected + n else "counter_in_the_future"
+                return 500, [_error("contract." + kind)]
+        op_hash = operation_hash(data)
+        self.mempool.append((op_hash, op))
+        self.injected.append(op)
+        return 200, op_hash
+
+    # --------------------
+    # RPC
+    # --------------------
+
+    def handle(self, method, path, body):
+        """(status, JSON-serialisable body) for one request."""
+        for prefix, status in self.fail_paths.items():
+            if path.startswith(prefix):
+                return status, {"error": "stand-in failure"}
+        if method == "GET" and path == "/chains/main/blocks/head/header":
+            return 200, {"level": self.level, "hash": "BLstandin%d" % self.level}
+        m = re.fullmatch(BLOCK + r"/context/contracts/(\w+)/script", path)
+        if method == "GET" and m:
+            script = self.scripts.get(m.group(1))
+            return (200, script) if script is not None else (404, [])
+        m = re.fullmatch(BLOCK + r"/context/big_maps/(\d+)/(\w+)", path)
+        if method == "GET" and m:
+            value = self.big_maps.get(int(m.group(1)), {}).get(m.group(2))
+            return (200, value) if value is not None else (404, [])
+        if method == "POST" and re.fullmatch(BLOCK + r"/helpers/scripts/pack_data", path):
+            return 200, {"packed": pack(body["data"], body["type"]).hex(), "gas": "unaccounted"}
+        if method == "GET" and path == "/chains/main/chain_id":
+            return 200, CHAIN_ID
+        if method == "GET" and re.fullmatch(BLOCK + r"/context/constants", path):
+            return 200, self.constants
+        m = re.fullmatch(BLOCK + r"/context/contracts/(\w+)/counter", path)
+        if method == "GET" and m:
+            return 200, str(self.counters.get(m.group(1), 0))
+        if method == "POST" and re.fullmatch(BLOCK + r"/helpers/forge/operations", path):
+            return 200, json.dumps(body, separators=(",", ":")).encode().hex()
+        if method == "POST" and re.fullmatch(BLOCK + r"/helpers/scripts/run_operation", path):
+            contents = body["operation"]["contents"]
+            errors = self._check(contents)
+            if errors:
+                return 500, errors
+            return 200, {"contents": self._apply(contents, commit=False)}
+        if method == "POST" and path.split("?")[0] == "/injection/operation":
+            return self._inject(body)
+        m = re.fullmatch(r"/chains/main/blocks/(\d+)/operations/3", path)
+        if method == "GET" and m:
+            ops = self.blocks.get(int(m.group(1)))
+            return (200, ops) if ops is not None else (404, [])
+        return 404, []
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                # headers and body are separate writes: do not wait for delayed ACKs
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with node._lock:
+                    node.connections.add(self.client_address)
+
+            def _reply(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with node._lock:
+                    node.requests.append((method, self.path))
+                    status, payload = node.handle(method, self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if node.chunked:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    half = len(data) // 2
+                    for chunk in (data[:half], data[half:], b""):
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                else:
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply("GET")
+
+            def do_POST(self):
+                self._reply("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    # --------------------
+    # Server
+    # --------------------
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
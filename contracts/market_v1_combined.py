@@ -0,0 +1,83 @@
+import smartpy as sp
+
+import sys
+sys.path.append('..')
+from contracts.share_fa2 import ShareLedger, UpdateOperatorsParam, TransferParam, BalanceOfParam, BalanceOfRequest
+from contracts.market_v1_fa2 import FractionalArtMarketV1_FA2
+
+
+class FractionalArtMarketV1_Combined(ShareLedger, FractionalArtMarketV1_FA2):
+    """
+    v1 market with the FA2 share ledger embedded (single contract):
+    - Same collections / pieces / funding rules as FractionalArtMarketV1_FA2
+    - Funding credits the buyer's share balance in this contract's own ledger
+      (no ShareFA2 lookup, no internal mint transaction)
+    - Shares are transferable with the standard FA2 transfer / update_operators,
+      readable with balance_of and the get_balances view
+    - This contract is the FA2 token contract for shares: token_id = piece_id
+    """
+
+    def __init__(self):
+        self.init(
+            **FractionalArtMarketV1_FA2.market_storage(),
+            **ShareLedger.ledger_storage()
+        )
+
+    def _mint_shares(self, to_, token_id, amount):
+        self._mint(to_, token_id, amount)
+
+    def _mint_shares_batch(self, mints):
+        self._mint_batch(mints)
+
+    def _balances(self, requests):
+        return self._balance_responses(sp.set_type_expr(requests, sp.TList(BalanceOfRequest)), False)
+
+    # --------------------
+    # FA2 share entrypoints
+    # --------------------
+
+    @sp.entry_point
+    def update_operators(self, params):
+        """
+        params: list( variant(add_operator | remove_operator) )
+        """
+        sp.set_type(params, UpdateOperatorsParam)
+        self._update_operators(params)
+
+    @sp.entry_point
+    def transfer(self, txs):
+        """
+        txs: list({
+          from_: address,
+          txs: list({ to_: address, token_id: nat, amount: nat })
+        })
+        """
+        sp.set_type(txs, TransferParam)
+        self._transfer(txs)
+
+    @sp.entry_point
+    def balance_of(self, params):
+        """
+        params: { requests: list({ owner, token_id }), callback }
+        Calls back with list({ request, balance }), in request order.
+        """
+        sp.set_type(params, BalanceOfParam)
+        sp.transfer(self._balance_responses(params.requests, True), sp.mutez(0), params.callback)
+
+    @sp.onchain_view()
+    def get_balances(self, requests):
+        """
+        requests: list({ owner, token_id })
+        Returns list({ request, balance }) in request order; unknown tokens read as 0.
+        """
+        sp.set_type(requests, sp.TList(BalanceOfRequest))
+        sp.result(self._balance_responses(requests, False))
+
+
+# ------------------------
+# Taqueria compilation target
+# ------------------------
+sp.add_compilation_target(
+    "market_v1_combined",
+    FractionalArtMarketV1_Combined()
+)
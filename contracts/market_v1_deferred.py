@@ -0,0 +1,91 @@
+import smartpy as sp
+
+import sys
+sys.path.append('..')
+from contracts.market_v1_fa2 import FractionalArtMarketV1_FA2, ShareMint
+
+
+class FractionalArtMarketV1_FA2_Deferred(FractionalArtMarketV1_FA2):
+    """
+    v1 with deferred share claiming:
+    - buy_piece / buy_pieces only record contributions (no ShareFA2 call while the sale is open)
+    - Once a piece is closed, anyone (a buyer or a relayer) calls claim_shares
+      to mint the recorded contributions, 1:1 with mutez, in one mint_batch
+    - Each (piece_id, buyer) contribution is minted at most once
+    - finalize_piece only drops contributions that were claimed; the claimed
+      markers stay so is_claimed keeps answering, and get_user_contribution
+      adds the unclaimed contribution to the share balance of a finalized piece
+    """
+
+    mint_on_buy = False
+
+    def __init__(self, share_fa2):
+        FractionalArtMarketV1_FA2.__init__(self, share_fa2)
+        self.update_initial_storage(
+            # (piece_id, buyer) -> unit, set once the contribution has been minted
+            claimed=sp.big_map(
+                tkey=sp.TPair(sp.TNat, sp.TAddress),
+                tvalue=sp.TUnit
+            )
+        )
+
+    @sp.entry_point
+    def claim_shares(self, params):
+        """
+        params:
+          - piece_id
+          - buyers (list of addresses to mint for)
+
+        Requires:
+          - the piece is closed
+
+        Buyers without a contribution, or whose shares were already claimed,
+        are skipped so relayers can retry batches safely.
+        """
+        sp.set_type(params, sp.TRecord(
+            piece_id=sp.TNat,
+            buyers=sp.TList(sp.TAddress)
+        ).layout(("piece_id", "buyers")))
+
+        f = sp.local("f", self.data.funding.get_opt(params.piece_id).open_some("NO_PIECE"))
+        sp.verify(f.value.closed, "PIECE_OPEN")
+
+        mints = sp.local("mints", sp.list(t=ShareMint))
+
+        sp.for buyer in params.buyers:
+            key = sp.pair(params.piece_id, buyer)
+            sp.if self.data.contributions.contains(key) & ~self.data.claimed.contains(key):
+                self.data.claimed[key] = sp.unit
+                mints.value.push(sp.record(
+                    to_=buyer,
+                    token_id=params.piece_id,
+                    amount=sp.utils.mutez_to_nat(self.data.contributions[key])
+                ))
+
+        sp.if sp.len(mints.value) > 0:
+            self._mint_shares_batch(mints.value)
+
+    def _prune_contribution(self, key):
+        # An unclaimed contribution is the only record of shares still owed
+        sp.if self.data.claimed.contains(key) & self.data.contributions.contains(key):
+            del self.data.contributions[key]
+
+    def _owed(self, key):
+        owed = sp.local("owed", sp.mutez(0))
+        sp.if ~self.data.claimed.contains(key):
+            owed.value = self.data.contributions.get(key, sp.mutez(0))
+        return owed.value
+
+    @sp.onchain_view()
+    def is_claimed(self, params):
+        sp.set_type(params, sp.TRecord(piece_id=sp.TNat, user=sp.TAddress).layout(("piece_id", "user")))
+        sp.result(self.data.claimed.contains(sp.pair(params.piece_id, params.user)))
+
+
+# ------------------------
+# Taqueria compilation target
+# ------------------------
+sp.add_compilation_target(
+    "market_v1_deferred",
+    FractionalArtMarketV1_FA2_Deferred(share_fa2=sp.address("KT1-share-placeholder-address-1234"))
+)
@@ -14,6 +14,65 @@ FA2_TransferItem = sp.TRecord(
 
 FA2_TransferParam = sp.TList(FA2_TransferItem)
 
+# ShareFA2 mint param types
+ShareMint = sp.TRecord(
+    to_=sp.TAddress,
+    token_id=sp.TNat,
+    amount=sp.TNat
+).layout(("to_", ("token_id", "amount")))
+
+ShareMintBatch = sp.TList(ShareMint)
+
+# ShareFA2 get_balances view types
+ShareBalanceRequest = sp.TRecord(
+    owner=sp.TAddress,
+    token_id=sp.TNat
+).layout(("owner", "token_id"))
+
+ShareBalanceResponse = sp.TRecord(
+    request=ShareBalanceRequest,
+    balance=sp.TNat
+).layout(("request", "balance"))
+
+# get_piece output: cold listing fields and hot funding state in one record
+PieceView = sp.TRecord(
+    collection_id=sp.TNat,
+    price=sp.TMutez,
+    total_raised=sp.TMutez,
+    closed=sp.TBool,
+    nft_fa2=sp.TAddress,
+    nft_token_id=sp.TNat,
+    share_token_id=sp.TNat
+).layout(("collection_id", ("price", ("total_raised", ("closed", ("nft_fa2", ("nft_token_id", "share_token_id")))))))
+
+# get_collection(s) output
+CollectionView = sp.TRecord(
+    artist=sp.TAddress,
+    cap_percent=sp.TNat
+).layout(("artist", "cap_percent"))
+
+# Event payloads (tags: collection_created, piece_created, contribution)
+CollectionCreatedEvent = sp.TRecord(
+    collection_id=sp.TNat,
+    artist=sp.TAddress,
+    cap_percent=sp.TNat
+).layout(("collection_id", ("artist", "cap_percent")))
+
+PieceCreatedEvent = sp.TRecord(
+    piece_id=sp.TNat,
+    collection_id=sp.TNat,
+    price=sp.TMutez
+).layout(("piece_id", ("collection_id", "price")))
+
+# closed: this contribution completed the funding
+ContributionEvent = sp.TRecord(
+    piece_id=sp.TNat,
+    buyer=sp.TAddress,
+    amount=sp.TMutez,
+    total_raised=sp.TMutez,
+    closed=sp.TBool
+).layout(("piece_id", ("buyer", ("amount", ("total_raised", "closed")))))
+
 
 class FractionalArtMarketV1_FA2(sp.Contract):
     """
@@ -22,16 +81,36 @@ class FractionalArtMarketV1_FA2(sp.Contract):
     - Artist escrows an existing FA2 NFT into this contract to create a piece sale
     - Buyers fund in tez (capped per buyer) and receive FA2 share tokens (minted)
     - Shares minted 1:1 with contributed mutez (converted to nat)
+    - The ShareFA2 token_id of a piece's shares is the piece_id
     - Piece closes when fully funded
+    - Several pieces can be funded in one operation (buy_pieces)
+    - Proceeds accumulate per artist and are paid out on withdraw
+    - Once a piece is closed, anyone can finalize it and drop its contribution
+      entries (finalize_piece); its share balances are the record from then on
+    - Collections, pieces and contributions are announced as events, so
+      off-chain consumers need not diff big_maps
+
+    lazy_entry_points=True builds the same contract with every entrypoint except
+    buy_piece / buy_pieces stored in a big_map and loaded only when called, so the
+    hot funding path does not deserialize the code of the rarely used ones.
     """
 
-    def __init__(self, share_fa2):
+    # Variants that mint later (or not through ShareFA2) turn this off
+    mint_on_buy = True
+
+    def __init__(self, share_fa2, lazy_entry_points=False):
         self.init(
             share_fa2=share_fa2,
+            **FractionalArtMarketV1_FA2.market_storage()
+        )
+        if lazy_entry_points:
+            self.add_flag("lazy-entry-points")
 
+    @staticmethod
+    def market_storage():
+        return dict(
             next_collection_id=0,
             next_piece_id=0,
-            next_share_token_id=0,
 
             # collection_id -> { artist, cap_percent }
             collections=sp.big_map(
@@ -40,24 +119,49 @@ class FractionalArtMarketV1_FA2(sp.Contract):
                     .layout(("artist", "cap_percent"))
             ),
 
-            # piece_id -> { collection_id, price, total_raised, closed, nft_fa2, nft_token_id, share_token_id }
+            # piece_id -> { collection_id, nft_fa2, nft_token_id }
+            # Written once by create_piece_from_nft, never read by buy_piece.
             pieces=sp.big_map(
                 tkey=sp.TNat,
                 tvalue=sp.TRecord(
                     collection_id=sp.TNat,
+                    nft_fa2=sp.TAddress,
+                    nft_token_id=sp.TNat
+                ).layout(("collection_id", ("nft_fa2", "nft_token_id")))
+            ),
+
+            # piece_id -> { price, cap_amount, artist, total_raised, closed }
+            # Everything buy_piece needs: read once and written once per contribution.
+            # cap_amount (price * cap_percent / 100) and artist are fixed at creation.
+            funding=sp.big_map(
+                tkey=sp.TNat,
+                tvalue=sp.TRecord(
                     price=sp.TMutez,
+                    cap_amount=sp.TMutez,
+                    artist=sp.TAddress,
                     total_raised=sp.TMutez,
-                    closed=sp.TBool,
-                    nft_fa2=sp.TAddress,
-                    nft_token_id=sp.TNat,
-                    share_token_id=sp.TNat
-                ).layout(("collection_id", ("price", ("total_raised", ("closed", ("nft_fa2", ("nft_token_id", "share_token_id")))))))
+                    closed=sp.TBool
+                ).layout(("price", ("cap_amount", ("artist", ("total_raised", "closed")))))
             ),
 
             # (piece_id, buyer) -> contributed mutez
+            # Needed for cap checks while the piece is open; finalize_piece drops it after close.
             contributions=sp.big_map(
                 tkey=sp.TPair(sp.TNat, sp.TAddress),
                 tvalue=sp.TMutez
+            ),
+
+            # piece_id -> unit, one entry per piece finalize_piece was called on:
+            # get_user_contribution reads share balances for these pieces.
+            finalized=sp.big_map(
+                tkey=sp.TNat,
+                tvalue=sp.TUnit
+            ),
+
+            # artist -> proceeds not yet withdrawn
+            pending_payouts=sp.big_map(
+                tkey=sp.TAddress,
+                tvalue=sp.TMutez
             )
         )
 
@@ -78,6 +182,10 @@ class FractionalArtMarketV1_FA2(sp.Contract):
             artist=sp.sender,
             cap_percent=cap_percent
         )
+        sp.emit(sp.set_type_expr(
+            sp.record(collection_id=cid, artist=sp.sender, cap_percent=cap_percent),
+            CollectionCreatedEvent
+        ), tag="collection_created")
 
     @sp.entry_point
     def create_piece_from_nft(self, params):
@@ -95,7 +203,7 @@ class FractionalArtMarketV1_FA2(sp.Contract):
         Effect:
           - transfers NFT (amount=1) from artist -> market escrow
           - creates a piece sale
-          - allocates a new share_token_id used in ShareFA2
+          - the piece's shares use token_id = piece_id in ShareFA2
         """
         sp.set_type(params, sp.TRecord(
             collection_id=sp.TNat,
@@ -120,71 +228,207 @@ class FractionalArtMarketV1_FA2(sp.Contract):
         pid = self.data.next_piece_id
         self.data.next_piece_id += 1
 
-        stid = self.data.next_share_token_id
-        self.data.next_share_token_id += 1
-
         self.data.pieces[pid] = sp.record(
             collection_id=params.collection_id,
+            nft_fa2=params.nft_fa2,
+            nft_token_id=params.nft_token_id
+        )
+        self.data.funding[pid] = sp.record(
             price=params.price,
+            cap_amount=sp.split_tokens(params.price, col.cap_percent, 100),
+            artist=col.artist,
             total_raised=sp.mutez(0),
-            closed=False,
-            nft_fa2=params.nft_fa2,
-            nft_token_id=params.nft_token_id,
-            share_token_id=stid
+            closed=False
         )
+        sp.emit(sp.set_type_expr(
+            sp.record(piece_id=pid, collection_id=params.collection_id, price=params.price),
+            PieceCreatedEvent
+        ), tag="piece_created")
 
     # --------------------
-    # Buyer action
+    # Buyer actions
     # --------------------
 
-    @sp.entry_point
+    def _fund_piece(self, piece_id, buyer, amount):
+        """
+        Checks and records one contribution of `amount` from `buyer` to `piece_id`,
+        closing the piece when it becomes fully funded, and emits it.
+        Returns the piece's funding record so callers can credit the artist.
+        """
+        f = sp.local("f", self.data.funding.get_opt(piece_id).open_some("NO_PIECE"))
+        sp.verify(~f.value.closed, "PIECE_CLOSED")
+        sp.verify(amount > sp.mutez(0), "SEND_TEZ")
+
+        key = sp.pair(piece_id, buyer)
+        contributed = sp.local("contributed", self.data.contributions.get(key, sp.mutez(0)) + amount)
+
+        sp.verify(contributed.value <= f.value.cap_amount, "OVER_CAP_SHARE")
+        sp.verify(f.value.total_raised + amount <= f.value.price, "OVER_PRICE")
+
+        # Accounting; the piece closes when fully funded
+        self.data.contributions[key] = contributed.value
+        f.value.total_raised += amount
+        f.value.closed = f.value.total_raised == f.value.price
+        self.data.funding[piece_id] = f.value
+
+        sp.emit(sp.set_type_expr(
+            sp.record(
+                piece_id=piece_id,
+                buyer=buyer,
+                amount=amount,
+                total_raised=f.value.total_raised,
+                closed=f.value.closed
+            ),
+            ContributionEvent
+        ), tag="contribution")
+
+        return f.value
+
+    def _credit_artist(self, artist, amount):
+        self.data.pending_payouts[artist] = self.data.pending_payouts.get(artist, sp.mutez(0)) + amount
+
+    def _mint_shares(self, to_, token_id, amount):
+        c_mint = sp.contract(ShareMint, self.data.share_fa2, entry_point="mint").open_some("BAD_SHARE_FA2")
+        sp.transfer(sp.record(to_=to_, token_id=token_id, amount=amount), sp.mutez(0), c_mint)
+
+    def _mint_shares_batch(self, mints):
+        c_mint_batch = sp.contract(ShareMintBatch, self.data.share_fa2, entry_point="mint_batch").open_some("BAD_SHARE_FA2")
+        sp.transfer(mints, sp.mutez(0), c_mint_batch)
+
+    @sp.entry_point(lazify=False)
     def buy_piece(self, piece_id):
         sp.set_type(piece_id, sp.TNat)
-        sp.verify(self.data.pieces.contains(piece_id), "NO_PIECE")
 
-        p = self.data.pieces[piece_id]
-        sp.verify(~p.closed, "PIECE_CLOSED")
+        f = self._fund_piece(piece_id, sp.sender, sp.amount)
+
+        # Mint shares 1:1 with contributed mutez
+        if self.mint_on_buy:
+            self._mint_shares(sp.sender, piece_id, sp.utils.mutez_to_nat(sp.amount))
+
+        # Proceeds wait in pending_payouts until the artist withdraws
+        self._credit_artist(f.artist, sp.amount)
+
+    @sp.entry_point(lazify=False)
+    def buy_pieces(self, items):
+        """
+        items: list({ piece_id, amount })
+
+        Funds several pieces in one operation. Each item goes through the same
+        checks as buy_piece, and the item amounts must add up to sp.amount.
+        Shares for the whole basket are minted with one ShareFA2.mint_batch call
+        and each distinct artist's pending payout is updated once.
+        """
+        sp.set_type(items, sp.TList(
+            sp.TRecord(piece_id=sp.TNat, amount=sp.TMutez).layout(("piece_id", "amount"))
+        ))
         sp.verify(sp.amount > sp.mutez(0), "SEND_TEZ")
 
-        col = self.data.collections[p.collection_id]
-        cap_amount = sp.split_tokens(p.price, col.cap_percent, 100)
+        total = sp.local("total", sp.mutez(0))
+        mints = sp.local("mints", sp.list(t=ShareMint))
+        payouts = sp.local("payouts", sp.map(tkey=sp.TAddress, tvalue=sp.TMutez))
 
-        key = sp.pair(piece_id, sp.sender)
-        already = self.data.contributions.get(key, sp.mutez(0))
+        sp.for it in items:
+            f = self._fund_piece(it.piece_id, sp.sender, it.amount)
+            total.value += it.amount
+            if self.mint_on_buy:
+                mints.value.push(sp.record(to_=sp.sender, token_id=it.piece_id, amount=sp.utils.mutez_to_nat(it.amount)))
+            payouts.value[f.artist] = payouts.value.get(f.artist, sp.mutez(0)) + it.amount
 
-        sp.verify(already + sp.amount <= cap_amount, "OVER_CAP_SHARE")
-        sp.verify(p.total_raised + sp.amount <= p.price, "OVER_PRICE")
+        sp.verify(total.value == sp.amount, "AMOUNT_MISMATCH")
 
-        # Accounting
-        self.data.contributions[key] = already + sp.amount
-        self.data.pieces[piece_id].total_raised = p.total_raised + sp.amount
+        # Mint shares 1:1 with contributed mutez, in a single call
+        if self.mint_on_buy:
+            self._mint_shares_batch(mints.value)
 
-        # Mint shares 1:1 with contributed mutez
-        mint_amount = sp.utils.mutez_to_nat(sp.amount)
+        # Proceeds wait in pending_payouts until the artists withdraw
+        sp.for payout in payouts.value.items():
+            self._credit_artist(payout.key, payout.value)
 
-        c_mint = sp.contract(
-            sp.TRecord(to_=sp.TAddress, token_id=sp.TNat, amount=sp.TNat).layout(("to_", ("token_id", "amount"))),
-            self.data.share_fa2,
-            entry_point="mint"
-        ).open_some("BAD_SHARE_FA2")
+    # --------------------
+    # Storage cleanup
+    # --------------------
 
-        sp.transfer(
-            sp.record(to_=sp.sender, token_id=p.share_token_id, amount=mint_amount),
-            sp.mutez(0),
-            c_mint
-        )
+    def _prune_contribution(self, key):
+        sp.if self.data.contributions.contains(key):
+            del self.data.contributions[key]
+
+    def _owed(self, key):
+        """Shares recorded for `key` but not minted yet, in mutez (none when minting on buy)."""
+        return sp.mutez(0)
 
-        # v1 behavior: pay artist immediately
-        sp.send(col.artist, sp.amount)
+    @sp.entry_point
+    def finalize_piece(self, params):
+        """
+        params:
+          - piece_id
+          - buyers (list of addresses whose contribution entries to drop)
+
+        Requires:
+          - the piece is closed
+
+        Anyone can call it. A closed piece no longer needs its contributions
+        for cap checks, so it is marked finalized (one entry per piece) and
+        its share balances are the record of who holds it from then on. The
+        (piece_id, buyer) entries are deleted a batch of buyers at a time (the
+        list bounds the work of one call). Buyers without an entry are
+        skipped, so batches can be retried.
+        """
+        sp.set_type(params, sp.TRecord(
+            piece_id=sp.TNat,
+            buyers=sp.TList(sp.TAddress)
+        ).layout(("piece_id", "buyers")))
+
+        f = self.data.funding.get_opt(params.piece_id).open_some("NO_PIECE")
+        sp.verify(f.closed, "PIECE_OPEN")
+
+        self.data.finalized[params.piece_id] = sp.unit
+        sp.for buyer in params.buyers:
+            self._prune_contribution(sp.pair(params.piece_id, buyer))
+
+    # --------------------
+    # Artist payouts
+    # --------------------
+
+    @sp.entry_point
+    def withdraw(self):
+        """
+        Pays the sender's accumulated proceeds in one transfer.
+        """
+        amount = sp.local("amount", self.data.pending_payouts.get(sp.sender, sp.mutez(0)))
+        sp.verify(amount.value > sp.mutez(0), "NOTHING_TO_WITHDRAW")
 
-        # Close when fully funded
-        sp.if self.data.pieces[piece_id].total_raised == p.price:
-            self.data.pieces[piece_id].closed = True
+        del self.data.pending_payouts[sp.sender]
+        sp.send(sp.sender, amount.value)
 
     # --------------------
     # Views (read helpers)
     # --------------------
 
+    def _balances(self, requests):
+        """ShareFA2.get_balances(requests): list({ request, balance }) in request order."""
+        return sp.view(
+            "get_balances",
+            self.data.share_fa2,
+            sp.set_type_expr(requests, sp.TList(ShareBalanceRequest)),
+            t=sp.TList(ShareBalanceResponse)
+        ).open_some("BAD_SHARE_FA2")
+
+    def _piece_view(self, piece_id):
+        p = self.data.pieces[piece_id]
+        f = self.data.funding[piece_id]
+        return sp.set_type_expr(
+            sp.record(
+                collection_id=p.collection_id,
+                price=f.price,
+                total_raised=f.total_raised,
+                closed=f.closed,
+                nft_fa2=p.nft_fa2,
+                nft_token_id=p.nft_token_id,
+                share_token_id=piece_id
+            ),
+            PieceView
+        )
+
     @sp.onchain_view()
     def get_collection(self, collection_id):
         sp.set_type(collection_id, sp.TNat)
@@ -195,20 +439,114 @@ class FractionalArtMarketV1_FA2(sp.Contract):
     def get_piece(self, piece_id):
         sp.set_type(piece_id, sp.TNat)
         sp.verify(self.data.pieces.contains(piece_id), "NO_PIECE")
-        sp.result(self.data.pieces[piece_id])
+        sp.result(self._piece_view(piece_id))
 
     @sp.onchain_view()
     def get_user_contribution(self, params):
+        """
+        Until the piece is finalized, the user's recorded contribution (0 for
+        users who never contributed). Once finalize_piece has been called on
+        it, the user's share balance of the piece, 1:1 with mutez, plus any
+        shares still owed: shares bought, sold or received count, whether
+        they moved before or after finalize_piece.
+        """
         sp.set_type(params, sp.TRecord(piece_id=sp.TNat, user=sp.TAddress).layout(("piece_id", "user")))
-        sp.result(self.data.contributions.get(sp.pair(params.piece_id, params.user), sp.mutez(0)))
+        key = sp.pair(params.piece_id, params.user)
+        amount = sp.local("amount", self.data.contributions.get(key, sp.mutez(0)))
+        sp.if self.data.finalized.contains(params.piece_id):
+            with sp.match_cons(self._balances([sp.record(owner=params.user, token_id=params.piece_id)])) as r:
+                amount.value = sp.utils.nat_to_mutez(r.head.balance) + self._owed(key)
+        sp.result(amount.value)
+
+    # --------------------
+    # Bulk views: one call per page; unknown ids read as None instead of failing
+    # --------------------
+
+    @sp.onchain_view()
+    def get_collections(self, collection_ids):
+        """
+        collection_ids: list(nat)
+        Returns list(option({ artist, cap_percent })) in request order.
+        """
+        sp.set_type(collection_ids, sp.TList(sp.TNat))
+        out = sp.local("out", sp.list(t=sp.TOption(CollectionView)))
+        sp.for cid in collection_ids:
+            out.value.push(self.data.collections.get_opt(cid))
+        sp.result(out.value.rev())
+
+    @sp.onchain_view()
+    def get_pieces(self, piece_ids):
+        """
+        piece_ids: list(nat)
+        Returns list(option(get_piece record)) in request order.
+        """
+        sp.set_type(piece_ids, sp.TList(sp.TNat))
+        out = sp.local("out", sp.list(t=sp.TOption(PieceView)))
+        sp.for pid in piece_ids:
+            sp.if self.data.pieces.contains(pid):
+                out.value.push(sp.some(self._piece_view(pid)))
+            sp.else:
+                out.value.push(sp.none)
+        sp.result(out.value.rev())
+
+    @sp.onchain_view()
+    def get_piece_range(self, params):
+        """
+        params: { start, count }
+        Returns the get_piece records of piece ids start .. start + count - 1,
+        stopping at the last created piece (a shorter page is the last one).
+        """
+        sp.set_type(params, sp.TRecord(start=sp.TNat, count=sp.TNat).layout(("start", "count")))
+        stop = sp.local("stop", params.start + params.count)
+        sp.if stop.value > self.data.next_piece_id:
+            stop.value = self.data.next_piece_id
+        out = sp.local("out", sp.list(t=PieceView))
+        sp.for pid in sp.range(params.start, stop.value):
+            out.value.push(self._piece_view(pid))
+        sp.result(out.value.rev())
+
+    @sp.onchain_view()
+    def get_user_contributions(self, params):
+        """
+        params: { user, piece_ids }
+        Returns list(option(mutez)) in request order: get_user_contribution
+        for every known piece, None for unknown ones. The share balances of
+        finalized pieces are read in a single _balances call.
+        """
+        sp.set_type(params, sp.TRecord(user=sp.TAddress, piece_ids=sp.TList(sp.TNat)).layout(("user", "piece_ids")))
+
+        # Finalized pieces are answered by the share balances, read in a single call
+        requests = sp.local("requests", sp.list(t=ShareBalanceRequest))
+        sp.for pid in params.piece_ids:
+            sp.if self.data.finalized.contains(pid):
+                requests.value.push(sp.record(owner=params.user, token_id=pid))
+        shares = sp.local("shares", sp.map(tkey=sp.TNat, tvalue=sp.TMutez))
+        sp.if sp.len(requests.value) > 0:
+            sp.for r in self._balances(requests.value):
+                shares.value[r.request.token_id] = sp.utils.nat_to_mutez(r.balance)
+
+        out = sp.local("out", sp.list(t=sp.TOption(sp.TMutez)))
+        sp.for pid in params.piece_ids:
+            key = sp.pair(pid, params.user)
+            sp.if self.data.finalized.contains(pid):
+                out.value.push(sp.some(shares.value[pid] + self._owed(key)))
+            sp.else:
+                sp.if self.data.funding.contains(pid):
+                    out.value.push(sp.some(self.data.contributions.get(key, sp.mutez(0))))
+                sp.else:
+                    out.value.push(sp.none)
+        sp.result(out.value.rev())
+
+    @sp.onchain_view()
+    def get_pending_payout(self, artist):
+        sp.set_type(artist, sp.TAddress)
+        sp.result(self.data.pending_payouts.get(artist, sp.mutez(0)))
 
     @sp.onchain_view()
     def get_cap_amount(self, piece_id):
         sp.set_type(piece_id, sp.TNat)
-        sp.verify(self.data.pieces.contains(piece_id), "NO_PIECE")
-        p = self.data.pieces[piece_id]
-        col = self.data.collections[p.collection_id]
-        sp.result(sp.split_tokens(p.price, col.cap_percent, 100))
+        sp.verify(self.data.funding.contains(piece_id), "NO_PIECE")
+        sp.result(self.data.funding[piece_id].cap_amount)
 
 
 # ------------------------
@@ -218,3 +556,8 @@ sp.add_compilation_target(
     "market_v1",
     FractionalArtMarketV1_FA2(share_fa2=sp.address("KT1-share-placeholder-address-1234"))
 )
+
+sp.add_compilation_target(
+    "market_v1_lazy",
+    FractionalArtMarketV1_FA2(share_fa2=sp.address("KT1-share-placeholder-address-1234"), lazy_entry_points=True)
+)
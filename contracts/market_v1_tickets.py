@@ -0,0 +1,49 @@
+import smartpy as sp
+
+import sys
+sys.path.append('..')
+from contracts.market_v1_fa2 import FractionalArtMarketV1_FA2
+from contracts.share_ticket_wrapper import ShareTicket
+
+
+class FractionalArtMarketV1_Tickets(FractionalArtMarketV1_FA2):
+    """
+    Experimental v1 build with ticket shares:
+    - buy_piece / buy_pieces send the buyer a ticket instead of minting on
+      ShareFA2: ticketer = this market, content = the piece's share token id
+      (piece_id), amount = contributed mutez
+    - The buyer must accept ticket(nat) on its default entrypoint (implicit
+      accounts hold tickets directly, contract wallets declare %default)
+    - Holders move tickets (transfer_ticket, or contract calls) without
+      writing to a shared ledger; ShareTicketWrapper converts them to FA2
+      balances and back
+    - finalize_piece is disabled: tickets held outside the wrapper are not
+      readable, so the contributions stay the record of who funded a piece
+    """
+
+    def _mint_shares(self, to_, token_id, amount):
+        receiver = sp.contract(ShareTicket, to_).open_some("NO_TICKET_RECEIVER")
+        sp.transfer(sp.ticket(token_id, amount), sp.mutez(0), receiver)
+
+    def _mint_shares_batch(self, mints):
+        # One ticket per basket item
+        sp.for m in mints:
+            self._mint_shares(m.to_, m.token_id, m.amount)
+
+    @sp.entry_point
+    def finalize_piece(self, params):
+        """
+        Always fails: pruning would leave the wrapper's balance as the only
+        record, and buyers holding unwrapped tickets would read 0.
+        """
+        sp.set_type(params, sp.TRecord(piece_id=sp.TNat, buyers=sp.TList(sp.TAddress)).layout(("piece_id", "buyers")))
+        sp.failwith("FINALIZE_DISABLED")
+
+
+# ------------------------
+# Taqueria compilation target
+# ------------------------
+sp.add_compilation_target(
+    "market_v1_tickets",
+    FractionalArtMarketV1_Tickets(share_fa2=sp.address("KT1-share-placeholder-address-1234"))
+)
@@ -1,25 +1,72 @@
 import smartpy as sp
 
-class ShareFA2(sp.Contract):
+# FA2 param types
+OperatorKey = sp.TRecord(
+    owner=sp.TAddress,
+    operator=sp.TAddress,
+    token_id=sp.TNat
+).layout(("owner", ("operator", "token_id")))
+
+UpdateOperatorsParam = sp.TList(sp.TVariant(add_operator=OperatorKey, remove_operator=OperatorKey))
+
+TransferTx = sp.TRecord(
+    to_=sp.TAddress,
+    token_id=sp.TNat,
+    amount=sp.TNat
+).layout(("to_", ("token_id", "amount")))
+
+TransferParam = sp.TList(sp.TRecord(from_=sp.TAddress, txs=sp.TList(TransferTx)).layout(("from_", "txs")))
+
+# TZIP-12 balance_of
+BalanceOfRequest = sp.TRecord(
+    owner=sp.TAddress,
+    token_id=sp.TNat
+).layout(("owner", "token_id"))
+
+BalanceOfResponse = sp.TRecord(
+    request=BalanceOfRequest,
+    balance=sp.TNat
+).layout(("request", "balance"))
+
+BalanceOfParam = sp.TRecord(
+    requests=sp.TList(BalanceOfRequest),
+    callback=sp.TContract(sp.TList(BalanceOfResponse))
+).layout(("requests", "callback"))
+
+MintParam = sp.TRecord(
+    to_=sp.TAddress,
+    token_id=sp.TNat,
+    amount=sp.TNat
+).layout(("to_", ("token_id", "amount")))
+
+# Event payloads: tag "mint" (one per credited (to_, token_id)), tag "transfer"
+# (one per transfer batch, as in the parameter), tag "burn"
+MintEvent = MintParam
+
+TransferEvent = sp.TRecord(from_=sp.TAddress, txs=sp.TList(TransferTx)).layout(("from_", "txs"))
+
+BurnEvent = sp.TRecord(
+    from_=sp.TAddress,
+    token_id=sp.TNat,
+    amount=sp.TNat
+).layout(("from_", ("token_id", "amount")))
+
+
+class ShareLedger:
     """
-    Minimal FA2-like fungible token for shares.
-    - Balances are nat
-    - Operators supported
-    - Mint is restricted to admin (the Market contract)
-    - set_admin is used to hand admin rights to the Market after deployment
+    FA2 share ledger logic (balances, operators, supply).
+    Mixed into ShareFA2 and into contracts that embed the share ledger
+    in their own storage (see ledger_storage). Mints and transfers are
+    emitted as events by whichever contract holds the ledger.
     """
 
-    def __init__(self, admin):
-        self.init(
-            admin=admin,
+    @staticmethod
+    def ledger_storage():
+        return dict(
             # (owner, token_id) -> balance
             ledger=sp.big_map(tkey=sp.TPair(sp.TAddress, sp.TNat), tvalue=sp.TNat),
             # (owner, operator, token_id) -> unit
-            operators=sp.big_map(
-                tkey=sp.TRecord(owner=sp.TAddress, operator=sp.TAddress, token_id=sp.TNat)
-                    .layout(("owner", ("operator", "token_id"))),
-                tvalue=sp.TUnit
-            ),
+            operators=sp.big_map(tkey=OperatorKey, tvalue=sp.TUnit),
             # token_id -> total_supply
             total_supply=sp.big_map(tkey=sp.TNat, tvalue=sp.TNat)
         )
@@ -30,23 +77,7 @@ class ShareFA2(sp.Contract):
     def _is_operator(self, owner, operator, token_id):
         return self.data.operators.contains(self._operator_key(owner, operator, token_id))
 
-    @sp.entry_point
-    def set_admin(self, new_admin):
-        sp.set_type(new_admin, sp.TAddress)
-        sp.verify(sp.sender == self.data.admin, "NOT_ADMIN")
-        self.data.admin = new_admin
-
-    @sp.entry_point
-    def update_operators(self, params):
-        """
-        params: list( variant(add_operator | remove_operator) )
-        """
-        t_op = sp.TRecord(owner=sp.TAddress, operator=sp.TAddress, token_id=sp.TNat)\
-            .layout(("owner", ("operator", "token_id")))
-        t_item = sp.TVariant(add_operator=t_op, remove_operator=t_op)
-
-        sp.set_type(params, sp.TList(t_item))
-
+    def _update_operators(self, params):
         sp.for it in params:
             sp.if it.is_variant("add_operator"):
                 r = it.open_variant("add_operator")
@@ -59,6 +90,116 @@ class ShareFA2(sp.Contract):
                 sp.if self.data.operators.contains(key):
                     del self.data.operators[key]
 
+    def _load_balance(self, balances, key):
+        sp.if ~balances.value.contains(key):
+            balances.value[key] = self.data.ledger.get(key, 0)
+
+    def _transfer(self, txs):
+        # Balances are read once into a local map, moved there tx by tx and
+        # written back once per touched key. Txs still apply in order, so a
+        # batch fails exactly where the uncoalesced version would.
+        balances = sp.local("balances", sp.map(tkey=sp.TPair(sp.TAddress, sp.TNat), tvalue=sp.TNat))
+        # (from_, token_id) pairs whose operator rights were already checked
+        approved = sp.local("approved", sp.set(t=sp.TPair(sp.TAddress, sp.TNat)))
+
+        sp.for batch in txs:
+            sp.for tx in batch.txs:
+                from_key = sp.pair(batch.from_, tx.token_id)
+                to_key = sp.pair(tx.to_, tx.token_id)
+
+                sp.if (sp.sender != batch.from_) & ~approved.value.contains(from_key):
+                    sp.verify(self._is_operator(batch.from_, sp.sender, tx.token_id), "NOT_OPERATOR")
+                    approved.value.add(from_key)
+
+                self._load_balance(balances, from_key)
+                sp.verify(balances.value[from_key] >= tx.amount, "INSUFFICIENT_BALANCE")
+                balances.value[from_key] = sp.as_nat(balances.value[from_key] - tx.amount)
+
+                self._load_balance(balances, to_key)
+                balances.value[to_key] += tx.amount
+
+            sp.emit(sp.set_type_expr(batch, TransferEvent), tag="transfer")
+
+        sp.for b in balances.value.items():
+            self.data.ledger[b.key] = b.value
+
+    def _balance_responses(self, requests, check_tokens):
+        """
+        One response per request, in request order. With check_tokens, a token
+        that was never minted fails with FA2_TOKEN_UNDEFINED (TZIP-12 balance_of);
+        otherwise its balances read as 0.
+        """
+        responses = sp.local("responses", sp.list(t=BalanceOfResponse))
+        sp.for req in requests:
+            if check_tokens:
+                sp.verify(self.data.total_supply.contains(req.token_id), "FA2_TOKEN_UNDEFINED")
+            responses.value.push(sp.record(
+                request=req,
+                balance=self.data.ledger.get(sp.pair(req.owner, req.token_id), 0)
+            ))
+        return responses.value.rev()
+
+    def _mint(self, to_, token_id, amount):
+        sp.verify(amount > 0, "ZERO_MINT")
+
+        key = sp.pair(to_, token_id)
+        self.data.ledger[key] = self.data.ledger.get(key, 0) + amount
+        self.data.total_supply[token_id] = self.data.total_supply.get(token_id, 0) + amount
+        sp.emit(sp.set_type_expr(sp.record(to_=to_, token_id=token_id, amount=amount), MintEvent), tag="mint")
+
+    def _mint_batch(self, mints):
+        # Sum amounts per ledger key and per token first, so every touched
+        # big_map key is read and written once, however many records hit it.
+        credits = sp.local("credits", sp.map(tkey=sp.TPair(sp.TAddress, sp.TNat), tvalue=sp.TNat))
+        supply = sp.local("supply", sp.map(tkey=sp.TNat, tvalue=sp.TNat))
+
+        sp.for m in mints:
+            sp.verify(m.amount > 0, "ZERO_MINT")
+            key = sp.pair(m.to_, m.token_id)
+            credits.value[key] = credits.value.get(key, 0) + m.amount
+            supply.value[m.token_id] = supply.value.get(m.token_id, 0) + m.amount
+
+        sp.for c in credits.value.items():
+            self.data.ledger[c.key] = self.data.ledger.get(c.key, 0) + c.value
+            sp.emit(sp.set_type_expr(
+                sp.record(to_=sp.fst(c.key), token_id=sp.snd(c.key), amount=c.value),
+                MintEvent
+            ), tag="mint")
+
+        sp.for t in supply.value.items():
+            self.data.total_supply[t.key] = self.data.total_supply.get(t.key, 0) + t.value
+
+
+class ShareFA2(ShareLedger, sp.Contract):
+    """
+    Minimal FA2-like fungible token for shares.
+    - Balances are nat
+    - Operators supported
+    - TZIP-12 balance_of, plus the get_balances view for batched reads
+    - Mint (single or batched) is restricted to admin (the Market contract)
+    - set_admin is used to hand admin rights to the Market after deployment
+    """
+
+    def __init__(self, admin):
+        self.init(
+            admin=admin,
+            **ShareLedger.ledger_storage()
+        )
+
+    @sp.entry_point
+    def set_admin(self, new_admin):
+        sp.set_type(new_admin, sp.TAddress)
+        sp.verify(sp.sender == self.data.admin, "NOT_ADMIN")
+        self.data.admin = new_admin
+
+    @sp.entry_point
+    def update_operators(self, params):
+        """
+        params: list( variant(add_operator | remove_operator) )
+        """
+        sp.set_type(params, UpdateOperatorsParam)
+        self._update_operators(params)
+
     @sp.entry_point
     def transfer(self, txs):
         """
@@ -67,27 +208,17 @@ class ShareFA2(sp.Contract):
           txs: list({ to_: address, token_id: nat, amount: nat })
         })
         """
-        t_tx = sp.TRecord(to_=sp.TAddress, token_id=sp.TNat, amount=sp.TNat)\
-            .layout(("to_", ("token_id", "amount")))
-        t_item = sp.TRecord(from_=sp.TAddress, txs=sp.TList(t_tx))\
-            .layout(("from_", "txs"))
-        sp.set_type(txs, sp.TList(t_item))
-
-        sp.for batch in txs:
-            sp.for tx in batch.txs:
-                sp.verify(
-                    (sp.sender == batch.from_) | self._is_operator(batch.from_, sp.sender, tx.token_id),
-                    "NOT_OPERATOR"
-                )
-
-                from_key = sp.pair(batch.from_, tx.token_id)
-                to_key = sp.pair(tx.to_, tx.token_id)
-
-                from_bal = self.data.ledger.get(from_key, 0)
-                sp.verify(from_bal >= tx.amount, "INSUFFICIENT_BALANCE")
+        sp.set_type(txs, TransferParam)
+        self._transfer(txs)
 
-                self.data.ledger[from_key] = from_bal - tx.amount
-                self.data.ledger[to_key] = self.data.ledger.get(to_key, 0) + tx.amount
+    @sp.entry_point
+    def balance_of(self, params):
+        """
+        params: { requests: list({ owner, token_id }), callback }
+        Calls back with list({ request, balance }), in request order.
+        """
+        sp.set_type(params, BalanceOfParam)
+        sp.transfer(self._balance_responses(params.requests, True), sp.mutez(0), params.callback)
 
     @sp.entry_point
     def mint(self, params):
@@ -95,18 +226,36 @@ class ShareFA2(sp.Contract):
         params: { to_, token_id, amount }
         Only admin can mint (Market).
         """
-        sp.set_type(params, sp.TRecord(to_=sp.TAddress, token_id=sp.TNat, amount=sp.TNat)
-                             .layout(("to_", ("token_id", "amount"))))
+        sp.set_type(params, MintParam)
+        sp.verify(sp.sender == self.data.admin, "NOT_ADMIN")
+        self._mint(params.to_, params.token_id, params.amount)
+
+    @sp.entry_point
+    def mint_batch(self, params):
+        """
+        params: list({ to_, token_id, amount })
+        Only admin can mint (Market).
+        """
+        sp.set_type(params, sp.TList(MintParam))
         sp.verify(sp.sender == self.data.admin, "NOT_ADMIN")
-        sp.verify(params.amount > 0, "ZERO_MINT")
+        self._mint_batch(params)
 
-        key = sp.pair(params.to_, params.token_id)
-        self.data.ledger[key] = self.data.ledger.get(key, 0) + params.amount
-        self.data.total_supply[params.token_id] = self.data.total_supply.get(params.token_id, 0) + params.amount
+    # --------------------
+    # Views
+    # --------------------
+
+    @sp.onchain_view()
+    def get_balances(self, requests):
+        """
+        requests: list({ owner, token_id })
+        Returns list({ request, balance }) in request order; unknown tokens read as 0.
+        """
+        sp.set_type(requests, sp.TList(BalanceOfRequest))
+        sp.result(self._balance_responses(requests, False))
 
 
 # ------------------------
-# Taqueria compilation target 
+# Taqueria compilation target
 # ------------------------
 sp.add_compilation_target(
     "share_fa2",
@@ -0,0 +1,154 @@
+import smartpy as sp
+
+import sys
+sys.path.append('..')
+from contracts.share_fa2 import (ShareLedger, UpdateOperatorsParam, TransferParam, BalanceOfParam, BalanceOfRequest,
+                                 BurnEvent)
+
+# Share tickets: content = share token id (piece_id), amount = share units
+ShareTicket = sp.TTicket(sp.TNat)
+
+UnwrapParam = sp.TRecord(
+    token_id=sp.TNat,
+    amount=sp.TNat,
+    receiver=sp.TContract(ShareTicket)
+).layout(("token_id", ("amount", "receiver")))
+
+
+class ShareTicketWrapper(ShareLedger, sp.Contract):
+    """
+    Experimental: converts the share tickets of the tickets market build
+    (FractionalArtMarketV1_Tickets) to FA2 balances and back.
+    - wrap: send a share ticket; the sender is credited the same FA2 balance
+      and the ticket is kept, joined with the others of its token id
+    - unwrap: burn FA2 balance and receive a ticket of that amount, split off
+      the held one
+    - FA2 transfer / update_operators / balance_of / get_balances on the
+      wrapped balances; total_supply is the amount wrapped per token id
+    - Emits the ShareLedger mint / transfer events, and burn on unwrap
+    - Only tickets issued by `ticketer` (the market) are accepted; the admin
+      sets it after deployment, as with ShareFA2.set_admin
+    """
+
+    def __init__(self, admin):
+        self.init(
+            admin=admin,
+            ticketer=admin,
+            # token_id -> every wrapped ticket of that token, joined
+            tickets=sp.big_map(tkey=sp.TNat, tvalue=ShareTicket),
+            **ShareLedger.ledger_storage()
+        )
+
+    @sp.entry_point
+    def set_ticketer(self, ticketer):
+        sp.set_type(ticketer, sp.TAddress)
+        sp.verify(sp.sender == self.data.admin, "NOT_ADMIN")
+        self.data.ticketer = ticketer
+
+    # --------------------
+    # Tickets <-> balances
+    # --------------------
+
+    def _put_ticket(self, token_id, ticket):
+        # Tickets cannot be copied: take the held one out, join, put it back
+        with sp.modify_record(self.data, "data") as data:
+            held, tickets = sp.match_tuple(sp.get_and_update(data.tickets, token_id, sp.none), "held", "tickets")
+            with held.match_cases() as arg:
+                with arg.match("None"):
+                    data.tickets = sp.update_map(tickets, token_id, sp.some(ticket))
+                with arg.match("Some") as t:
+                    data.tickets = sp.update_map(tickets, token_id, sp.join_tickets_raw((t, ticket)))
+
+    @sp.entry_point
+    def wrap(self, ticket):
+        """
+        ticket: ticket(token_id) from the market
+        Credits the sender with the ticket amount.
+        """
+        sp.set_type(ticket, ShareTicket)
+        ticket_data, copy = sp.read_ticket(ticket)
+        sp.verify(ticket_data.ticketer == self.data.ticketer, "BAD_TICKETER")
+        self._mint(sp.sender, ticket_data.content, ticket_data.amount)
+        self._put_ticket(ticket_data.content, copy)
+
+    @sp.entry_point
+    def unwrap(self, params):
+        """
+        params: { token_id, amount, receiver: contract(ticket(nat)) }
+        Burns `amount` of the sender's balance and sends a ticket of that amount to `receiver`.
+        """
+        sp.set_type(params, UnwrapParam)
+        sp.verify(params.amount > 0, "ZERO_AMOUNT")
+
+        key = sp.pair(sp.sender, params.token_id)
+        sp.verify(self.data.ledger.get(key, 0) >= params.amount, "INSUFFICIENT_BALANCE")
+        self.data.ledger[key] = sp.as_nat(self.data.ledger[key] - params.amount)
+        self.data.total_supply[params.token_id] = sp.as_nat(self.data.total_supply[params.token_id] - params.amount)
+        sp.emit(sp.set_type_expr(
+            sp.record(from_=sp.sender, token_id=params.token_id, amount=params.amount),
+            BurnEvent
+        ), tag="burn")
+
+        with sp.modify_record(self.data, "data") as data:
+            held, tickets = sp.match_tuple(sp.get_and_update(data.tickets, params.token_id, sp.none), "held", "tickets")
+            ticket_data, copy = sp.read_ticket(held.open_some("NO_TICKET"))
+            sp.if ticket_data.amount == params.amount:
+                data.tickets = tickets
+                sp.transfer(copy, sp.mutez(0), params.receiver)
+            sp.else:
+                out, keep = sp.match_pair(sp.split_ticket_raw(
+                    copy,
+                    (params.amount, sp.as_nat(ticket_data.amount - params.amount))
+                ).open_some("BAD_SPLIT"))
+                data.tickets = sp.update_map(tickets, params.token_id, sp.some(keep))
+                sp.transfer(out, sp.mutez(0), params.receiver)
+
+    # --------------------
+    # FA2 entrypoints on wrapped balances
+    # --------------------
+
+    @sp.entry_point
+    def update_operators(self, params):
+        """
+        params: list( variant(add_operator | remove_operator) )
+        """
+        sp.set_type(params, UpdateOperatorsParam)
+        self._update_operators(params)
+
+    @sp.entry_point
+    def transfer(self, txs):
+        """
+        txs: list({
+          from_: address,
+          txs: list({ to_: address, token_id: nat, amount: nat })
+        })
+        """
+        sp.set_type(txs, TransferParam)
+        self._transfer(txs)
+
+    @sp.entry_point
+    def balance_of(self, params):
+        """
+        params: { requests: list({ owner, token_id }), callback }
+        Calls back with list({ request, balance }), in request order.
+        """
+        sp.set_type(params, BalanceOfParam)
+        sp.transfer(self._balance_responses(params.requests, True), sp.mutez(0), params.callback)
+
+    @sp.onchain_view()
+    def get_balances(self, requests):
+        """
+        requests: list({ owner, token_id })
+        Returns list({ request, balance }) in request order; unknown tokens read as 0.
+        """
+        sp.set_type(requests, sp.TList(BalanceOfRequest))
+        sp.result(self._balance_responses(requests, False))
+
+
+# ------------------------
+# Taqueria compilation target
+# ------------------------
+sp.add_compilation_target(
+    "share_ticket_wrapper",
+    ShareTicketWrapper(admin=sp.address("tz1-admin-placeholder-address-1234"))
+)
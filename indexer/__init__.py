@@ -0,0 +1,9 @@
+"""
+Incremental off-chain indexer for the market and share contracts.
+
+Follows the chain block by block, applies the big_map diffs of the
+indexed contracts (collections, pieces, funding, contributions,
+pending_payouts, ledger, total_supply) to normalized SQLite tables,
+stores their events, and records the last applied level, so a restarted
+run resumes where it stopped. See docs/INDEXER.md.
+"""
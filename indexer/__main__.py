@@ -0,0 +1,67 @@
+"""
+Usage:
+  python -m indexer --market KT1... --share KT1... [--db indexer.sqlite]
+                    [--from-level N] [--to-level N] [--follow] [--events-only]
+
+Indexes the given contracts into SQLite, resuming from the checkpoint
+stored in the database. --from-level only applies to a fresh database
+(use the origination level of the oldest contract). --follow keeps
+polling the node, staying --confirmations blocks behind head.
+--events-only only records the contracts' events (events table).
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+from bench.__main__ import default_rpc_url
+from indexer.db import Database
+from indexer.source import RpcSource
+from indexer.sync import Indexer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m indexer", description="Market and share storage indexer")
+    parser.add_argument("--rpc-url", default=default_rpc_url())
+    parser.add_argument("--db", default="indexer.sqlite")
+    parser.add_argument("--market", action="append", default=[], help="market contract (any build), repeatable")
+    parser.add_argument("--share", action="append", default=[], help="ShareFA2 contract, repeatable")
+    parser.add_argument("--from-level", type=int, default=0, help="first level on a fresh database")
+    parser.add_argument("--to-level", type=int, default=None)
+    parser.add_argument("--follow", action="store_true", help="keep polling for new blocks")
+    parser.add_argument("--confirmations", type=int, default=2,
+                        help="stay this many blocks behind head (reorgs are not rolled back)")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--events-only", action="store_true",
+                        help="record the contracts' events only, not their big_map diffs")
+    args = parser.parse_args(argv)
+
+    contracts = args.market + args.share
+    if not contracts:
+        parser.error("give at least one --market or --share contract")
+
+    source = RpcSource(args.rpc_url)
+    db = Database(args.db)
+    indexer = Indexer(db, source, contracts, events_only=args.events_only)
+    try:
+        while True:
+            target = source.head_level() - args.confirmations
+            if args.to_level is not None:
+                target = min(target, args.to_level)
+            level = indexer.sync(args.from_level, target)
+            if not args.follow or (args.to_level is not None and level >= args.to_level):
+                break
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cp = db.checkpoint()
+        db.close()
+    print("indexed up to level %s" % (cp[0] if cp else "-"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+SQLite schema and writes.
+
+Every table is keyed by the contract address first, so several
+deployments (e.g. the two-contract and the combined market) can share a
+database. Amounts are in mutez, share balances in share units. Event
+payloads are stored as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    level INTEGER NOT NULL,
+    block_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS big_maps (
+    big_map_id INTEGER PRIMARY KEY,
+    contract TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS collections (
+    contract TEXT NOT NULL,
+    collection_id INTEGER NOT NULL,
+    artist TEXT,
+    cap_percent INTEGER,
+    PRIMARY KEY (contract, collection_id)
+);
+CREATE TABLE IF NOT EXISTS pieces (
+    contract TEXT NOT NULL,
+    piece_id INTEGER NOT NULL,
+    collection_id INTEGER,
+    nft_fa2 TEXT,
+    nft_token_id INTEGER,
+    price INTEGER,
+    cap_amount INTEGER,
+    artist TEXT,
+    total_raised INTEGER,
+    closed INTEGER,
+    PRIMARY KEY (contract, piece_id)
+);
+CREATE TABLE IF NOT EXISTS contributions (
+    contract TEXT NOT NULL,
+    piece_id INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    amount INTEGER,
+    PRIMARY KEY (contract, piece_id, user)
+);
+CREATE INDEX IF NOT EXISTS contributions_by_user ON contributions (user);
+CREATE TABLE IF NOT EXISTS pending_payouts (
+    contract TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    amount INTEGER,
+    PRIMARY KEY (contract, artist)
+);
+CREATE TABLE IF NOT EXISTS balances (
+    contract TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    balance INTEGER,
+    PRIMARY KEY (contract, owner, token_id)
+);
+CREATE INDEX IF NOT EXISTS balances_by_token ON balances (contract, token_id);
+CREATE TABLE IF NOT EXISTS total_supply (
+    contract TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    supply INTEGER,
+    PRIMARY KEY (contract, token_id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    contract TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    op_hash TEXT NOT NULL,
+    tag TEXT,
+    payload TEXT,
+    PRIMARY KEY (contract, level, position)
+);
+CREATE INDEX IF NOT EXISTS events_by_tag ON events (contract, tag, level);
+"""
+
+
+class Database:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def transaction(self):
+        """Context manager: commits on success, rolls back on error."""
+        return self.conn
+
+    # --------------------
+    # Checkpoint and big_map registry
+    # --------------------
+
+    def checkpoint(self):
+        """(level, block_hash) of the last applied block, or None."""
+        return self.conn.execute("SELECT level, block_hash FROM checkpoint WHERE id = 0").fetchone()
+
+    def set_checkpoint(self, level, block_hash):
+        self.conn.execute(
+            "INSERT INTO checkpoint (id, level, block_hash) VALUES (0, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET level = excluded.level, block_hash = excluded.block_hash",
+            (level, block_hash),
+        )
+
+    def big_maps(self):
+        """{big_map_id: (contract, name)}"""
+        rows = self.conn.execute("SELECT big_map_id, contract, name FROM big_maps")
+        return {big_map_id: (contract, name) for big_map_id, contract, name in rows}
+
+    def register_big_map(self, big_map_id, contract, name):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO big_maps (big_map_id, contract, name) VALUES (?, ?, ?)",
+            (big_map_id, contract, name),
+        )
+
+    # --------------------
+    # Rows
+    # --------------------
+
+    def upsert(self, table, key, values):
+        cols = list(key) + list(values)
+        updates = ", ".join("%s = excluded.%s" % (c, c) for c in values)
+        self.conn.execute(
+            "INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (%s) DO UPDATE SET %s" % (
+                table, ", ".join(cols), ", ".join("?" * len(cols)), ", ".join(key), updates),
+            [key[c] for c in key] + [values[c] for c in values],
+        )
+
+    def clear(self, table, key, columns):
+        """
+        Removal of a big_map entry: nulls the columns that entry fed and drops
+        the row once no column is left (pieces rows are fed by two big_maps).
+        """
+        where = " AND ".join("%s = ?" % c for c in key)
+        params = [key[c] for c in key]
+        self.conn.execute(
+            "UPDATE %s SET %s WHERE %s" % (table, ", ".join("%s = NULL" % c for c in columns), where),
+            params,
+        )
+        value_cols = [r[1] for r in self.conn.execute("PRAGMA table_info(%s)" % table) if r[1] not in key]
+        self.conn.execute(
+            "DELETE FROM %s WHERE %s AND %s" % (table, where, " AND ".join("%s IS NULL" % c for c in value_cols)),
+            params,
+        )
+
+    # --------------------
+    # Events
+    # --------------------
+
+    def add_event(self, contract, level, position, op_hash, tag, payload):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO events (contract, level, position, op_hash, tag, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (contract, level, position, op_hash, tag, json.dumps(payload, sort_keys=True)),
+        )
+
+    def events(self, contract=None, tag=None, since_level=0):
+        """[(contract, level, op_hash, tag, payload)] in chain order, optionally filtered."""
+        where, params = ["level >= ?"], [since_level]
+        if contract is not None:
+            where.append("contract = ?")
+            params.append(contract)
+        if tag is not None:
+            where.append("tag = ?")
+            params.append(tag)
+        rows = self.conn.execute(
+            "SELECT contract, level, op_hash, tag, payload FROM events WHERE %s ORDER BY level, position"
+            % " AND ".join(where), params)
+        return [(c, level, op_hash, t, json.loads(p)) for c, level, op_hash, t, p in rows]
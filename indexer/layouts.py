@@ -0,0 +1,105 @@
+"""
+Storage layouts of the indexed big_maps and the SQLite tables they map to,
+and the payload layouts of the contracts' events.
+
+Big_maps are recognised by their field annotation in the storage type,
+so the same layouts serve FractionalArtMarketV1_FA2 (and its deferred
+and lazy builds), ShareFA2 and the combined single-contract market. Key
+and value fields are listed in the order of the right comb declared by
+`.layout(...)` in contracts/.
+"""
+
+from __future__ import annotations
+
+from michelson.micheline import MichelineError, comb, to_address, to_bool, to_int
+
+
+class MapLayout:
+    def __init__(self, table, key, value):
+        self.table = table
+        self.key = key
+        self.value = value
+
+    @property
+    def columns(self):
+        return [name for name, _ in self.value]
+
+    def decode_key(self, node):
+        return {name: dec(n) for (name, dec), n in zip(self.key, comb(node, len(self.key)))}
+
+    def decode_value(self, node):
+        return {name: dec(n) for (name, dec), n in zip(self.value, comb(node, len(self.value)))}
+
+
+def record(fields):
+    """Decoder of a right-comb record into {name: value}."""
+    def decode(node):
+        return {name: dec(n) for (name, dec), n in zip(fields, comb(node, len(fields)))}
+    return decode
+
+
+def list_of(dec):
+    def decode(node):
+        if not isinstance(node, list):
+            raise MichelineError("expected a list, got %r" % (node,))
+        return [dec(n) for n in node]
+    return decode
+
+
+# big_map field annotation -> layout
+BIG_MAPS = {
+    # FractionalArtMarketV1_FA2
+    "collections": MapLayout(
+        "collections",
+        key=[("collection_id", to_int)],
+        value=[("artist", to_address), ("cap_percent", to_int)],
+    ),
+    # pieces (cold listing) and funding (hot state) share one row per piece
+    "pieces": MapLayout(
+        "pieces",
+        key=[("piece_id", to_int)],
+        value=[("collection_id", to_int), ("nft_fa2", to_address), ("nft_token_id", to_int)],
+    ),
+    "funding": MapLayout(
+        "pieces",
+        key=[("piece_id", to_int)],
+        value=[("price", to_int), ("cap_amount", to_int), ("artist", to_address),
+               ("total_raised", to_int), ("closed", to_bool)],
+    ),
+    "contributions": MapLayout(
+        "contributions",
+        key=[("piece_id", to_int), ("user", to_address)],
+        value=[("amount", to_int)],
+    ),
+    "pending_payouts": MapLayout(
+        "pending_payouts",
+        key=[("artist", to_address)],
+        value=[("amount", to_int)],
+    ),
+    # ShareFA2 (or the combined market)
+    "ledger": MapLayout(
+        "balances",
+        key=[("owner", to_address), ("token_id", to_int)],
+        value=[("balance", to_int)],
+    ),
+    "total_supply": MapLayout(
+        "total_supply",
+        key=[("token_id", to_int)],
+        value=[("supply", to_int)],
+    ),
+}
+
+# event tag -> payload decoder (see the *Event types in contracts/)
+_SHARE_TX = [("to_", to_address), ("token_id", to_int), ("amount", to_int)]
+
+EVENTS = {
+    # FractionalArtMarketV1_FA2 (every build)
+    "collection_created": record([("collection_id", to_int), ("artist", to_address), ("cap_percent", to_int)]),
+    "piece_created": record([("piece_id", to_int), ("collection_id", to_int), ("price", to_int)]),
+    "contribution": record([("piece_id", to_int), ("buyer", to_address), ("amount", to_int),
+                            ("total_raised", to_int), ("closed", to_bool)]),
+    # ShareFA2, the combined market and ShareTicketWrapper
+    "mint": record(_SHARE_TX),
+    "transfer": record([("from_", to_address), ("txs", list_of(record(_SHARE_TX)))]),
+    "burn": record([("from_", to_address), ("token_id", to_int), ("amount", to_int)]),
+}
@@ -0,0 +1,73 @@
+"""
+Block sources: the node RPC, or a recorded fixture file for tests.
+
+A block is {"level", "hash", "predecessor", "operations"}, where
+"operations" is the manager pass (`/operations/3`) with receipts.
+"""
+
+from __future__ import annotations
+
+import json
+import urllib.error
+import urllib.request
+
+
+class SourceError(Exception):
+    pass
+
+
+class RpcSource:
+    def __init__(self, rpc_url, timeout=30):
+        self.rpc_url = rpc_url.rstrip("/")
+        self.timeout = timeout
+
+    def rpc(self, path):
+        try:
+            with urllib.request.urlopen(self.rpc_url + path, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.URLError as e:
+            raise SourceError("GET %s: %s" % (path, e))
+
+    def head_level(self):
+        return self.rpc("/chains/main/blocks/head/header")["level"]
+
+    def block(self, level):
+        header = self.rpc("/chains/main/blocks/%d/header" % level)
+        return {
+            "level": header["level"],
+            "hash": header["hash"],
+            "predecessor": header["predecessor"],
+            "operations": self.rpc("/chains/main/blocks/%d/operations/3" % level),
+        }
+
+    def script(self, address):
+        return self.rpc("/chains/main/blocks/head/context/contracts/%s/script" % address)
+
+
+class FixtureSource:
+    """
+    Recorded chain data:
+      {"scripts": {address: script}, "blocks": [block, ...]}
+    """
+
+    def __init__(self, data):
+        self.scripts = data["scripts"]
+        self.blocks = {b["level"]: b for b in data["blocks"]}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def head_level(self):
+        return max(self.blocks)
+
+    def block(self, level):
+        if level not in self.blocks:
+            raise SourceError("no recorded block at level %d" % level)
+        return self.blocks[level]
+
+    def script(self, address):
+        if address not in self.scripts:
+            raise SourceError("no recorded script for %s" % address)
+        return self.scripts[address]
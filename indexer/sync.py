@@ -0,0 +1,141 @@
+"""
+Block-by-block synchronisation.
+
+Each block is applied in one SQLite transaction together with the
+checkpoint, so an interrupted run never leaves half a block behind and
+the next run resumes at checkpoint + 1. Only applied operation results
+carry diffs and events; failed and backtracked operations are skipped.
+"""
+
+from __future__ import annotations
+
+from indexer.layouts import BIG_MAPS, EVENTS
+from michelson.micheline import big_map_ids, storage_section
+
+
+class ReorgError(Exception):
+    def __init__(self, level, expected, found):
+        super().__init__("block %d does not follow the indexed block %s (predecessor %s); "
+                         "index further behind head" % (level, expected, found))
+        self.level = level
+
+
+def _operation_results(op):
+    for content in op.get("contents", []):
+        metadata = content.get("metadata", {})
+        if "operation_result" in metadata:
+            yield metadata["operation_result"]
+        for internal in metadata.get("internal_operation_results", []):
+            yield internal["result"]
+
+
+def big_map_diffs(block):
+    """(big_map_id, updates) for every big_map diff of an applied result, in chain order."""
+    for op in block["operations"]:
+        for result in _operation_results(op):
+            if result.get("status") != "applied":
+                continue
+            for d in result.get("lazy_storage_diff", []):
+                if d.get("kind") != "big_map":
+                    continue
+                yield int(d["id"]), d["diff"].get("updates", [])
+
+
+def contract_events(block):
+    """(op_hash, source, tag, payload) for every applied event, in chain order."""
+    for op in block["operations"]:
+        for content in op.get("contents", []):
+            for internal in content.get("metadata", {}).get("internal_operation_results", []):
+                if internal.get("kind") == "event" and internal["result"].get("status") == "applied":
+                    yield op["hash"], internal["source"], internal.get("tag"), internal.get("payload")
+
+
+class Indexer:
+    """
+    events_only=True records the contracts' events and skips their big_map
+    diffs (no script lookup, storage tables stay empty).
+    """
+
+    def __init__(self, db, source, contracts, log=print, events_only=False):
+        self.db = db
+        self.source = source
+        self.contracts = list(contracts)
+        self.log = log
+        self.events_only = events_only
+        self._maps = None
+
+    def resolve_big_maps(self):
+        """Registers the indexed big_maps of every contract, found by annotation in its script."""
+        if self.events_only:
+            self._maps = {}
+            return
+        known = self.db.big_maps()
+        indexed = {contract for contract, _ in known.values()}
+        with self.db.transaction():
+            for address in self.contracts:
+                if address in indexed:
+                    continue
+                script = self.source.script(address)
+                ids = big_map_ids(storage_section(script), script["storage"])
+                for name, big_map_id in ids.items():
+                    if name in BIG_MAPS:
+                        self.db.register_big_map(big_map_id, address, name)
+                        self.log("%s: %s is big_map %d" % (address, name, big_map_id))
+        self._maps = self.db.big_maps()
+
+    def apply_block(self, block):
+        n = 0
+        for big_map_id, updates in big_map_diffs(block):
+            if big_map_id not in self._maps:
+                continue
+            contract, name = self._maps[big_map_id]
+            layout = BIG_MAPS[name]
+            for u in updates:
+                key = {"contract": contract}
+                key.update(layout.decode_key(u["key"]))
+                if u.get("value") is None:
+                    self.db.clear(layout.table, key, layout.columns)
+                else:
+                    self.db.upsert(layout.table, key, layout.decode_value(u["value"]))
+                n += 1
+        n += self.apply_events(block)
+        self.db.set_checkpoint(block["level"], block["hash"])
+        return n
+
+    def apply_events(self, block):
+        """
+        Stores the events of the indexed contracts; known tags are decoded
+        (layouts.EVENTS), others keep their Micheline payload.
+        """
+        n = 0
+        for position, (op_hash, source, tag, payload) in enumerate(contract_events(block)):
+            if source not in self.contracts:
+                continue
+            if tag in EVENTS and payload is not None:
+                payload = EVENTS[tag](payload)
+            self.db.add_event(source, block["level"], position, op_hash, tag, payload)
+            n += 1
+        return n
+
+    def sync(self, start_level, to_level=None):
+        """
+        Applies blocks from the checkpoint (or `start_level` on a fresh database)
+        up to `to_level` (default: the source head). Returns the last applied level.
+        """
+        if self._maps is None:
+            self.resolve_big_maps()
+        cp = self.db.checkpoint()
+        level, last_hash = (cp[0] + 1, cp[1]) if cp else (start_level, None)
+        to_level = self.source.head_level() if to_level is None else to_level
+
+        while level <= to_level:
+            block = self.source.block(level)
+            if last_hash is not None and block["predecessor"] != last_hash:
+                raise ReorgError(level, last_hash, block["predecessor"])
+            with self.db.transaction():
+                n = self.apply_block(block)
+            if n:
+                self.log("level %d: %d big_map updates and events" % (level, n))
+            last_hash = block["hash"]
+            level += 1
+        return level - 1
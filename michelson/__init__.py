@@ -0,0 +1,7 @@
+"""
+Pure-Python helpers for Michelson data as returned by the node RPC:
+base58check addresses, Micheline JSON decoding and PACK (big_map key
+hashes).
+
+Shared by the off-chain tools (indexer, bench); no node or SmartPy needed.
+"""
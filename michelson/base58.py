@@ -0,0 +1,108 @@
+"""
+base58check encoding and the binary address form.
+
+Addresses appear in RPC data either as strings ("tz1...", "KT1...") or,
+in optimized Micheline (big_map diffs, packed data), as 22 bytes:
+  - implicit:   0x00, curve tag (0 ed25519, 1 secp256k1, 2 p256, 3 bls), 20-byte key hash
+  - originated: 0x01, 20-byte contract hash, 0x00 padding
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+PREFIXES = {
+    "tz1": bytes([6, 161, 159]),
+    "tz2": bytes([6, 161, 161]),
+    "tz3": bytes([6, 161, 164]),
+    "tz4": bytes([6, 161, 166]),
+    "KT1": bytes([2, 90, 121]),
+}
+
+IMPLICIT_TAGS = {"tz1": 0, "tz2": 1, "tz3": 2, "tz4": 3}
+
+# script expression hashes (big_map key hashes): "expr..."
+EXPR_PREFIX = bytes([13, 44, 64, 27])
+
+# operation hashes ("o...") and Ed25519 signatures ("edsig...")
+OPERATION_PREFIX = bytes([5, 116])
+EDSIG_PREFIX = bytes([9, 245, 205, 134, 18])
+
+# Ed25519 / secp256k1 / p256 signatures are 64 bytes, appended to the
+# forged operation bytes.
+SIGNATURE_SIZE = 64
+
+
+class Base58Error(ValueError):
+    pass
+
+
+def _checksum(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4]
+
+
+def b58check_encode(payload):
+    data = payload + _checksum(payload)
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, r = divmod(n, 58)
+        out = B58_ALPHABET[r] + out
+    pad = len(data) - len(data.lstrip(b"\0"))
+    return "1" * pad + out
+
+
+def b58check_decode(s):
+    n = 0
+    for c in s:
+        i = B58_ALPHABET.find(c)
+        if i < 0:
+            raise Base58Error("invalid base58 character %r" % c)
+        n = n * 58 + i
+    pad = len(s) - len(s.lstrip("1"))
+    data = b"\0" * pad + (n.to_bytes((n.bit_length() + 7) // 8, "big") if n else b"")
+    payload, checksum = data[:-4], data[-4:]
+    if len(data) < 4 or _checksum(payload) != checksum:
+        raise Base58Error("bad checksum in %r" % s)
+    return payload
+
+
+def encode_address(raw):
+    """22-byte binary address -> "tz1..." / "KT1..."."""
+    raw = bytes(raw)
+    if len(raw) != 22:
+        raise Base58Error("address must be 22 bytes, got %d" % len(raw))
+    if raw[0] == 0:
+        for prefix, tag in IMPLICIT_TAGS.items():
+            if raw[1] == tag:
+                return b58check_encode(PREFIXES[prefix] + raw[2:])
+        raise Base58Error("unknown implicit account tag %d" % raw[1])
+    if raw[0] == 1:
+        return b58check_encode(PREFIXES["KT1"] + raw[1:21])
+    raise Base58Error("unknown address tag %d" % raw[0])
+
+
+def decode_address(address):
+    """"tz1..." / "KT1..." -> 22-byte binary address."""
+    prefix = address[:3]
+    if prefix not in PREFIXES:
+        raise Base58Error("unsupported address %r" % address)
+    payload = b58check_decode(address)
+    if not payload.startswith(PREFIXES[prefix]) or len(payload) != 23:
+        raise Base58Error("malformed address %r" % address)
+    digest = payload[3:]
+    if prefix == "KT1":
+        return b"\x01" + digest + b"\x00"
+    return bytes([0, IMPLICIT_TAGS[prefix]]) + digest
+
+
+def script_expr_hash(packed):
+    """"expr..." hash of packed Michelson data (0x05-prefixed), as used in big_map RPC paths."""
+    return b58check_encode(EXPR_PREFIX + hashlib.blake2b(bytes(packed), digest_size=32).digest())
+
+
+def operation_hash(signed):
+    """"o..." hash of a signed operation (forged bytes followed by the signature)."""
+    return b58check_encode(OPERATION_PREFIX + hashlib.blake2b(bytes(signed), digest_size=32).digest())
@@ -0,0 +1,99 @@
+"""
+Decoding Micheline JSON values (RPC responses, big_map diffs).
+
+Pairs may come nested (Pair a (Pair b c)), flattened (Pair a b c) or, in
+optimized form, as a sequence ([a, b, c]); `comb` reads all three the
+same way. Addresses may be strings or optimized bytes.
+"""
+
+from __future__ import annotations
+
+from michelson.base58 import encode_address
+
+
+class MichelineError(ValueError):
+    pass
+
+
+def to_int(node):
+    try:
+        return int(node["int"])
+    except (KeyError, TypeError, ValueError):
+        raise MichelineError("expected an int, got %r" % (node,))
+
+
+def to_bool(node):
+    prim = node.get("prim") if isinstance(node, dict) else None
+    if prim not in ("True", "False"):
+        raise MichelineError("expected a bool, got %r" % (node,))
+    return prim == "True"
+
+
+def to_string(node):
+    try:
+        return node["string"]
+    except (KeyError, TypeError):
+        raise MichelineError("expected a string, got %r" % (node,))
+
+
+def to_address(node):
+    if isinstance(node, dict) and "string" in node:
+        return node["string"]
+    if isinstance(node, dict) and "bytes" in node:
+        return encode_address(bytes.fromhex(node["bytes"]))
+    raise MichelineError("expected an address, got %r" % (node,))
+
+
+def pair_args(node):
+    """Arguments of a Pair value (or pair type) as [left, right]; n-ary pairs are right-nested."""
+    if isinstance(node, list):
+        args, prim = node, "Pair"
+    elif isinstance(node, dict) and node.get("prim") in ("Pair", "pair"):
+        args, prim = node["args"], node["prim"]
+    else:
+        raise MichelineError("expected a pair, got %r" % (node,))
+    if len(args) < 2:
+        raise MichelineError("pair with %d arguments" % len(args))
+    if len(args) == 2:
+        return list(args)
+    return [args[0], {"prim": prim, "args": list(args[1:])}]
+
+
+def comb(node, n):
+    """The n leaves of a right comb (a, (b, (c, ...)))."""
+    items = []
+    while n > 1:
+        left, node = pair_args(node)
+        items.append(left)
+        n -= 1
+    items.append(node)
+    return items
+
+
+def big_map_ids(storage_type, storage):
+    """
+    {field annotation: big_map id} for every annotated big_map in `storage`,
+    found by walking the storage type and value together.
+    """
+    ids = {}
+
+    def walk(t, v):
+        prim = t.get("prim")
+        if prim == "pair":
+            for ta, va in zip(pair_args(t), pair_args(v)):
+                walk(ta, va)
+        elif prim == "big_map":
+            for annot in t.get("annots", []):
+                if annot.startswith("%") and isinstance(v, dict) and "int" in v:
+                    ids[annot[1:]] = int(v["int"])
+
+    walk(storage_type, storage)
+    return ids
+
+
+def storage_section(script):
+    """Storage type of a contract script (`/context/contracts/<address>/script`)."""
+    for section in script["code"]:
+        if section.get("prim") == "storage":
+            return section["args"][0]
+    raise MichelineError("script has no storage section")
@@ -0,0 +1,170 @@
+"""
+Michelson PACK in pure Python, for big_map key hashes without a node.
+
+Covers the key and value types the contracts use: nat, int, mutez,
+string, bytes, address, bool, unit, option and pairs (including n-ary
+right combs and records such as the operators key
+{owner, operator, token_id}). Values are Micheline JSON as the RPC takes
+them (addresses as strings or optimized bytes).
+
+PACK is 0x05 followed by the binary Micheline of the value in optimized
+form: addresses become their 22 bytes, combs are nested binary Pairs.
+packer(type) compiles a type once into an encoder, so batches of keys
+(pack_many, key_hashes) skip the type walk per key.
+"""
+
+from __future__ import annotations
+
+import struct
+
+from michelson.base58 import decode_address, script_expr_hash
+from michelson.micheline import MichelineError, comb, to_address
+
+# binary Micheline node tags
+INT, STRING, SEQ, BYTES = 0x00, 0x01, 0x02, 0x0A
+PRIM_0, PRIM_1, PRIM_2 = 0x03, 0x05, 0x07
+
+# data primitives
+PAIR, FALSE, NONE, SOME, TRUE, UNIT = 0x07, 0x03, 0x06, 0x09, 0x0A, 0x0B
+
+
+def zarith(n):
+    """Binary encoding of a Micheline int: sign bit and 6 bits first, then 7-bit groups."""
+    a = abs(n)
+    first = a & 0x3F | (0x40 if n < 0 else 0)
+    a >>= 6
+    out = bytearray()
+    out.append(first | (0x80 if a else 0))
+    while a:
+        b = a & 0x7F
+        a >>= 7
+        out.append(b | (0x80 if a else 0))
+    return bytes(out)
+
+
+def _int(node):
+    try:
+        return int(node["int"])
+    except (KeyError, TypeError, ValueError):
+        raise MichelineError("expected an int, got %r" % (node,))
+
+
+def _sized(tag, raw):
+    return bytes([tag]) + struct.pack(">I", len(raw)) + raw
+
+
+def _nat(node):
+    n = _int(node)
+    if n < 0:
+        raise MichelineError("negative nat %d" % n)
+    return bytes([INT]) + zarith(n)
+
+
+def _signed(node):
+    return bytes([INT]) + zarith(_int(node))
+
+
+def _string(node):
+    if not isinstance(node, dict) or "string" not in node:
+        raise MichelineError("expected a string, got %r" % (node,))
+    return _sized(STRING, node["string"].encode("utf-8"))
+
+
+def _bytes(node):
+    if not isinstance(node, dict) or "bytes" not in node:
+        raise MichelineError("expected bytes, got %r" % (node,))
+    return _sized(BYTES, bytes.fromhex(node["bytes"]))
+
+
+def _address(node):
+    address = to_address(node)
+    if "%" in address:
+        raise MichelineError("addresses with an entrypoint are not supported: %r" % address)
+    return _sized(BYTES, decode_address(address))
+
+
+def _bool(node):
+    prim = node.get("prim") if isinstance(node, dict) else None
+    if prim not in ("True", "False"):
+        raise MichelineError("expected a bool, got %r" % (node,))
+    return bytes([PRIM_0, TRUE if prim == "True" else FALSE])
+
+
+def _unit(node):
+    if not isinstance(node, dict) or node.get("prim") != "Unit":
+        raise MichelineError("expected Unit, got %r" % (node,))
+    return bytes([PRIM_0, UNIT])
+
+
+SIMPLE = {
+    "nat": _nat,
+    "int": _signed,
+    "mutez": _nat,
+    "string": _string,
+    "bytes": _bytes,
+    "address": _address,
+    "bool": _bool,
+    "unit": _unit,
+}
+
+
+def _comb_types(t):
+    """Leaf types of a right comb type, n-ary or nested."""
+    args = t["args"]
+    if len(args) > 2:
+        return _comb_types({"prim": "pair", "args": [args[0], {"prim": "pair", "args": args[1:]}]})
+    left, right = args
+    if isinstance(right, dict) and right.get("prim") == "pair":
+        return [left] + _comb_types(right)
+    return [left, right]
+
+
+def packer(t):
+    """Encoder of binary Micheline for values of type `t` (Micheline JSON type)."""
+    prim = t.get("prim") if isinstance(t, dict) else None
+    if prim in SIMPLE:
+        return SIMPLE[prim]
+    if prim == "pair":
+        leaves = [packer(lt) for lt in _comb_types(t)]
+
+        def encode_pair(node):
+            parts = [enc(n) for enc, n in zip(leaves, comb(node, len(leaves)))]
+            # nested binary Pairs: Pair a (Pair b c)
+            out = parts[-1]
+            for p in reversed(parts[:-1]):
+                out = bytes([PRIM_2, PAIR]) + p + out
+            return out
+        return encode_pair
+    if prim == "option":
+        inner = packer(t["args"][0])
+
+        def encode_option(node):
+            p = node.get("prim") if isinstance(node, dict) else None
+            if p == "None":
+                return bytes([PRIM_0, NONE])
+            if p == "Some":
+                return bytes([PRIM_1, SOME]) + inner(node["args"][0])
+            raise MichelineError("expected an option, got %r" % (node,))
+        return encode_option
+    raise MichelineError("cannot pack type %r" % (t,))
+
+
+def pack(value, t):
+    """PACK of `value` (Micheline JSON) of type `t`."""
+    return b"\x05" + packer(t)(value)
+
+
+def pack_many(values, t):
+    """PACK of every value of type `t`, in order; the type is compiled once."""
+    encode = packer(t)
+    return [b"\x05" + encode(v) for v in values]
+
+
+def key_hash(value, t):
+    """script_expr hash of `value`: its big_map key hash."""
+    return script_expr_hash(pack(value, t))
+
+
+def key_hashes(values, t):
+    """script_expr hashes of big_map keys of type `t`, in order."""
+    return [script_expr_hash(p) for p in pack_many(values, t)]
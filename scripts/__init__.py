@@ -0,0 +1,4 @@
+"""
+Project scripts. Python tools run as modules from the repository root,
+e.g. `python3 -m scripts.run_tests`.
+"""
@@ -0,0 +1,262 @@
+"""
+Usage:
+  python3 -m scripts.compile [market_v1 share_fa2 ...] [-j 8] [--force] [--list]
+                             [--artifacts artifacts] [--cache-dir .cache/compile]
+
+Compiles the SmartPy compilation targets into `<target>.tz` and
+`<target>.default_storage.tz` (the layout `taq compile` produces), through
+a content-addressed cache. A target's key hashes:
+  - the SmartPy CLI script (compiler version),
+  - the source file defining the target, without the other targets' calls,
+  - every local module it imports, transitively,
+  - its `sp.add_compilation_target(...)` call (initial storage parameters).
+A hit copies the cached artifacts; misses compile in parallel, one SmartPy
+process per target, so editing one contract only recompiles the targets
+that import it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from scripts.shards import DEFAULT_SMARTPY, ROOT, parse, read_source, target_calls, write_shard
+
+# Bump when the key recipe or the cached layout changes
+CACHE_VERSION = "1"
+
+# SmartPy output file suffix -> artifact suffix
+OUTPUTS = {
+    "_contract.tz": ".tz",
+    "_storage.tz": ".default_storage.tz",
+    "_contract.json": ".json",
+    "_storage.json": ".default_storage.json",
+}
+
+
+def default_artifacts_dir(root=ROOT):
+    try:
+        with open(os.path.join(root, ".taq", "config.json")) as f:
+            return os.path.join(root, json.load(f)["artifactsDir"])
+    except (OSError, KeyError, ValueError):
+        return os.path.join(root, "artifacts")
+
+
+def default_sources(root=ROOT):
+    # test_contracts.py defines test_mock_nft, used by the benchmarks
+    return sorted(glob.glob(os.path.join(root, "contracts", "*.py"))) + [os.path.join(root, "tests", "test_contracts.py")]
+
+
+def local_imports(path, root=ROOT):
+    """Files of the modules under `root` that `path` imports, transitively (excluding `path`)."""
+    seen = set()
+    todo = [os.path.abspath(path)]
+    while todo:
+        current = todo.pop()
+        for node in ast.walk(parse(current)):
+            if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module] + ["%s.%s" % (node.module, a.name) for a in node.names]
+            elif isinstance(node, ast.Import):
+                modules = [a.name for a in node.names]
+            else:
+                continue
+            for module in modules:
+                candidate = os.path.join(root, *module.split(".")) + ".py"
+                if os.path.isfile(candidate) and candidate not in seen:
+                    seen.add(candidate)
+                    todo.append(candidate)
+    seen.discard(os.path.abspath(path))
+    return sorted(seen)
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compiler_id(smartpy):
+    """Hash of the SmartPy CLI script when it is a file, else the command itself."""
+    cmd = shlex.split(smartpy)
+    exe = shutil.which(cmd[0]) if cmd else None
+    if exe and os.path.isfile(exe):
+        return _file_digest(exe)
+    return smartpy
+
+
+class Target:
+    __slots__ = ("name", "source", "call", "other_calls", "imports", "key")
+
+    def __init__(self, name, source, call, other_calls, imports):
+        self.name = name
+        self.source = source
+        self.call = call
+        self.other_calls = other_calls
+        self.imports = imports
+        self.key = None
+
+    def source_digest(self):
+        # the other targets of the same file do not affect this one
+        text = read_source(self.source)
+        for call in self.other_calls:
+            text = text.replace(call, "", 1)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def compute_key(self, compiler, root=ROOT):
+        h = hashlib.sha256()
+        parts = [("version", CACHE_VERSION), ("compiler", compiler), ("target", self.name), ("call", self.call),
+                 (os.path.relpath(self.source, root), self.source_digest())]
+        parts += [(os.path.relpath(p, root), _file_digest(p)) for p in self.imports]
+        for label, value in parts:
+            h.update(("%s\0%s\0" % (label, value)).encode())
+        self.key = h.hexdigest()
+        return self.key
+
+
+def collect(sources, names=None, root=ROOT):
+    targets = []
+    for source in sources:
+        source = os.path.abspath(source)
+        calls = target_calls(source)
+        if not calls:
+            continue
+        imports = local_imports(source, root)
+        for name, call in calls.items():
+            if not names or name in names:
+                others = [c for n, c in calls.items() if n != name]
+                targets.append(Target(name, source, call, others, imports))
+    return targets
+
+
+def _install(files_dir, artifacts_dir):
+    os.makedirs(artifacts_dir, exist_ok=True)
+    installed = []
+    for fname in sorted(os.listdir(files_dir)):
+        shutil.copyfile(os.path.join(files_dir, fname), os.path.join(artifacts_dir, fname))
+        installed.append(fname)
+    return installed
+
+
+def compile_target(target, smartpy, cache_dir, root=ROOT):
+    """Compiles `target` into cache_dir/<key>/. Returns (ok, log)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    work = tempfile.mkdtemp(prefix="compile-%s-" % target.name, dir=cache_dir)
+    try:
+        shard = write_shard(os.path.join(work, "shard.py"), target.source, target.name, kind="target", root=root)
+        out = os.path.join(work, "output")
+        cmd = shlex.split(smartpy) + ["compile", shard, out]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, cwd=root)
+        except OSError as e:
+            return False, str(e)
+        log = proc.stdout + proc.stderr
+        if proc.returncode != 0:
+            return False, log
+
+        files = os.path.join(work, "files")
+        os.makedirs(files)
+        for dirpath, _, fnames in os.walk(out):
+            for fname in fnames:
+                for suffix, artifact in OUTPUTS.items():
+                    if fname.endswith(suffix):
+                        shutil.copyfile(os.path.join(dirpath, fname), os.path.join(files, target.name + artifact))
+        if not os.path.exists(os.path.join(files, target.name + ".tz")):
+            return False, log + "\nno contract produced for %s" % target.name
+
+        entry = os.path.join(cache_dir, target.key)
+        try:
+            os.replace(files, entry)
+        except OSError:
+            # another run stored the same key meanwhile; contents are identical
+            pass
+        return True, log
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def build(targets, smartpy, artifacts_dir, cache_dir, jobs, force=False, root=ROOT, log=print):
+    """Installs every target's artifacts, compiling the cache misses in parallel. Returns results."""
+    compiler = compiler_id(smartpy)
+    results = {}
+    misses = []
+    for t in targets:
+        t.compute_key(compiler, root)
+        entry = os.path.join(cache_dir, t.key)
+        if not force and os.path.isdir(entry):
+            results[t.name] = {"target": t.name, "key": t.key, "status": "cached", "seconds": 0.0,
+                               "artifacts": _install(entry, artifacts_dir)}
+            log("%-8s %s" % ("CACHED", t.name))
+        else:
+            if force and os.path.isdir(entry):
+                shutil.rmtree(entry)
+            misses.append(t)
+
+    def run(t):
+        start = time.monotonic()
+        ok, output = compile_target(t, smartpy, cache_dir, root)
+        return t, ok, output, round(time.monotonic() - start, 2)
+
+    if misses:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(jobs, len(misses)))) as pool:
+            for t, ok, output, seconds in pool.map(run, misses):
+                r = {"target": t.name, "key": t.key, "status": "compiled" if ok else "failed", "seconds": seconds}
+                if ok:
+                    r["artifacts"] = _install(os.path.join(cache_dir, t.key), artifacts_dir)
+                else:
+                    r["log"] = output
+                results[t.name] = r
+                log("%-8s %s (%.2fs)" % (r["status"].upper(), t.name, seconds))
+    return [results[t.name] for t in targets]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m scripts.compile", description="Cached SmartPy compilation")
+    parser.add_argument("targets", nargs="*", help="compilation targets (default: all)")
+    parser.add_argument("--source", action="append", default=None,
+                        help="SmartPy file defining targets, repeatable (default: contracts/*.py, tests/test_contracts.py)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--artifacts", default=default_artifacts_dir())
+    parser.add_argument("--cache-dir", default=os.path.join(ROOT, ".cache", "compile"))
+    parser.add_argument("--smartpy", default=DEFAULT_SMARTPY, help="SmartPy CLI command (or $SMARTPY)")
+    parser.add_argument("--force", action="store_true", help="recompile even on a cache hit")
+    parser.add_argument("--list", action="store_true", help="print each target's key and cache status")
+    args = parser.parse_args(argv)
+
+    targets = collect(args.source or default_sources(), set(args.targets))
+    unknown = set(args.targets) - {t.name for t in targets}
+    if unknown:
+        parser.error("unknown target(s): %s" % ", ".join(sorted(unknown)))
+
+    if args.list:
+        compiler = compiler_id(args.smartpy)
+        for t in targets:
+            key = t.compute_key(compiler)
+            cached = os.path.isdir(os.path.join(args.cache_dir, key))
+            print("%-22s %s  %-6s  %s" % (t.name, key[:16], "cached" if cached else "stale",
+                                          ", ".join(os.path.relpath(p, ROOT) for p in [t.source] + t.imports)))
+        return 0
+
+    results = build(targets, args.smartpy, args.artifacts, args.cache_dir, args.jobs, args.force)
+    failed = [r for r in results if r["status"] == "failed"]
+    for r in failed:
+        print("\n--- %s ---\n%s" % (r["target"], r["log"].strip()))
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    print("\n%d targets: %s; artifacts in %s" % (
+        len(results), ", ".join("%d %s" % (n, s) for s, n in sorted(counts.items())), args.artifacts))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Usage:
+  python3 -m scripts.run_tests [tests/test_contracts.py ...] [-j 8] [-k Market]
+                               [--out output/tests] [--smartpy ~/smartpy-cli/SmartPy.sh]
+
+Discovers every `@sp.add_test` in the given SmartPy files, runs each test
+as its own SmartPy process (up to --jobs at a time, default: one per core)
+with a separate output directory, then prints one merged summary and
+writes it to <out>/summary.json. Exits 1 if any test failed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+from scripts.shards import DEFAULT_SMARTPY, ROOT, discover_tests, slug, write_shard
+
+DEFAULT_FILES = [os.path.join(ROOT, "tests", "test_contracts.py")]
+
+
+class Shard:
+    __slots__ = ("source", "name", "dir")
+
+    def __init__(self, source, name, out):
+        self.source = source
+        self.name = name
+        self.dir = os.path.join(out, os.path.splitext(os.path.basename(source))[0], slug(name))
+
+
+def collect(files, out, keyword=None):
+    shards = []
+    for path in files:
+        for name in discover_tests(path):
+            if keyword is None or keyword.lower() in name.lower():
+                shards.append(Shard(path, name, out))
+    return shards
+
+
+def run_shard(shard, smartpy, timeout=None):
+    """Runs one test in its own SmartPy process; returns its result record."""
+    shard_file = write_shard(os.path.join(shard.dir, "shard.py"), shard.source, shard.name)
+    cmd = shlex.split(smartpy) + ["test", shard_file, os.path.join(shard.dir, "output")]
+    start = time.monotonic()
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, cwd=ROOT)
+        status = "pass" if proc.returncode == 0 else "fail"
+        returncode, log = proc.returncode, proc.stdout + proc.stderr
+    except subprocess.TimeoutExpired as e:
+        status, returncode = "timeout", None
+        log = (e.stdout or b"").decode(errors="replace") + (e.stderr or b"").decode(errors="replace")
+    except OSError as e:
+        status, returncode, log = "error", None, str(e)
+    seconds = round(time.monotonic() - start, 2)
+    with open(os.path.join(shard.dir, "log.txt"), "w") as f:
+        f.write(log)
+    return {
+        "file": os.path.relpath(shard.source, ROOT),
+        "name": shard.name,
+        "status": status,
+        "returncode": returncode,
+        "seconds": seconds,
+        "output": shard.dir,
+    }
+
+
+def run_all(shards, smartpy, jobs, timeout=None, log=print):
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_shard, s, smartpy, timeout) for s in shards]
+        for future in concurrent.futures.as_completed(futures):
+            r = future.result()
+            results.append(r)
+            log("%-7s %7.2fs  %s" % (r["status"].upper(), r["seconds"], r["name"]))
+    order = {(os.path.relpath(s.source, ROOT), s.name): i for i, s in enumerate(shards)}
+    results.sort(key=lambda r: order[(r["file"], r["name"])])
+    return results
+
+
+def summarize(results, wall_seconds, jobs):
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {
+        "jobs": jobs,
+        "total": len(results),
+        "counts": counts,
+        "wall_seconds": round(wall_seconds, 2),
+        "test_seconds": round(sum(r["seconds"] for r in results), 2),
+        "results": results,
+    }
+
+
+def format_summary(summary):
+    width = max([len(r["name"]) for r in summary["results"]] + [4])
+    lines = ["%-*s  %-7s  %8s" % (width, "test", "status", "seconds")]
+    for r in summary["results"]:
+        lines.append("%-*s  %-7s  %8.2f" % (width, r["name"], r["status"], r["seconds"]))
+    lines.append("")
+    lines.append("%d tests, %s; %.2fs wall with %d jobs (%.2fs of test time)" % (
+        summary["total"], ", ".join("%d %s" % (n, s) for s, n in sorted(summary["counts"].items())),
+        summary["wall_seconds"], summary["jobs"], summary["test_seconds"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m scripts.run_tests", description="Parallel SmartPy test runner")
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-k", "--keyword", help="only tests whose name contains this (case-insensitive)")
+    parser.add_argument("--out", default=os.path.join(ROOT, "output", "tests"))
+    parser.add_argument("--smartpy", default=DEFAULT_SMARTPY, help="SmartPy CLI command (or $SMARTPY)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per test")
+    parser.add_argument("--list", action="store_true", help="list the discovered tests and exit")
+    args = parser.parse_args(argv)
+
+    shards = collect([os.path.abspath(f) for f in args.files], os.path.abspath(args.out), args.keyword)
+    if args.list:
+        for s in shards:
+            print("%s: %s" % (os.path.relpath(s.source, ROOT), s.name))
+        return 0
+    if not shards:
+        print("no tests found")
+        return 1
+
+    jobs = max(1, min(args.jobs, len(shards)))
+    print("%d tests, %d jobs, output in %s\n" % (len(shards), jobs, args.out))
+    start = time.monotonic()
+    results = run_all(shards, args.smartpy, jobs, args.timeout)
+    summary = summarize(results, time.monotonic() - start, jobs)
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+    print()
+    print(format_summary(summary))
+    failed = [r for r in results if r["status"] != "pass"]
+    for r in failed:
+        print("  %s: see %s" % (r["name"], os.path.join(r["output"], "log.txt")))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,20 @@
 #!/bin/bash
 
-# Script pour exécuter les tests SmartPy
+# Script pour exécuter les tests SmartPy (un processus SmartPy par test, en parallèle)
 
 echo "=========================================="
 echo "Fractional Art Marketplace - Test Runner"
 echo "=========================================="
 echo ""
 
+# Se placer à la racine du dépôt, quel que soit le répertoire courant
+cd "$(dirname "$0")/.." || exit 1
+
+SMARTPY="${SMARTPY:-$HOME/smartpy-cli/SmartPy.sh}"
+OUTPUT="${OUTPUT:-/tmp/smartpy_output}"
+
 # Vérifier si SmartPy est installé
-if ! command -v SmartPy.sh &> /dev/null
+if [ ! -x "$SMARTPY" ] && ! command -v "$SMARTPY" &> /dev/null
 then
     echo "⚠️  SmartPy n'est pas installé"
     echo "Installation de SmartPy..."
@@ -18,13 +24,18 @@ fi
 echo "📋 Exécution des tests..."
 echo ""
 
-# Exécuter les tests
-~/smartpy-cli/SmartPy.sh test test_contracts.py /tmp/smartpy_output
+# Exécuter les tests (options supplémentaires transmises : -j, -k, --timeout, ...)
+SMARTPY="$SMARTPY" python3 -m scripts.run_tests tests/test_contracts.py --out "$OUTPUT" "$@"
+STATUS=$?
 
 echo ""
 echo "=========================================="
-echo "✅ Tests terminés!"
+if [ $STATUS -eq 0 ]; then
+    echo "✅ Tests terminés!"
+else
+    echo "❌ Des tests ont échoué"
+fi
 echo "=========================================="
 echo ""
-echo "Résultats disponibles dans : /tmp/smartpy_output"
-echo "Ouvrez /tmp/smartpy_output/index.html dans un navigateur pour voir les résultats détaillés"
+echo "Résultats disponibles dans : $OUTPUT (un dossier par test, résumé dans summary.json)"
+exit $STATUS
@@ -0,0 +1,132 @@
+"""
+Running one piece of a SmartPy file in its own SmartPy process.
+
+Legacy SmartPy runs every `sp.add_test` (or compilation target) a file
+registers. A shard is a copy of the file in which every other
+registration calls `_shard_skip` instead, so the SmartPy CLI still
+preprocesses it like the original (sp.for / sp.if / sp.else) and each
+test can run in a separate process with its own output directory. The
+copy starts with a short header, so its line numbers are the original's
+plus HEADER_LINES.
+"""
+
+from __future__ import annotations
+
+import ast
+import os
+import re
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SMARTPY = os.environ.get("SMARTPY", os.path.expanduser("~/smartpy-cli/SmartPy.sh"))
+
+# legacy SmartPy statements (sp.for / sp.if / sp.else / sp.while) are not Python
+LEGACY = re.compile(r"^(\s*)sp\.(for|if|else|while)\b", re.M)
+
+SKIP = "_shard_skip"
+
+HEADER = '''# Generated by scripts/shards.py: runs only {kind} {name!r} of {source}.
+import sys; sys.path.insert(0, {root!r}); sys.path.insert(0, {source_dir!r})
+def _shard_skip(*args, **kwargs): return lambda f=None: f
+'''
+
+HEADER_LINES = HEADER.count("\n")
+
+
+def _call_name(node, func):
+    """The string name passed to `sp.<func>(...)`, or None."""
+    if not isinstance(node, ast.Call):
+        return None
+    f = node.func
+    if not (isinstance(f, ast.Attribute) and f.attr == func and isinstance(f.value, ast.Name) and f.value.id == "sp"):
+        return None
+    for kw in node.keywords:
+        if kw.arg == "name" and isinstance(kw.value, ast.Constant):
+            return kw.value.value
+    if node.args and isinstance(node.args[0], ast.Constant):
+        return node.args[0].value
+    return None
+
+
+def read_source(path):
+    """Source of a SmartPy file as plain Python: legacy statements become their Python keywords."""
+    with open(path) as f:
+        source = f.read()
+    # same line count and, after the keyword, the same columns shifted left by len("sp.")
+    return LEGACY.sub(r"\1\2", source)
+
+
+def parse(path):
+    return ast.parse(read_source(path), path)
+
+
+def registrations(path):
+    """
+    [(kind, name, func node)] of the `@sp.add_test(...)` decorators ("test")
+    and `sp.add_compilation_target(...)` calls ("target") in `path`, in file order.
+    """
+    found = []
+    for node in ast.walk(parse(path)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for d in node.decorator_list:
+                name = _call_name(d, "add_test")
+                if name is not None:
+                    found.append(("test", name, d.func))
+        else:
+            name = _call_name(node, "add_compilation_target")
+            if name is not None:
+                found.append(("target", name, node.func))
+    return sorted(found, key=lambda r: (r[2].lineno, r[2].col_offset))
+
+
+def discover_tests(path):
+    """Names of the `@sp.add_test(name=...)` tests in `path`, in file order."""
+    return [name for kind, name, _ in registrations(path) if kind == "test"]
+
+
+def target_calls(path):
+    """{target name: source of its `sp.add_compilation_target(...)` call} for `path`, in file order."""
+    source = read_source(path)
+    calls = []
+    for node in ast.walk(ast.parse(source, path)):
+        name = _call_name(node, "add_compilation_target")
+        if name is not None:
+            calls.append((node.lineno, node.col_offset, name, ast.get_source_segment(source, node)))
+    return {name: segment for _, _, name, segment in sorted(calls)}
+
+
+def discover_targets(path):
+    """Names of the `sp.add_compilation_target(name, ...)` calls in `path`, in file order."""
+    return list(target_calls(path))
+
+
+def slug(name):
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower()
+
+
+def shard_source(source, name, kind="test", root=ROOT):
+    """The shard of test (or compilation target) `name` of the SmartPy file `source`, as text."""
+    source = os.path.abspath(source)
+    found = registrations(source)
+    if (kind, name) not in [(k, n) for k, n, _ in found]:
+        raise ValueError("no %s %r in %s" % (kind, name, source))
+    with open(source) as f:
+        lines = [line.encode() for line in f.read().splitlines(keepends=True)]
+    # right to left, so the offsets of earlier calls on the same line stay valid
+    for k, n, func in reversed(found):
+        if (k, n) == (kind, name):
+            continue
+        i = func.lineno - 1
+        # ast offsets are in bytes of the parsed line, which lost "sp." before a legacy keyword
+        shift = 3 if LEGACY.match(lines[i].decode()) else 0
+        lines[i] = lines[i][:func.col_offset + shift] + SKIP.encode() + lines[i][func.end_col_offset + shift:]
+    header = HEADER.format(kind=kind, name=name, source=source, root=root, source_dir=os.path.dirname(source))
+    return header + b"".join(lines).decode()
+
+
+def write_shard(path, source, name, kind="test", root=ROOT):
+    """Writes the shard file for test (or compilation target) `name` of `source`."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(shard_source(source, name, kind, root))
+    return path
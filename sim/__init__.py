@@ -0,0 +1,9 @@
+"""
+Pure-Python reference model of ShareFA2 and FractionalArtMarketV1_FA2.
+
+Same entrypoint rules and error strings as contracts/, on plain dicts and
+slotted records, so pricing and cap configurations can be explored at a
+scale SmartPy scenarios cannot reach. The differential mode replays a
+sampled sequence as a SmartPy scenario that checks the contracts end in
+the same storage. See docs/SIMULATION.md.
+"""
@@ -0,0 +1,128 @@
+"""
+Usage:
+  python -m sim run [--ops 1000000] [--seed 0]
+  python -m sim scenario [--ops 300] [--seed 0] --out build/sim_replay.py
+  python -m sim load [--profile large] [--ops N] [--checkpoints 10] [--json load_report.json]
+                     [--sandbox [--target market_v1]]
+
+run: applies a sampled workload to the model and prints throughput and
+the outcome counts. scenario: writes the differential SmartPy replay.
+load: runs a synthetic load profile and reports big_map growth per
+checkpoint; with --sandbox, also gas, paid storage and ops-per-block per
+entrypoint, measured on the sandbox.
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+from sim.differential import scenario_source
+from sim.loadgen import PROFILES, LoadGenerator, format_report, report
+from sim.loadgen import run as run_load
+from sim.model import Deployment
+from sim.workload import Sampler, run
+
+# profile fields `load` can override from the command line
+LOAD_OVERRIDES = (("ops", int), ("collections", int), ("pieces", int), ("artists", int), ("buyers", int),
+                  ("open_pieces", int), ("price_median", int), ("arrival", str), ("buyer_skew", float),
+                  ("basket_rate", float), ("churn", float), ("finalize_batch", int))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sim", description="Contract reference model")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, ops in (("run", 1_000_000), ("scenario", 300)):
+        p = sub.add_parser(name)
+        p.add_argument("--ops", type=int, default=ops)
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--artists", type=int, default=3)
+        p.add_argument("--buyers", type=int, default=12)
+        p.add_argument("--invalid-rate", type=float, default=0.05)
+    sub.choices["scenario"].add_argument("--out", required=True)
+
+    p = sub.add_parser("load")
+    p.add_argument("--profile", choices=sorted(PROFILES), default="medium")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--checkpoints", type=int, default=10)
+    p.add_argument("--json", help="write the report to this file")
+    for field, kind in LOAD_OVERRIDES:
+        p.add_argument("--" + field.replace("_", "-"), type=kind, help="override the profile's %s" % field)
+    p.add_argument("--sandbox", action="store_true", help="replay every call on the sandbox and measure it")
+    p.add_argument("--rpc-url")
+    p.add_argument("--client", default=os.environ.get("OCTEZ_CLIENT", "octez-client"))
+    p.add_argument("--artifacts")
+    p.add_argument("--target", default="market_v1", help="market compilation target for --sandbox")
+    p.add_argument("--fund", type=float, default=10, help="tez sent to each generated account")
+    p.add_argument("--funder", default="bob", help="sandbox account alias paying for --fund")
+    args = parser.parse_args(argv)
+
+    if args.command == "load":
+        return load(args)
+
+    sampler_args = dict(artists=args.artists, buyers=args.buyers, invalid_rate=args.invalid_rate)
+
+    if args.command == "scenario":
+        source, trace = scenario_source(args.seed, args.ops, **sampler_args)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(source)
+        rejected = sum(1 for _, error in trace if error)
+        print("wrote %s: %d calls (%d rejected)" % (args.out, len(trace), rejected))
+        return 0
+
+    d = Deployment()
+    sampler = Sampler(d, seed=args.seed, **sampler_args)
+    start = time.perf_counter()
+    trace = run(d, sampler, args.ops)
+    elapsed = time.perf_counter() - start
+
+    m = d.market
+    print("%d calls in %.2fs (%.0f calls/min, sampling included)" % (args.ops, elapsed, args.ops / elapsed * 60))
+    print("pieces: %d (%d closed), contributions: %d, holders: %d" % (
+        m.next_piece_id, sum(1 for f in m.funding.values() if f.closed), len(m.contributions), len(d.share.ledger)))
+    for error, n in collections.Counter(error or "ok" for _, error in trace).most_common():
+        print("  %-22s %d" % (error, n))
+    return 0
+
+
+def load(args):
+    overrides = {field: getattr(args, field) for field, _ in LOAD_OVERRIDES if getattr(args, field) is not None}
+    profile = PROFILES[args.profile].replace(**overrides)
+
+    driver = constants = None
+    if args.sandbox:
+        # the sandbox side lives in bench/, which the model does not need
+        from bench.__main__ import ROOT, default_rpc_url
+        from bench.load import SandboxDriver
+        from bench.octez import Sandbox
+        from bench.scenarios import Bench
+
+        sandbox = Sandbox(args.rpc_url or default_rpc_url(), args.client)
+        bench = Bench(sandbox, args.artifacts or os.path.join(ROOT, "artifacts"))
+        accounts = LoadGenerator(Deployment(), profile).accounts
+        driver = SandboxDriver(bench, accounts, target=args.target, fund=int(args.fund * 1_000_000), funder=args.funder)
+        driver.setup()
+        constants = sandbox.constants()
+
+    start = time.perf_counter()
+    result = run_load(profile, seed=args.seed, checkpoints=args.checkpoints, driver=driver, log=print)
+    elapsed = time.perf_counter() - start
+    rep = report(result, constants)
+    print()
+    print(format_report(rep))
+    print("\n%d calls in %.2fs" % (rep["checkpoints"][-1]["ops"], elapsed))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rep, f, indent=2)
+            f.write("\n")
+        print("report written to %s" % args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Differential check against the contracts.
+
+Replays a sampled trace as a SmartPy scenario: every call runs with the
+outcome the model gave it (`valid=False, exception=...` for rejected
+ones), then the scenario verifies the final storage of both contracts key
+by key against the model's, including keys the model says are absent.
+
+    python3 -m sim scenario --seed 7 --ops 300 --out build/sim_replay.py
+    ~/smartpy-cli/SmartPy.sh test build/sim_replay.py output/
+"""
+
+from __future__ import annotations
+
+import os
+
+from sim.model import Deployment
+from sim.workload import Sampler, run
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = '''"""
+Generated by `python3 -m sim scenario --seed {seed} --ops {ops}`: replays the
+sampled trace on the contracts and checks the final storage equals the model's.
+"""
+
+import smartpy as sp
+
+import sys
+sys.path.append({root!r})
+from contracts.share_fa2 import ShareFA2
+from contracts.market_v1_fa2 import FractionalArtMarketV1_FA2, FA2_TransferParam
+
+
+class NFTSink(sp.Contract):
+    """Accepts the NFT escrow transfers (the model does not track NFTs)."""
+    def __init__(self):
+        self.init(transfers=0)
+
+    @sp.entry_point
+    def transfer(self, params):
+        sp.set_type(params, FA2_TransferParam)
+        self.data.transfers += 1
+
+
+@sp.add_test(name="Differential replay (seed {seed}, {ops} ops)")
+def test_replay():
+    scenario = sp.test_scenario()
+    scenario.h1("Differential replay (seed {seed}, {ops} ops)")
+
+    admin = sp.test_account("admin")
+    a = {{name: sp.test_account(name) for name in {accounts!r}}}
+
+    share = ShareFA2(admin=admin.address)
+    scenario += share
+    market = FractionalArtMarketV1_FA2(share_fa2=share.address)
+    scenario += market
+    nft = NFTSink()
+    scenario += nft
+    share.set_admin(market.address).run(sender=admin)
+
+    scenario.h2("Replay")
+'''
+
+
+def _addr(name):
+    if name in ("market", "nft", "share"):
+        return "%s.address" % name
+    return "a[%r].address" % name
+
+
+def _mutez(n):
+    return "sp.mutez(%d)" % n
+
+
+def _call(op):
+    contract, entrypoint = op.kind.split(".")
+    if entrypoint == "create_collection":
+        arg = "%d" % op.args[0]
+    elif entrypoint == "create_piece_from_nft":
+        cid, nft, token_id, price = op.args
+        arg = "sp.record(collection_id=%d, nft_fa2=%s, nft_token_id=%d, price=%s)" % (
+            cid, _addr(nft), token_id, _mutez(price))
+    elif entrypoint == "buy_piece":
+        arg = "%d" % op.args[0]
+    elif entrypoint == "buy_pieces":
+        arg = "[%s]" % ", ".join("sp.record(piece_id=%d, amount=%s)" % (pid, _mutez(a)) for pid, a in op.args[0])
+    elif entrypoint == "withdraw":
+        arg = ""
+    elif entrypoint == "finalize_piece":
+        pid, buyers = op.args
+        arg = "sp.record(piece_id=%d, buyers=[%s])" % (pid, ", ".join(_addr(b) for b in buyers))
+    elif entrypoint == "transfer":
+        arg = "[%s]" % ", ".join(
+            "sp.record(from_=%s, txs=[%s])" % (_addr(from_), ", ".join(
+                "sp.record(to_=%s, token_id=%d, amount=%d)" % (_addr(to), tid, amt) for to, tid, amt in txs))
+            for from_, txs in op.args[0])
+    elif entrypoint == "update_operators":
+        arg = "[%s]" % ", ".join(
+            "sp.variant(%r, sp.record(owner=%s, operator=%s, token_id=%d))" % (action, _addr(o), _addr(p), tid)
+            for action, o, p, tid in op.args[0])
+    else:
+        raise ValueError("cannot replay %s" % op.kind)
+    return "%s.%s(%s)" % (contract, entrypoint, arg)
+
+
+def _run(op, error):
+    kwargs = ["sender=a[%r]" % op.sender]
+    if op.amount:
+        kwargs.append("amount=%s" % _mutez(op.amount))
+    if error is not None:
+        kwargs += ["valid=False", "exception=%r" % error]
+    return "    %s.run(%s)" % (_call(op), ", ".join(kwargs))
+
+
+def _verify(expr):
+    return "    scenario.verify(%s)" % expr
+
+
+def _final_checks(d, accounts):
+    m, s = d.market, d.share
+    lines = ["", '    scenario.h2("Final storage")']
+    v = lines.append
+    v(_verify("market.data.next_collection_id == %d" % m.next_collection_id))
+    v(_verify("market.data.next_piece_id == %d" % m.next_piece_id))
+    v(_verify("market.balance == %s" % _mutez(m.balance)))
+    for cid, c in sorted(m.collections.items()):
+        v(_verify("market.data.collections[%d].artist == %s" % (cid, _addr(c.artist))))
+        v(_verify("market.data.collections[%d].cap_percent == %d" % (cid, c.cap_percent)))
+    for pid in range(m.next_piece_id):
+        p, f = m.pieces[pid], m.funding[pid]
+        v(_verify("market.data.pieces[%d].collection_id == %d" % (pid, p.collection_id)))
+        v(_verify("market.data.pieces[%d].nft_fa2 == %s" % (pid, _addr(p.nft_fa2))))
+        v(_verify("market.data.pieces[%d].nft_token_id == %d" % (pid, p.nft_token_id)))
+        v(_verify("market.data.funding[%d].price == %s" % (pid, _mutez(f.price))))
+        v(_verify("market.data.funding[%d].cap_amount == %s" % (pid, _mutez(f.cap_amount))))
+        v(_verify("market.data.funding[%d].artist == %s" % (pid, _addr(f.artist))))
+        v(_verify("market.data.funding[%d].total_raised == %s" % (pid, _mutez(f.total_raised))))
+        v(_verify("market.data.funding[%d].closed == %s" % (pid, f.closed)))
+        v(_verify("%smarket.data.finalized.contains(%d)" % ("" if pid in m.finalized else "~", pid)))
+        supply = s.total_supply.get(pid)
+        if supply is None:
+            v(_verify("~share.data.total_supply.contains(%d)" % pid))
+        else:
+            v(_verify("share.data.total_supply[%d] == %d" % (pid, supply)))
+        for who in accounts:
+            c = m.contributions.get((pid, who))
+            if c is None:
+                v(_verify("~market.data.contributions.contains(sp.pair(%d, %s))" % (pid, _addr(who))))
+            else:
+                v(_verify("market.data.contributions[sp.pair(%d, %s)] == %s" % (pid, _addr(who), _mutez(c))))
+            v(_verify("scenario.compute(market.get_user_contribution(sp.record(piece_id=%d, user=%s))) == %s" % (
+                pid, _addr(who), _mutez(m.get_user_contribution(pid, who)))))
+            bal = s.ledger.get((who, pid))
+            if bal is None:
+                v(_verify("~share.data.ledger.contains(sp.pair(%s, %d))" % (_addr(who), pid)))
+            else:
+                v(_verify("share.data.ledger[sp.pair(%s, %d)] == %d" % (_addr(who), pid, bal)))
+    # bulk views: every piece plus one unknown id, in one call per account
+    ids = list(range(m.next_piece_id + 1))
+    for who in accounts:
+        expected = ", ".join("sp.none" if c is None else "sp.some(%s)" % _mutez(c)
+                             for c in m.get_user_contributions(who, ids))
+        v("    scenario.verify_equal(scenario.compute(market.get_user_contributions(sp.record(user=%s, piece_ids=%r))), [%s])"
+          % (_addr(who), ids, expected))
+    for who in accounts:
+        p = m.pending_payouts.get(who)
+        if p is None:
+            v(_verify("~market.data.pending_payouts.contains(%s)" % _addr(who)))
+        else:
+            v(_verify("market.data.pending_payouts[%s] == %s" % (_addr(who), _mutez(p))))
+    for owner, operator, tid in sorted(s.operators):
+        v(_verify("share.data.operators.contains(sp.record(owner=%s, operator=%s, token_id=%d))" % (
+            _addr(owner), _addr(operator), tid)))
+    v(_verify("share.data.admin == market.address"))
+    return lines
+
+
+def scenario_source(seed, ops, **sampler_args):
+    """(SmartPy scenario source, trace) for `ops` calls sampled with `seed`."""
+    d = Deployment()
+    sampler = Sampler(d, seed=seed, **sampler_args)
+    trace = run(d, sampler, ops)
+    accounts = sampler.accounts
+    lines = [HEADER.format(seed=seed, ops=ops, root=ROOT, accounts=accounts)]
+    lines += [_run(op, error) for op, error in trace]
+    lines += _final_checks(d, accounts)
+    return "\n".join(lines) + "\n", trace
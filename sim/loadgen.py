@@ -0,0 +1,432 @@
+"""
+Synthetic load generation at marketplace scale.
+
+Unlike Sampler (a fuzzing mix with invalid calls), LoadGenerator only emits
+calls that succeed, shaped by a Profile: how many collections and pieces
+get listed, their cap and price distributions, how buyers arrive on open
+pieces, baskets, artist withdrawals and share transfer churn between
+holders. Listings are spread over the run: a new piece is listed whenever
+fewer than `open_pieces` are open, so the run sweeps through the whole
+catalogue and storage keeps growing.
+
+`run` drives the calls through the model (which always decides the next
+call) and, optionally, a driver that replays each accepted call somewhere
+real and returns its receipt metrics (see bench/load.py for the sandbox
+driver). It snapshots big_map sizes at evenly spaced checkpoints and
+aggregates the per-call costs by entrypoint and checkpoint, so every number
+can be read against the scale the contracts had when it was measured.
+"""
+
+from __future__ import annotations
+
+import bisect
+import collections
+import itertools
+import math
+import random
+
+from sim.model import Deployment, Op
+
+TEZ = 1_000_000
+
+# Manager operations validation pass: at most 512 KiB of operations per block
+MANAGER_PASS_SIZE = 512 * 1024
+
+# big_map name -> (contract, model attribute)
+BIG_MAPS = (
+    ("collections", "market", "collections"),
+    ("pieces", "market", "pieces"),
+    ("funding", "market", "funding"),
+    ("contributions", "market", "contributions"),
+    ("finalized", "market", "finalized"),
+    ("pending_payouts", "market", "pending_payouts"),
+    ("ledger", "share", "ledger"),
+    ("operators", "share", "operators"),
+    ("total_supply", "share", "total_supply"),
+)
+
+
+class Profile:
+    """
+    Shape of a workload. `caps` and `arrival` accept:
+      caps:    ((cap_percent, weight), ...)
+      prices:  log-normal around `price_median` mutez with `price_sigma`,
+               rounded to `step` and never below it
+      arrival: "uniform" (any open piece) or "drop" (mostly the newest
+               listings, as when a collection drops)
+      buyer_skew: Zipf exponent over buyers; 0 is uniform, ~1 leaves most
+               buys to a few heavy buyers
+      churn:   share transfers per buy
+      finalize_batch: once a piece closes, its contributors are pruned with
+               finalize_piece calls of this many buyers; 0 never finalizes
+    """
+
+    FIELDS = ("ops", "collections", "pieces", "artists", "buyers", "open_pieces", "caps", "price_median",
+              "price_sigma", "step", "arrival", "buyer_skew", "basket_rate", "full_room_rate", "churn",
+              "withdraw_rate", "finalize_batch")
+
+    def __init__(self, name, ops=25_000, collections=50, pieces=1_000, artists=20, buyers=200, open_pieces=100,
+                 caps=((1, 1), (5, 2), (20, 4), (50, 2)), price_median=5 * TEZ, price_sigma=0.8, step=100_000,
+                 arrival="uniform", buyer_skew=0.0, basket_rate=0.1, full_room_rate=0.3, churn=0.2,
+                 withdraw_rate=0.5, finalize_batch=0):
+        if arrival not in ("uniform", "drop"):
+            raise ValueError("unknown arrival pattern %r" % arrival)
+        if buyers * min(c for c, _ in caps) <= 100:
+            raise ValueError("%d buyers cannot fill a piece capped at %d%%" % (buyers, min(c for c, _ in caps)))
+        self.name = name
+        self.ops = ops
+        self.collections = collections
+        self.pieces = pieces
+        self.artists = artists
+        self.buyers = buyers
+        self.open_pieces = open_pieces
+        self.caps = tuple(caps)
+        self.price_median = price_median
+        self.price_sigma = price_sigma
+        self.step = step
+        self.arrival = arrival
+        self.buyer_skew = buyer_skew
+        self.basket_rate = basket_rate
+        self.full_room_rate = full_room_rate
+        self.churn = churn
+        self.withdraw_rate = withdraw_rate
+        self.finalize_batch = finalize_batch
+
+    def replace(self, **changes):
+        fields = {k: getattr(self, k) for k in self.FIELDS}
+        fields.update(changes)
+        return Profile(fields.pop("name", self.name), **fields)
+
+    def to_dict(self):
+        d = {"name": self.name}
+        d.update((k, getattr(self, k)) for k in self.FIELDS)
+        d["caps"] = [list(c) for c in self.caps]
+        return d
+
+
+PROFILES = {
+    # a few seconds in the model; a sandbox run of this size takes minutes
+    "small": Profile("small", ops=750, collections=5, pieces=40, artists=3, buyers=30, open_pieces=10,
+                     caps=((5, 1), (20, 2), (50, 1))),
+    "medium": Profile("medium"),
+    # thousands of collections, tens of thousands of pieces, 1%-cap pieces with hundreds of buyers
+    "large": Profile("large", ops=500_000, collections=2_000, pieces=20_000, artists=400, buyers=1_000,
+                     open_pieces=500),
+    # every piece capped at 1%: each closing needs at least 100 distinct buyers
+    "one_percent": Profile("one_percent", ops=230_000, collections=100, pieces=2_000, artists=50, buyers=500,
+                           open_pieces=50, caps=((1, 1),), arrival="drop"),
+}
+
+
+class LoadGenerator:
+    def __init__(self, deployment, profile, seed=0):
+        self.d = deployment
+        self.p = profile
+        self.rng = random.Random(seed)
+        self.artists = ["artist%d" % i for i in range(profile.artists)]
+        self.buyers = ["buyer%d" % i for i in range(profile.buyers)]
+        self.buyer_weights = list(itertools.accumulate(1 / (i + 1) ** profile.buyer_skew
+                                                       for i in range(profile.buyers)))
+        self.cap_values = [c for c, _ in profile.caps]
+        self.cap_weights = list(itertools.accumulate(w for _, w in profile.caps))
+        # open piece ids in listing order (the newest last)
+        self.open = []
+        self.listed = 0
+        # (holder, piece_id) of recent buys, the candidates for transfer churn
+        self.holders = collections.deque(maxlen=1024)
+        self.withdrawals = collections.deque()
+        # open piece_id -> buyers with a contribution, for finalize_piece
+        self.contributors = {}
+        self.finalizations = collections.deque()
+        self.transfers_due = 0.0
+        self.last = None
+
+    @property
+    def accounts(self):
+        return self.artists + self.buyers
+
+    # --------------------
+    # Draws
+    # --------------------
+
+    def _buyer(self):
+        i = bisect.bisect(self.buyer_weights, self.rng.random() * self.buyer_weights[-1])
+        return self.buyers[min(i, len(self.buyers) - 1)]
+
+    def _cap(self):
+        return self.cap_values[bisect.bisect(self.cap_weights, self.rng.random() * self.cap_weights[-1])]
+
+    def _price(self):
+        p = self.p
+        steps = round(p.price_median * math.exp(self.rng.gauss(0, p.price_sigma)) / p.step)
+        return max(steps, 1) * p.step
+
+    def _open_index(self):
+        n = len(self.open)
+        if self.p.arrival == "drop":
+            # geometric from the newest listing, mean ~5 pieces back
+            return n - 1 - min(int(self.rng.expovariate(0.2)), n - 1)
+        return self.rng.randrange(n)
+
+    def _room(self, piece_id, buyer, pending):
+        f = self.d.market.funding[piece_id]
+        contributed = self.d.market.contributions.get((piece_id, buyer), 0) + pending.get((piece_id, buyer), 0)
+        raised = f.total_raised + pending.get(piece_id, 0)
+        return min(f.cap_amount - contributed, f.price - raised)
+
+    def _amount(self, room):
+        step = self.p.step
+        if room <= step or self.rng.random() < self.p.full_room_rate:
+            return room
+        return self.rng.randint(1, room // step) * step
+
+    # --------------------
+    # Calls
+    # --------------------
+
+    def _list_piece(self):
+        m = self.d.market
+        # piece k goes to collection k * collections // pieces, listed in order
+        cid = self.listed * self.p.collections // self.p.pieces
+        if cid >= m.next_collection_id:
+            return Op("market.create_collection", self.artists[cid % len(self.artists)], 0, (self._cap(),))
+        self.open.append(m.next_piece_id)
+        self.listed += 1
+        return Op("market.create_piece_from_nft", m.collections[cid].artist, 0,
+                  (cid, "nft", m.next_piece_id, self._price()))
+
+    def _buy(self):
+        """A buy_piece, or a buy_pieces basket; None when the draws found no room."""
+        basket = self.rng.random() < self.p.basket_rate
+        buyer = self._buyer()
+        items = []
+        pending = {}
+        for _ in range(self.rng.randint(2, 3) if basket else 1):
+            pid = self.open[self._open_index()]
+            room = self._room(pid, buyer, pending)
+            if room <= 0:
+                continue
+            amount = self._amount(room)
+            items.append((pid, amount))
+            pending[(pid, buyer)] = pending.get((pid, buyer), 0) + amount
+            pending[pid] = pending.get(pid, 0) + amount
+            if self.p.finalize_batch:
+                self.contributors.setdefault(pid, {})[buyer] = None
+        if not items:
+            return None
+        self.holders.append((buyer, items[0][0]))
+        self.transfers_due += self.p.churn
+        total = sum(a for _, a in items)
+        if len(items) == 1 and not basket:
+            return Op("market.buy_piece", buyer, total, (items[0][0],))
+        return Op("market.buy_pieces", buyer, total, (tuple(items),))
+
+    def _transfer(self):
+        """Part of a recent buyer's shares to one or two other buyers."""
+        self.transfers_due -= 1
+        owner, pid = self.holders[self.rng.randrange(len(self.holders))]
+        bal = self.d.share.ledger.get((owner, pid), 0)
+        if bal == 0:
+            return None
+        txs = []
+        for _ in range(self.rng.randint(1, 2)):
+            amount = self.rng.randint(1, max(bal // 4, 1))
+            if amount > bal:
+                break
+            bal -= amount
+            txs.append((self._buyer(), pid, amount))
+        self.holders.append((txs[0][0], pid))
+        return Op("share.transfer", owner, 0, ([(owner, tuple(txs))],))
+
+    def _settle(self, op):
+        """Bookkeeping once `op` was applied: closed pieces leave the open list, artists may withdraw."""
+        if op is None:
+            return
+        if op.kind == "market.buy_piece":
+            pids = (op.args[0],)
+        elif op.kind == "market.buy_pieces":
+            pids = {pid for pid, _ in op.args[0]}
+        else:
+            return
+        funding = self.d.market.funding
+        for pid in pids:
+            if funding[pid].closed and pid in self.open:
+                self.open.remove(pid)
+                if self.rng.random() < self.p.withdraw_rate:
+                    self.withdrawals.append(funding[pid].artist)
+                buyers = list(self.contributors.pop(pid, ()))
+                for i in range(0, len(buyers), self.p.finalize_batch or 1):
+                    self.finalizations.append(Op("market.finalize_piece", buyers[i], 0,
+                                                 (pid, tuple(buyers[i:i + self.p.finalize_batch]))))
+
+    def next(self):
+        """
+        The next call, or None once every piece is listed and closed. The
+        previous call must have been applied to the deployment.
+        """
+        self._settle(self.last)
+        self.last = None
+        while True:
+            if self.withdrawals:
+                artist = self.withdrawals.popleft()
+                if self.d.market.pending_payouts.get(artist, 0) > 0:
+                    return Op("market.withdraw", artist, 0, ())
+                continue
+            if self.finalizations:
+                return self.finalizations.popleft()
+            if self.transfers_due >= 1 and self.holders:
+                op = self._transfer()
+            elif self.listed < self.p.pieces and len(self.open) < self.p.open_pieces:
+                op = self._list_piece()
+            elif self.open:
+                op = self._buy()
+            else:
+                return None
+            if op is not None:
+                self.last = op
+                return op
+
+
+# --------------------
+# Running and reporting
+# --------------------
+
+def footprint(deployment):
+    """big_map name -> number of entries."""
+    return {name: len(getattr(getattr(deployment, contract), attr)) for name, contract, attr in BIG_MAPS}
+
+
+class Cost:
+    __slots__ = ("calls", "entries", "gas", "gas_max", "storage_bytes", "op_size", "measured")
+
+    def __init__(self):
+        self.calls = 0
+        self.entries = 0
+        self.gas = 0.0
+        self.gas_max = 0.0
+        self.storage_bytes = 0
+        self.op_size = 0
+        self.measured = 0
+
+    def add(self, entries, metrics):
+        self.calls += 1
+        self.entries += entries
+        if metrics:
+            self.measured += 1
+            self.gas += metrics["gas"]
+            self.gas_max = max(self.gas_max, metrics["gas"])
+            self.storage_bytes += metrics["storage_bytes"]
+            self.op_size += metrics.get("op_size", 0)
+
+    def summary(self, constants=None):
+        s = {"calls": self.calls, "new_entries_per_call": round(self.entries / self.calls, 3)}
+        if self.measured:
+            n = self.measured
+            s.update(measured=n, gas=round(self.gas / n, 3), gas_max=self.gas_max,
+                     storage_bytes=round(self.storage_bytes / n, 1), op_size=round(self.op_size / n, 1))
+            if constants:
+                s.update(capacity(s["gas"], s["op_size"], constants))
+        return s
+
+
+def capacity(gas, op_size, constants):
+    """
+    Operations of this cost that fit in one block: bounded by the block gas
+    limit and by the size of the manager operations pass. `constants` is the
+    protocol constants RPC (`/chains/main/blocks/head/context/constants`).
+    """
+    by_gas = int(int(constants["hard_gas_limit_per_block"]) // gas) if gas else None
+    by_size = int(MANAGER_PASS_SIZE // op_size) if op_size else None
+    bounds = [b for b in (by_gas, by_size) if b is not None]
+    return {"ops_per_block_by_gas": by_gas, "ops_per_block_by_size": by_size,
+            "ops_per_block": min(bounds) if bounds else None}
+
+
+def run(profile, seed=0, checkpoints=10, driver=None, deployment=None, log=None):
+    """
+    Generates and applies `profile.ops` calls (fewer if the catalogue sells
+    out). `driver`, when given, is called as driver(op) after the model
+    accepted `op` and returns its receipt metrics, or None.
+
+    Returns {"profile", "seed", "checkpoints": [...], "costs": [...]}: one
+    footprint snapshot per checkpoint, and per checkpoint the calls since the
+    previous one aggregated by entrypoint.
+    """
+    d = deployment or Deployment()
+    gen = LoadGenerator(d, profile, seed)
+    every = max(profile.ops // checkpoints, 1)
+    snapshots, costs = [], []
+    bucket = collections.defaultdict(Cost)
+    sizes = footprint(d)
+    entries = sum(sizes.values())
+    done = 0
+
+    def snapshot():
+        m = d.market
+        snapshots.append({
+            "ops": done,
+            "pieces_listed": m.next_piece_id,
+            "pieces_closed": m.next_piece_id - len(gen.open),
+            "big_maps": dict(sizes),
+            "entries": entries,
+        })
+        costs.append({kind: c for kind, c in sorted(bucket.items())})
+        if log:
+            log("%9d calls  %6d pieces (%d closed)  %9d big_map entries" % (
+                done, m.next_piece_id, m.next_piece_id - len(gen.open), entries))
+
+    while done < profile.ops:
+        op = gen.next()
+        if op is None:
+            break
+        error = d.apply(op)
+        if error:
+            raise AssertionError("generated call rejected with %s: %r" % (error, op))
+        metrics = driver(op) if driver else None
+        sizes = footprint(d)
+        total = sum(sizes.values())
+        bucket[op.kind].add(total - entries, metrics)
+        entries = total
+        done += 1
+        if done % every == 0:
+            snapshot()
+            bucket = collections.defaultdict(Cost)
+    if bucket or not snapshots:
+        snapshot()
+    return {"profile": profile.to_dict(), "seed": seed, "checkpoints": snapshots, "costs": costs}
+
+
+def report(result, constants=None):
+    """JSON-ready form of a run result, with ops-per-block when `constants` are given."""
+    rows = []
+    for snap, costs in zip(result["checkpoints"], result["costs"]):
+        row = dict(snap)
+        row["calls"] = {kind: c.summary(constants) for kind, c in costs.items()}
+        rows.append(row)
+    return {"profile": result["profile"], "seed": result["seed"], "checkpoints": rows}
+
+
+def format_report(rep):
+    lines = ["profile %s (seed %d)" % (rep["profile"]["name"], rep["seed"]), ""]
+    names = [name for name, _, _ in BIG_MAPS]
+    header = ["calls", "listed", "closed"] + names
+    rows = [header]
+    for row in rep["checkpoints"]:
+        rows.append([str(row["ops"]), str(row["pieces_listed"]), str(row["pieces_closed"])]
+                    + [str(row["big_maps"][n]) for n in names])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(header))]
+    lines += ["  ".join(c.rjust(w) for c, w in zip(r, widths)) for r in rows]
+
+    lines.append("")
+    cols = ("calls", "new_entries_per_call")
+    if any("gas" in s for row in rep["checkpoints"] for s in row["calls"].values()):
+        cols += ("gas", "gas_max", "storage_bytes", "op_size", "ops_per_block")
+    rows = [["at", "entrypoint"] + [c.replace("_per_call", "") for c in cols]]
+    for row in rep["checkpoints"]:
+        for kind, s in sorted(row["calls"].items()):
+            rows.append([str(row["ops"]), kind] + ["" if s.get(c) is None else str(s[c]) for c in cols])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+    for r in rows:
+        lines.append("  ".join([r[0].rjust(widths[0]), r[1].ljust(widths[1])]
+                               + [c.rjust(w) for c, w in zip(r[2:], widths[2:])]))
+    return "\n".join(lines)
@@ -0,0 +1,395 @@
+"""
+In-memory models of the contracts.
+
+Addresses are plain strings. Amounts are ints in mutez (shares are minted
+1:1 with mutez). Every entrypoint either applies completely or raises
+Rejected with the contract's error string and leaves the state untouched,
+as a failed operation would; checks run in the contracts' order so the
+first failing check gives the same error.
+
+Not modelled: the NFT escrow transfer of create_piece_from_nft (assumed to
+succeed) and the tez transfer of withdraw (returned to the caller).
+"""
+
+from __future__ import annotations
+
+
+class Rejected(Exception):
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+# --------------------
+# Records
+# --------------------
+
+class Collection:
+    __slots__ = ("artist", "cap_percent")
+
+    def __init__(self, artist, cap_percent):
+        self.artist = artist
+        self.cap_percent = cap_percent
+
+
+class Piece:
+    __slots__ = ("collection_id", "nft_fa2", "nft_token_id")
+
+    def __init__(self, collection_id, nft_fa2, nft_token_id):
+        self.collection_id = collection_id
+        self.nft_fa2 = nft_fa2
+        self.nft_token_id = nft_token_id
+
+
+class Funding:
+    __slots__ = ("price", "cap_amount", "artist", "total_raised", "closed")
+
+    def __init__(self, price, cap_amount, artist, total_raised=0, closed=False):
+        self.price = price
+        self.cap_amount = cap_amount
+        self.artist = artist
+        self.total_raised = total_raised
+        self.closed = closed
+
+
+def _fields(record):
+    return {name: getattr(record, name) for name in record.__slots__}
+
+
+# --------------------
+# ShareFA2
+# --------------------
+
+class ShareModel:
+    __slots__ = ("address", "admin", "ledger", "operators", "total_supply")
+
+    def __init__(self, admin, address="share"):
+        self.address = address
+        self.admin = admin
+        self.ledger = {}          # (owner, token_id) -> balance
+        self.operators = set()    # (owner, operator, token_id)
+        self.total_supply = {}    # token_id -> supply
+
+    def set_admin(self, sender, new_admin):
+        if sender != self.admin:
+            raise Rejected("NOT_ADMIN")
+        self.admin = new_admin
+
+    def update_operators(self, sender, updates):
+        """updates: [("add_operator" | "remove_operator", owner, operator, token_id)]"""
+        for _, owner, _, _ in updates:
+            if sender != owner:
+                raise Rejected("NOT_OWNER")
+        for action, owner, operator, token_id in updates:
+            if action == "add_operator":
+                self.operators.add((owner, operator, token_id))
+            else:
+                self.operators.discard((owner, operator, token_id))
+
+    def transfer(self, sender, batches):
+        """batches: [(from_, [(to_, token_id, amount)])]; applied in order, written once per key."""
+        ledger = self.ledger
+        balances = {}
+        approved = set()
+        for from_, txs in batches:
+            for to_, token_id, amount in txs:
+                from_key = (from_, token_id)
+                if sender != from_ and from_key not in approved:
+                    if (from_, sender, token_id) not in self.operators:
+                        raise Rejected("NOT_OPERATOR")
+                    approved.add(from_key)
+                bal = balances.get(from_key)
+                if bal is None:
+                    bal = ledger.get(from_key, 0)
+                if bal < amount:
+                    raise Rejected("INSUFFICIENT_BALANCE")
+                balances[from_key] = bal - amount
+                to_key = (to_, token_id)
+                bal = balances.get(to_key)
+                if bal is None:
+                    bal = ledger.get(to_key, 0)
+                balances[to_key] = bal + amount
+        ledger.update(balances)
+
+    def mint(self, sender, to_, token_id, amount):
+        if sender != self.admin:
+            raise Rejected("NOT_ADMIN")
+        if amount <= 0:
+            raise Rejected("ZERO_MINT")
+        key = (to_, token_id)
+        self.ledger[key] = self.ledger.get(key, 0) + amount
+        self.total_supply[token_id] = self.total_supply.get(token_id, 0) + amount
+
+    def mint_batch(self, sender, mints):
+        """mints: [(to_, token_id, amount)]"""
+        if sender != self.admin:
+            raise Rejected("NOT_ADMIN")
+        for _, _, amount in mints:
+            if amount <= 0:
+                raise Rejected("ZERO_MINT")
+        for to_, token_id, amount in mints:
+            key = (to_, token_id)
+            self.ledger[key] = self.ledger.get(key, 0) + amount
+            self.total_supply[token_id] = self.total_supply.get(token_id, 0) + amount
+
+    def balance_of(self, requests):
+        """requests: [(owner, token_id)] -> [((owner, token_id), balance)]"""
+        for _, token_id in requests:
+            if token_id not in self.total_supply:
+                raise Rejected("FA2_TOKEN_UNDEFINED")
+        return self.get_balances(requests)
+
+    def get_balances(self, requests):
+        return [((owner, token_id), self.ledger.get((owner, token_id), 0)) for owner, token_id in requests]
+
+    def storage(self):
+        return {
+            "admin": self.admin,
+            "ledger": dict(self.ledger),
+            "operators": set(self.operators),
+            "total_supply": dict(self.total_supply),
+        }
+
+
+# --------------------
+# FractionalArtMarketV1_FA2
+# --------------------
+
+class MarketModel:
+    __slots__ = ("address", "share", "next_collection_id", "next_piece_id", "collections", "pieces",
+                 "funding", "contributions", "finalized", "pending_payouts", "balance")
+
+    def __init__(self, share, address="market"):
+        self.address = address
+        self.share = share
+        self.next_collection_id = 0
+        self.next_piece_id = 0
+        self.collections = {}       # collection_id -> Collection
+        self.pieces = {}            # piece_id -> Piece
+        self.funding = {}           # piece_id -> Funding
+        self.contributions = {}     # (piece_id, buyer) -> mutez
+        self.finalized = set()      # piece_id finalize_piece was called on
+        self.pending_payouts = {}   # artist -> mutez
+        self.balance = 0            # tez held by the contract, in mutez
+
+    # --------------------
+    # Artist actions
+    # --------------------
+
+    def create_collection(self, sender, cap_percent):
+        if cap_percent < 1:
+            raise Rejected("CAP_TOO_LOW")
+        if cap_percent > 100:
+            raise Rejected("CAP_TOO_HIGH")
+        cid = self.next_collection_id
+        self.next_collection_id += 1
+        self.collections[cid] = Collection(sender, cap_percent)
+        return cid
+
+    def create_piece_from_nft(self, sender, collection_id, nft_fa2, nft_token_id, price):
+        col = self.collections.get(collection_id)
+        if col is None:
+            raise Rejected("NO_COLLECTION")
+        if sender != col.artist:
+            raise Rejected("NOT_ARTIST")
+        if price <= 0:
+            raise Rejected("BAD_PRICE")
+        pid = self.next_piece_id
+        self.next_piece_id += 1
+        self.pieces[pid] = Piece(collection_id, nft_fa2, nft_token_id)
+        # sp.split_tokens(price, cap_percent, 100) rounds down
+        self.funding[pid] = Funding(price, price * col.cap_percent // 100, col.artist)
+        return pid
+
+    # --------------------
+    # Buyer actions
+    # --------------------
+
+    def _fund(self, piece_id, buyer, amount, raised, contributed):
+        """
+        _fund_piece against the pending per-call state (`raised`: piece_id ->
+        (total_raised, closed), `contributed`: key -> mutez). Returns the artist.
+        """
+        f = self.funding.get(piece_id)
+        if f is None:
+            raise Rejected("NO_PIECE")
+        total, closed = raised.get(piece_id, (f.total_raised, f.closed))
+        if closed:
+            raise Rejected("PIECE_CLOSED")
+        if amount <= 0:
+            raise Rejected("SEND_TEZ")
+        key = (piece_id, buyer)
+        c = contributed.get(key)
+        if c is None:
+            c = self.contributions.get(key, 0)
+        c += amount
+        if c > f.cap_amount:
+            raise Rejected("OVER_CAP_SHARE")
+        if total + amount > f.price:
+            raise Rejected("OVER_PRICE")
+        contributed[key] = c
+        total += amount
+        raised[piece_id] = (total, total == f.price)
+        return f.artist
+
+    def _commit(self, raised, contributed, payouts, amount):
+        for pid, (total, closed) in raised.items():
+            f = self.funding[pid]
+            f.total_raised = total
+            f.closed = closed
+        self.contributions.update(contributed)
+        pending = self.pending_payouts
+        for artist, a in payouts.items():
+            pending[artist] = pending.get(artist, 0) + a
+        self.balance += amount
+
+    def buy_piece(self, sender, amount, piece_id):
+        raised, contributed = {}, {}
+        artist = self._fund(piece_id, sender, amount, raised, contributed)
+        self.share.mint(self.address, sender, piece_id, amount)
+        self._commit(raised, contributed, {artist: amount}, amount)
+
+    def buy_pieces(self, sender, amount, items):
+        """items: [(piece_id, amount)]"""
+        if amount <= 0:
+            raise Rejected("SEND_TEZ")
+        raised, contributed, payouts = {}, {}, {}
+        total = 0
+        for piece_id, a in items:
+            artist = self._fund(piece_id, sender, a, raised, contributed)
+            total += a
+            payouts[artist] = payouts.get(artist, 0) + a
+        if total != amount:
+            raise Rejected("AMOUNT_MISMATCH")
+        self.share.mint_batch(self.address, [(sender, piece_id, a) for piece_id, a in items])
+        self._commit(raised, contributed, payouts, amount)
+
+    # --------------------
+    # Storage cleanup
+    # --------------------
+
+    def finalize_piece(self, sender, piece_id, buyers):
+        f = self.funding.get(piece_id)
+        if f is None:
+            raise Rejected("NO_PIECE")
+        if not f.closed:
+            raise Rejected("PIECE_OPEN")
+        self.finalized.add(piece_id)
+        for buyer in buyers:
+            self.contributions.pop((piece_id, buyer), None)
+
+    # --------------------
+    # Artist payouts
+    # --------------------
+
+    def withdraw(self, sender):
+        amount = self.pending_payouts.get(sender, 0)
+        if amount <= 0:
+            raise Rejected("NOTHING_TO_WITHDRAW")
+        del self.pending_payouts[sender]
+        self.balance -= amount
+        return amount
+
+    # --------------------
+    # Views
+    # --------------------
+
+    def get_collection(self, collection_id):
+        col = self.collections.get(collection_id)
+        if col is None:
+            raise Rejected("NO_COLLECTION")
+        return _fields(col)
+
+    def get_piece(self, piece_id):
+        if piece_id not in self.pieces:
+            raise Rejected("NO_PIECE")
+        p, f = self.pieces[piece_id], self.funding[piece_id]
+        return {
+            "collection_id": p.collection_id,
+            "price": f.price,
+            "total_raised": f.total_raised,
+            "closed": f.closed,
+            "nft_fa2": p.nft_fa2,
+            "nft_token_id": p.nft_token_id,
+            "share_token_id": piece_id,
+        }
+
+    def get_user_contribution(self, piece_id, user):
+        if piece_id in self.finalized:
+            # the share balance answers, for every user
+            return self.share.ledger.get((user, piece_id), 0)
+        return self.contributions.get((piece_id, user), 0)
+
+    def get_collections(self, collection_ids):
+        return [_fields(self.collections[cid]) if cid in self.collections else None for cid in collection_ids]
+
+    def get_pieces(self, piece_ids):
+        return [self.get_piece(pid) if pid in self.pieces else None for pid in piece_ids]
+
+    def get_piece_range(self, start, count):
+        return [self.get_piece(pid) for pid in range(start, min(start + count, self.next_piece_id))]
+
+    def get_user_contributions(self, user, piece_ids):
+        return [self.get_user_contribution(pid, user) if pid in self.funding else None for pid in piece_ids]
+
+    def get_pending_payout(self, artist):
+        return self.pending_payouts.get(artist, 0)
+
+    def get_cap_amount(self, piece_id):
+        if piece_id not in self.funding:
+            raise Rejected("NO_PIECE")
+        return self.funding[piece_id].cap_amount
+
+    def storage(self):
+        return {
+            "next_collection_id": self.next_collection_id,
+            "next_piece_id": self.next_piece_id,
+            "collections": {k: _fields(v) for k, v in self.collections.items()},
+            "pieces": {k: _fields(v) for k, v in self.pieces.items()},
+            "funding": {k: _fields(v) for k, v in self.funding.items()},
+            "contributions": dict(self.contributions),
+            "finalized": set(self.finalized),
+            "pending_payouts": dict(self.pending_payouts),
+            "balance": self.balance,
+        }
+
+
+# --------------------
+# Deployment
+# --------------------
+
+class Op:
+    """One contract call: `kind` is "<contract>.<entrypoint>" with positional `args`."""
+    __slots__ = ("kind", "sender", "amount", "args")
+
+    def __init__(self, kind, sender, amount=0, args=()):
+        self.kind = kind
+        self.sender = sender
+        self.amount = amount
+        self.args = args
+
+    def __repr__(self):
+        return "Op(%r, %r, %r, %r)" % (self.kind, self.sender, self.amount, self.args)
+
+
+class Deployment:
+    """ShareFA2 + market, with the market as share admin, as after `taq deploy` and set_admin."""
+    __slots__ = ("share", "market")
+
+    def __init__(self, admin="admin"):
+        self.share = ShareModel(admin)
+        self.market = MarketModel(self.share)
+        self.share.set_admin(admin, self.market.address)
+
+    def apply(self, op):
+        """Applies `op`; returns None, or the error string it was rejected with."""
+        contract, entrypoint = op.kind.split(".")
+        target = self.market if contract == "market" else self.share
+        try:
+            if entrypoint in ("buy_piece", "buy_pieces"):
+                getattr(target, entrypoint)(op.sender, op.amount, *op.args)
+            else:
+                getattr(target, entrypoint)(op.sender, *op.args)
+        except Rejected as e:
+            return e.error
+        return None
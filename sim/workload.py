@@ -0,0 +1,164 @@
+"""
+Reproducible random workloads.
+
+Sampler draws the next call from the current model state (existing
+collections, pieces, holders), so most calls are valid, and mixes in a
+share of invalid ones (over cap, closed pieces, wrong sender, ...) so
+every rejection path is exercised. The same seed always yields the same
+sequence.
+"""
+
+from __future__ import annotations
+
+import random
+
+from sim.model import Op
+
+TEZ = 1_000_000
+
+# entrypoint -> relative weight once at least one piece exists
+DEFAULT_MIX = {
+    "market.create_collection": 2,
+    "market.create_piece_from_nft": 8,
+    "market.buy_piece": 50,
+    "market.buy_pieces": 10,
+    "market.withdraw": 6,
+    "market.finalize_piece": 4,
+    "share.transfer": 18,
+    "share.update_operators": 6,
+}
+
+
+class Sampler:
+    def __init__(self, deployment, seed=0, artists=3, buyers=12, mix=None, invalid_rate=0.05,
+                 prices=(1 * TEZ, 20 * TEZ), caps=(10, 100), step=100_000):
+        self.d = deployment
+        self.rng = random.Random(seed)
+        self.artists = ["artist%d" % i for i in range(artists)]
+        self.buyers = ["buyer%d" % i for i in range(buyers)]
+        mix = dict(mix or DEFAULT_MIX)
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.invalid_rate = invalid_rate
+        self.prices = prices
+        self.caps = caps
+        # amounts are multiples of `step` mutez, so pieces actually fill up and close
+        self.step = step
+        self.nft_token_id = 0
+        # candidate open pieces; closed ones are dropped when drawn
+        self.open_pieces = []
+        self.known_pieces = 0
+
+    @property
+    def accounts(self):
+        return self.artists + self.buyers
+
+    def _invalid(self):
+        return self.rng.random() < self.invalid_rate
+
+    def _piece(self):
+        """An open piece most of the time, otherwise any id (closed or missing)."""
+        m = self.d.market
+        opened = self.open_pieces
+        opened.extend(range(self.known_pieces, m.next_piece_id))
+        self.known_pieces = m.next_piece_id
+        if not self._invalid():
+            while opened:
+                i = self.rng.randrange(len(opened))
+                if not m.funding[opened[i]].closed:
+                    return opened[i]
+                opened[i] = opened[-1]
+                opened.pop()
+        return self.rng.randrange(m.next_piece_id + 1)
+
+    def _amount(self, piece_id, buyer):
+        """Up to what `buyer` can still put into `piece_id`; sometimes more."""
+        f = self.d.market.funding.get(piece_id)
+        if f is None:
+            return self.step
+        room = min(f.cap_amount - self.d.market.contributions.get((piece_id, buyer), 0), f.price - f.total_raised)
+        steps = max(room // self.step, 1)
+        amount = self.rng.randint(1, steps) * self.step
+        if self._invalid():
+            amount = room + self.step
+        return amount
+
+    def next(self):
+        r = self.rng
+        m = self.d.market
+        kind = "market.create_collection" if m.next_collection_id == 0 else (
+            "market.create_piece_from_nft" if m.next_piece_id == 0 else r.choices(self.kinds, self.weights)[0])
+
+        if kind == "market.create_collection":
+            cap = r.randint(*self.caps)
+            if self._invalid():
+                cap = r.choice((0, 101))
+            return Op(kind, r.choice(self.artists), 0, (cap,))
+
+        if kind == "market.create_piece_from_nft":
+            cid = r.randrange(m.next_collection_id)
+            artist = m.collections[cid].artist
+            price = r.randint(self.prices[0] // self.step, self.prices[1] // self.step) * self.step
+            if self._invalid():
+                artist = r.choice(self.accounts)
+            token_id = self.nft_token_id
+            self.nft_token_id += 1
+            return Op(kind, artist, 0, (cid, "nft", token_id, price))
+
+        if kind == "market.buy_piece":
+            buyer = r.choice(self.buyers)
+            pid = self._piece()
+            return Op(kind, buyer, self._amount(pid, buyer), (pid,))
+
+        if kind == "market.buy_pieces":
+            buyer = r.choice(self.buyers)
+            items = []
+            for _ in range(r.randint(1, 3)):
+                pid = self._piece()
+                items.append((pid, self._amount(pid, buyer)))
+            total = sum(a for _, a in items)
+            if self._invalid():
+                total += self.step
+            return Op(kind, buyer, total, (tuple(items),))
+
+        if kind == "market.withdraw":
+            who = r.choice(self.artists if not self._invalid() else self.buyers)
+            return Op(kind, who, 0, ())
+
+        if kind == "market.finalize_piece":
+            # any piece: open ones are rejected with PIECE_OPEN
+            pid = r.randrange(m.next_piece_id + (1 if self._invalid() else 0))
+            buyers = tuple(r.sample(self.buyers, r.randint(1, 4)))
+            return Op(kind, r.choice(self.accounts), 0, (pid, buyers))
+
+        if kind == "share.transfer":
+            owner = r.choice(self.buyers)
+            token_id = r.randrange(m.next_piece_id)
+            bal = self.d.share.ledger.get((owner, token_id), 0)
+            txs = []
+            for _ in range(r.randint(1, 4)):
+                amount = r.randint(0, bal // 4) if bal else 0
+                txs.append((r.choice(self.buyers), token_id, amount))
+            sender = owner
+            if r.random() < 0.2:
+                sender = r.choice(self.buyers)
+            if self._invalid():
+                txs.append((r.choice(self.buyers), token_id, bal + 1))
+            return Op(kind, sender, 0, ([(owner, tuple(txs))],))
+
+        # share.update_operators
+        owner = r.choice(self.buyers)
+        action = "add_operator" if r.random() < 0.7 else "remove_operator"
+        update = (action, owner, r.choice(self.buyers), r.randrange(m.next_piece_id))
+        sender = owner if not self._invalid() else r.choice(self.accounts)
+        return Op(kind, sender, 0, ([update],))
+
+
+def run(deployment, sampler, n):
+    """Samples and applies `n` calls. Returns [(op, error or None)]."""
+    trace = []
+    apply = deployment.apply
+    for _ in range(n):
+        op = sampler.next()
+        trace.append((op, apply(op)))
+    return trace
@@ -0,0 +1,128 @@
+"""
+Tests for the benchmark report logic (no sandbox needed).
+"""
+
+import hashlib
+
+import pytest
+
+from bench.load import SandboxDriver
+from bench.octez import synthetic_tz1, tez_arg
+from bench.report import OperationFailed, compare, make_report, operation_metrics, strip_metadata, variant_diff
+from bench.scenarios import TEZ, m_basket, m_transfer, m_unwrap
+from michelson.base58 import B58_ALPHABET
+from sim.model import Op
+
+
+def receipt(status="applied"):
+    return {
+        "hash": "ooTest",
+        "branch": "BLockBranch",
+        "contents": [{
+            "kind": "transaction",
+            "source": "tz1source",
+            "destination": "KT1market",
+            "amount": "1000000",
+            "parameters": {"entrypoint": "buy_piece", "value": {"int": "0"}},
+            "metadata": {
+                "operation_result": {
+                    "status": status,
+                    "consumed_milligas": "2345678",
+                    "paid_storage_size_diff": "67",
+                    "errors": [{"id": "script_rejected"}] if status != "applied" else [],
+                },
+                "internal_operation_results": [
+                    {"kind": "transaction", "result": {"status": status, "consumed_milligas": "1000322",
+                                                       "paid_storage_size_diff": "71"}},
+                    {"kind": "transaction", "result": {"status": status, "consumed_milligas": "100000"}},
+                ],
+            },
+        }],
+    }
+
+
+def test_operation_metrics_sums_internal_operations():
+    metrics = operation_metrics(receipt(), forged_size=120)
+    assert metrics == {"gas": 3446.0, "storage_bytes": 138, "op_size": 184}
+
+
+def test_operation_metrics_rejects_failed_operation():
+    with pytest.raises(OperationFailed):
+        operation_metrics(receipt("backtracked"))
+
+
+def test_strip_metadata_keeps_forgeable_fields():
+    op = strip_metadata(receipt())
+    assert op["branch"] == "BLockBranch"
+    assert "metadata" not in op["contents"][0]
+    assert op["contents"][0]["parameters"]["entrypoint"] == "buy_piece"
+
+
+def test_compare_flags_regressions_past_tolerance():
+    baseline = make_report({
+        "split/buy_piece/first": {"gas": 1000.0, "storage_bytes": 100, "op_size": 150},
+        "split/withdraw": {"gas": 500.0, "storage_bytes": 0, "op_size": 140},
+    })
+    current = make_report({
+        "split/buy_piece/first": {"gas": 1005.0, "storage_bytes": 101, "op_size": 150},
+    })
+    regressions = compare(current, baseline)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("split/buy_piece/first: storage_bytes 101")
+    assert regressions[1] == "split/withdraw: missing from current run"
+
+    current["results"]["split/buy_piece/first"]["storage_bytes"] = 100
+    current["results"]["split/withdraw"] = {"gas": 499.0, "storage_bytes": 0, "op_size": 140}
+    assert compare(current, baseline) == []
+    assert compare(current, baseline, {"gas": 0.001}) != []
+
+
+def test_variant_diff_pairs_common_steps():
+    results = {
+        "split/buy_piece/first": {"gas": 3000.0, "storage_bytes": 150, "op_size": 160},
+        "split/create_collection": {"gas": 1500.0, "storage_bytes": 70, "op_size": 150},
+        "lazy/buy_piece/first": {"gas": 2400.5, "storage_bytes": 150, "op_size": 160},
+        "lazy/originate_market": {"gas": 9000.0, "storage_bytes": 9000, "op_size": 9000},
+    }
+    diff = variant_diff(results, "split", "lazy")
+    assert list(diff) == ["buy_piece/first"]
+    assert diff["buy_piece/first"]["gas"] == (3000.0, 2400.5, -599.5)
+    assert diff["buy_piece/first"]["storage_bytes"] == (150, 150, 0)
+
+
+def test_synthetic_tz1_is_valid_base58check():
+    addr = synthetic_tz1(7)
+    assert addr.startswith("tz1") and len(addr) == 36
+    n = 0
+    for c in addr:
+        n = n * 58 + B58_ALPHABET.index(c)
+    raw = n.to_bytes(27, "big")
+    assert hashlib.sha256(hashlib.sha256(raw[:-4]).digest()).digest()[:4] == raw[-4:]
+    assert synthetic_tz1(7) == addr != synthetic_tz1(8)
+
+
+def test_michelson_arguments():
+    assert tez_arg(1_500_000) == "1.500000"
+    assert m_basket([(1, 10), (2, 20)]) == "{ Pair 1 10 ; Pair 2 20 }"
+    assert m_unwrap(0, 100, "tz1a") == 'Pair 0 (Pair 100 "tz1a")'
+    assert m_transfer("tz1a", [("tz1b", 0, 5)]) == '{ Pair "tz1a" { Pair "tz1b" (Pair 0 5) } }'
+
+
+def test_load_driver_encodes_model_calls():
+    class FakeBench:
+        sb = None
+
+    driver = SandboxDriver(FakeBench(), ["artist0", "buyer0", "buyer1"])
+    driver.addresses = {"artist0": "tz1art", "buyer0": "tz1b0", "buyer1": "tz1b1", "nft": "KT1nft",
+                        "market": "KT1market", "share": "KT1share"}
+    assert driver.arg(Op("market.create_collection", "artist0", 0, (20,))) == "20"
+    assert driver.arg(Op("market.create_piece_from_nft", "artist0", 0, (0, "nft", 3, 5 * TEZ))) == \
+        'Pair 0 (Pair "KT1nft" (Pair 3 5000000))'
+    assert driver.arg(Op("market.buy_pieces", "buyer0", 30, (((1, 10), (2, 20)),))) == "{ Pair 1 10 ; Pair 2 20 }"
+    assert driver.arg(Op("market.withdraw", "artist0")) == "Unit"
+    assert driver.arg(Op("market.finalize_piece", "buyer1", 0, (2, ("buyer0", "buyer1")))) == \
+        'Pair 2 { "tz1b0" ; "tz1b1" }'
+    assert driver.arg(Op("share.transfer", "buyer0", 0, ([("buyer0", (("buyer1", 4, 7),))],))) == \
+        '{ Pair "tz1b0" { Pair "tz1b1" (Pair 4 7) } }'
+    with pytest.raises(ValueError):
+        driver.arg(Op("share.update_operators", "buyer0", 0, ([],)))
@@ -0,0 +1,507 @@
+"""
+Tests for the RPC client (client/), run against the local stand-in node.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+
+import pytest
+
+from client import batch
+from client.batch import BatchQueue
+from client.cache import MISSING, LevelCache, LRUCache
+from client.market import KEYS, MarketClient
+from client.preflight import BuyPreflight, PieceSnapshot, check_buy
+from client.rpc import AsyncRpc, RpcError
+from client.standin import ScriptRejected, StandinNode
+from michelson.micheline import comb, to_address, to_int
+from sim.model import Deployment, Rejected
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "indexer", "market_blocks.json")
+
+# big_map ids in the recorded scripts
+COLLECTIONS, CONTRIBUTIONS, FUNDING, PENDING, PIECES, FINALIZED = 13, 14, 15, 16, 17, 18
+LEDGER, SUPPLY = 10, 12
+
+
+@pytest.fixture
+def acc():
+    with open(FIXTURE) as f:
+        return json.load(f)["accounts"]
+
+
+def put(node, name, big_map_id, key, value):
+    node.set(big_map_id, KEYS[name].encode(key), KEYS[name].type, value)
+
+
+def funding(price, raised, artist, closed):
+    return [{"int": str(price)}, {"int": str(price // 2)}, {"string": artist}, {"int": str(raised)},
+            {"prim": "True" if closed else "False"}]
+
+
+@pytest.fixture
+def node(acc):
+    with open(FIXTURE) as f:
+        scripts = json.load(f)["scripts"]
+    n = StandinNode(scripts, level=100)
+    put(n, "collections", COLLECTIONS, 0, [{"string": acc["bob"]}, {"int": "50"}])
+    for pid, closed in [(0, True), (1, False)]:
+        put(n, "pieces", PIECES, pid, [{"int": "0"}, {"string": acc["nft"]}, {"int": str(7 + pid)}])
+        put(n, "funding", FUNDING, pid, funding(4_000_000, 4_000_000 if closed else 1_000_000, acc["bob"], closed))
+    # piece 0 closed and finalized: alice's entry pruned, john's still recorded; john
+    # gave jane (who never bought) some of his shares
+    put(n, "finalized", FINALIZED, 0, {"prim": "Unit"})
+    put(n, "contributions", CONTRIBUTIONS, (0, acc["john"]), {"int": "2000000"})
+    put(n, "contributions", CONTRIBUTIONS, (1, acc["alice"]), {"int": "1000000"})
+    put(n, "ledger", LEDGER, (acc["alice"], 0), {"int": "2000000"})
+    put(n, "ledger", LEDGER, (acc["john"], 0), {"int": "1500000"})
+    put(n, "ledger", LEDGER, (acc["jane"], 0), {"int": "500000"})
+    put(n, "pending_payouts", PENDING, acc["bob"], {"int": "5000000"})
+    with n:
+        yield n
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_client(node, acc, f, **kwargs):
+    async with AsyncRpc(node.url, pool_size=4) as rpc:
+        return await f(MarketClient(rpc, acc["market"], acc["share"], head_ttl=3600, **kwargs), rpc)
+
+
+def test_lru_and_level_caches():
+    c = LRUCache(2)
+    c.put("a", None)
+    c.put("b", 2)
+    assert c.get("a") is None
+    c.put("c", 3)
+    # "b" was least recently used
+    assert c.get("b") is MISSING and len(c) == 2
+
+    lc = LevelCache(10)
+    lc.put("k", 5, "v5")
+    assert lc.get("k", 5) == "v5"
+    assert lc.get("k", 6) is MISSING and "k" not in lc
+    lc.put("k", 7, "v7")
+    # a slower read of an older level does not overwrite a newer one
+    lc.put("k", 6, "v6")
+    assert lc.get("k", 7) == "v7"
+
+
+def test_reads_match_the_views(node, acc):
+    async def f(c, rpc):
+        pieces = await c.pieces([1, 5, 0])
+        return (await c.collections([0, 3]), pieces,
+                await c.contributions(acc["alice"], [0, 1, 9]),
+                await c.contributions(acc["john"], [0, 1]),
+                await c.contributions(acc["jane"], [0, 1]),
+                await c.balances([(acc["alice"], 0), (acc["jane"], 0)]),
+                await c.pending_payout(acc["bob"]))
+
+    collections, pieces, alice, john, jane, balances, payout = run(with_client(node, acc, f))
+    assert collections == [{"artist": acc["bob"], "cap_percent": 50}, None]
+    assert pieces[1] is None
+    assert pieces[0] == {"piece_id": 1, "share_token_id": 1, "collection_id": 0, "nft_fa2": acc["nft"],
+                         "nft_token_id": 8, "price": 4_000_000, "cap_amount": 2_000_000, "artist": acc["bob"],
+                         "total_raised": 1_000_000, "closed": False}
+    assert pieces[2]["closed"] is True
+    # finalized: share balance, recorded or not; open: recorded (0 if none); unknown piece
+    assert alice == [2_000_000, 1_000_000, None]
+    assert john == [1_500_000, 0]
+    assert jane == [500_000, 0]
+    assert balances == [2_000_000, 500_000]
+    assert payout == 5_000_000
+
+
+def test_deferred_build_adds_unclaimed_contributions(acc):
+    # the deferred market: the same storage plus a claimed big_map
+    with open(FIXTURE) as f:
+        scripts = json.load(f)["scripts"]
+    script = scripts[acc["market"]]
+    storage = script["code"][1]["args"]
+    storage[0] = {"prim": "pair", "args": [
+        {"prim": "big_map", "args": [KEYS["claimed"].type, {"prim": "unit"}], "annots": ["%claimed"]}, storage[0]]}
+    script["storage"] = {"prim": "Pair", "args": [{"int": "19"}, script["storage"]]}
+    n = StandinNode(scripts, level=100)
+    put(n, "funding", FUNDING, 0, funding(4_000_000, 4_000_000, acc["bob"], True))
+    put(n, "finalized", FINALIZED, 0, {"prim": "Unit"})
+    # alice claimed her shares, john never did: both read what they paid
+    put(n, "contributions", CONTRIBUTIONS, (0, acc["alice"]), {"int": "2000000"})
+    put(n, "contributions", CONTRIBUTIONS, (0, acc["john"]), {"int": "2000000"})
+    n.set(19, KEYS["claimed"].encode((0, acc["alice"])), KEYS["claimed"].type, {"prim": "Unit"})
+    put(n, "ledger", LEDGER, (acc["alice"], 0), {"int": "2000000"})
+
+    async def f(c, rpc):
+        return [(await c.contributions(acc[who], [0]))[0] for who in ("alice", "john")]
+
+    with n:
+        assert run(with_client(n, acc, f)) == [2_000_000, 2_000_000]
+
+
+def test_immutable_values_survive_new_heads(node, acc):
+    async def f(c, rpc):
+        await c.pieces([0, 1])
+        await c.collections([0])
+        first = node.count("/big_maps/")
+        node.bake()
+        put(node, "funding", FUNDING, 1, funding(4_000_000, 3_000_000, acc["bob"], False))
+        await c.refresh()
+        pieces = await c.pieces([0, 1])
+        await c.collections([0])
+        return first, node.count("/big_maps/") - first, pieces
+
+    first, second, pieces = run(with_client(node, acc, f))
+    assert first == 5
+    # only the open piece's funding is read again
+    assert second == 1
+    assert pieces[1]["total_raised"] == 3_000_000
+
+
+def test_live_values_are_cached_per_level(node, acc):
+    async def f(c, rpc):
+        a = await c.pending_payout(acc["bob"])
+        put(node, "pending_payouts", PENDING, acc["bob"], None)
+        # same head: cached
+        b = await c.pending_payout(acc["bob"])
+        node.bake()
+        await c.refresh()
+        return a, b, await c.pending_payout(acc["bob"]), c.hashes.hits
+
+    assert run(with_client(node, acc, f)) == (5_000_000, 5_000_000, 0, 1)
+    # key hashes are packed locally
+    assert node.count("pack_data") == 0
+
+
+def test_bulk_reads_are_concurrent_on_pooled_connections(node, acc):
+    ids = list(range(40))
+    for pid in ids[2:]:
+        put(node, "funding", FUNDING, pid, funding(1_000_000, 0, acc["bob"], False))
+
+    async def f(c, rpc):
+        await c.get_many("funding", ids)
+        await c.get_many("funding", ids + [0, 0])
+        return rpc.requests, rpc.connections
+
+    requests, connections = run(with_client(node, acc, f))
+    # head, script, 40 reads; the second call is at the same level: all cached
+    assert requests == 42
+    assert connections <= 4
+    assert len(node.connections) == connections
+
+
+def test_operator_keys(node, acc):
+    put(node, "operators", 11, (acc["alice"], acc["market"], 0), {"prim": "Unit"})
+
+    async def f(c, rpc):
+        return (await c.is_operator(acc["alice"], acc["market"], 0),
+                await c.is_operator(acc["alice"], acc["market"], 1))
+
+    assert run(with_client(node, acc, f)) == (True, False)
+
+
+def test_chunked_responses_and_errors(node, acc):
+    node.chunked = True
+    node.fail_paths["/chains/main/blocks/head/context/contracts/"] = 500
+
+    async def f(c, rpc):
+        level = await c.refresh()
+        with pytest.raises(RpcError) as e:
+            await c.collections([0])
+        return level, e.value.status
+
+    assert run(with_client(node, acc, f)) == (100, 500)
+
+
+def test_cache_is_bounded(node, acc):
+    async def f(c, rpc):
+        await c.get_many("total_supply", range(20))
+        return len(c.live), len(c.hashes)
+
+    assert run(with_client(node, acc, f, cache_size=8)) == (8, 8)
+
+
+def test_preflight_matches_the_model():
+    rng = random.Random(24)
+    buyers = ["alice", "john", "jane"]
+    for _ in range(200):
+        d = Deployment()
+        m = d.market
+        m.create_collection("bob", rng.randint(1, 100))
+        m.create_piece_from_nft("bob", 0, "nft", 0, rng.randint(1, 50))
+        for _ in range(rng.randint(0, 6)):
+            try:
+                m.buy_piece(rng.choice(buyers), rng.randint(0, 30), 0)
+            except Rejected:
+                pass
+        piece_id, buyer, amount = rng.choice([0, 0, 0, 1]), rng.choice(buyers), rng.randint(-1, 30)
+        f = m.funding.get(piece_id)
+        snapshot = f and PieceSnapshot(7, f.price, f.cap_amount, f.total_raised, f.closed)
+        contributed = m.contributions.get((piece_id, buyer), 0)
+        verdict = check_buy(snapshot, contributed, amount, 7)
+        try:
+            m.buy_piece(buyer, amount, piece_id)
+            error = None
+        except Rejected as e:
+            error = e.error
+        assert verdict.error == error and verdict.level == 7
+        if snapshot and not snapshot.closed:
+            # max_amount is the exact bound: it passes, one more mutez does not
+            assert verdict.max_amount == 0 or check_buy(snapshot, contributed, verdict.max_amount).ok
+            assert not check_buy(snapshot, contributed, verdict.max_amount + 1).ok
+
+
+def test_preflight_against_the_node(node, acc):
+    alice, john = acc["alice"], acc["john"]
+
+    async def f(c, rpc):
+        p = BuyPreflight(c)
+        with pytest.raises(LookupError):
+            p.check(1, alice, 1)
+        level = await p.refresh([(0, john), (1, alice), (1, john), (5, alice)])
+        reads = node.count("/big_maps/")
+        verdicts = [p.check(0, john, 1), p.check(5, alice, 1), p.check(1, alice, 0),
+                    p.check(1, alice, 1_000_001), p.check(1, john, 2_000_001), p.check(1, alice, 1_000_000)]
+        # john buys to the cap, the remaining 1 tez is alice's
+        p.record(1, john, 2_000_000)
+        after = [p.check(1, john, 1), p.check(1, alice, 1_000_001), p.check(1, alice, 1_000_000)]
+        p.record(1, alice, 1_000_000)
+        closed = p.check(1, alice, 1)
+        # checks read nothing
+        return level, node.count("/big_maps/") - reads, verdicts, after, closed
+
+    level, reads, verdicts, after, closed = run(with_client(node, acc, f))
+    assert reads == 0
+    assert [v.error for v in verdicts] == ["PIECE_CLOSED", "NO_PIECE", "SEND_TEZ", "OVER_CAP_SHARE",
+                                           "OVER_CAP_SHARE", None]
+    assert verdicts[5].max_amount == 1_000_000 and verdicts[5].level == level == 100
+    assert verdicts[4].max_amount == 2_000_000
+    assert [v.error for v in after] == ["OVER_CAP_SHARE", "OVER_CAP_SHARE", None]
+    assert after[2].max_amount == 1_000_000
+    assert closed.error == "PIECE_CLOSED"
+
+
+def test_preflight_checks_are_cheap():
+    p = BuyPreflight(client=None)
+    p.pieces.put(0, PieceSnapshot(1, 10_000_000, 5_000_000, 0, False))
+    for i in range(1000):
+        p.contributions.put((0, "tz%d" % i), (1, i))
+    start = time.perf_counter()
+    for _ in range(20):
+        for i in range(1000):
+            p.check(0, "tz%d" % i, 1_000_000)
+    per_check = (time.perf_counter() - start) / 20_000
+    # microseconds; the bound is loose for slow CI machines
+    assert per_check < 100e-6
+
+
+# --------------------
+# Batched submission, end to end: the stand-in runs transactions on the reference model
+# --------------------
+
+# gas and storage per call in the stand-in (test values, not measured)
+GAS = {"buy_piece": 3000, "create_piece_from_nft": 5000, "transfer": 2000}
+STORAGE = {"buy_piece": 70, "create_piece_from_nft": 300, "transfer": 40}
+
+
+def execute(d, content):
+    source, amount = content["source"], int(content["amount"])
+    entrypoint, value = content["parameters"]["entrypoint"], content["parameters"]["value"]
+    try:
+        if entrypoint == "buy_piece":
+            d.market.buy_piece(source, amount, to_int(value))
+        elif entrypoint == "create_piece_from_nft":
+            cid, nft, tid, price = comb(value, 4)
+            d.market.create_piece_from_nft(source, to_int(cid), to_address(nft), to_int(tid), to_int(price))
+        else:
+            batches = []
+            for batch in value:
+                from_, txs = comb(batch, 2)
+                batches.append((to_address(from_), [tuple(f(x) for f, x in zip((to_address, to_int, to_int), comb(tx, 3)))
+                                                    for tx in txs]))
+            d.share.transfer(source, batches)
+    except Rejected as e:
+        raise ScriptRejected({"string": e.error})
+    return GAS[entrypoint] * 1000, STORAGE[entrypoint]
+
+
+def deployment(acc, pieces=3, price=4_000_000):
+    d = Deployment()
+    d.market.address, d.share.address = acc["market"], acc["share"]
+    d.share.admin = acc["market"]
+    d.market.create_collection(acc["bob"], 50)
+    for pid in range(pieces):
+        d.market.create_piece_from_nft(acc["bob"], 0, acc["nft"], pid, price)
+    return d
+
+
+def sync(node, d):
+    """Writes the model's funding and contributions to the stand-in's big_maps, for BuyPreflight."""
+    for pid, f in d.market.funding.items():
+        node.set(FUNDING, KEYS["funding"].encode(pid), KEYS["funding"].type,
+                 funding(f.price, f.total_raised, f.artist, f.closed))
+    for key, amount in d.market.contributions.items():
+        put(node, "contributions", CONTRIBUTIONS, key, {"int": str(amount)})
+
+
+async def baker(node, before=None):
+    """Bakes whenever the mempool holds an operation; before(node) runs first."""
+    while True:
+        await asyncio.sleep(0.005)
+        if node.mempool:
+            if before:
+                before(node)
+            node.bake()
+            sync(node, node.state)
+
+
+async def sign(forged):
+    return bytes(64)
+
+
+@pytest.fixture
+def chain(node, acc):
+    node.state = deployment(acc)
+    node.executor = execute
+    node.constants.update(hard_gas_limit_per_operation="10000", hard_gas_limit_per_block="40000",
+                          max_operation_data_length=3000)
+    sync(node, node.state)
+    return node
+
+
+async def submit_all(node, acc, calls, before=None, preflight=False, **kwargs):
+    bake = asyncio.ensure_future(baker(node, before))
+    try:
+        async with AsyncRpc(node.url, pool_size=4) as rpc:
+            p = BuyPreflight(MarketClient(rpc, acc["market"], acc["share"], head_ttl=3600)) if preflight else None
+            async with BatchQueue(rpc, acc["alice"], sign, preflight=p, poll_interval=0.005, **kwargs) as q:
+                futures = [await q.submit(c) for c in calls]
+            return [f.result() for f in futures], q
+    finally:
+        bake.cancel()
+
+
+def test_batches_fill_groups_up_to_the_limits(chain, acc):
+    market, share = acc["market"], acc["share"]
+    chain.state.share.ledger[(acc["alice"], 0)] = 500
+    chain.state.market.create_collection(acc["alice"], 50)
+    calls = [batch.buy_piece(market, pid % 3, 100_000) for pid in range(30)]
+    calls += [batch.create_piece_from_nft(market, 1, acc["nft"], 10 + i, 1_000_000) for i in range(2)]
+    calls += [batch.transfer(share, acc["alice"], [(acc["john"], 0, 100), (acc["jane"], 0, 50)])] * 2
+
+    results, q = run(submit_all(chain, acc, calls))
+    assert [r.status for r in results] == ["applied"] * 34
+    d = chain.state
+    assert [d.market.contributions[(pid, acc["alice"])] for pid in range(3)] == [1_000_000] * 3
+    assert d.market.next_piece_id == 5
+    # 500 given, 1 tez of piece 0's shares minted, 300 sent
+    assert d.share.ledger[(acc["john"], 0)] == 200 and d.share.ledger[(acc["alice"], 0)] == 1_000_200
+    # one group per block, counters consecutive from the node's
+    assert q.groups == len(chain.injected) == len(chain.blocks) > 1
+    assert chain.counters[acc["alice"]] == 34
+    for op in chain.injected:
+        gas = [int(c["gas_limit"]) for c in op["contents"]]
+        assert sum(gas) <= 40_000 and max(gas) <= 10_000
+        assert len(json.dumps(op, separators=(",", ":"))) + 64 <= 3000
+        # limits and fees from the simulation
+        c = op["contents"][0]
+        assert int(c["gas_limit"]) == GAS[c["parameters"]["entrypoint"]] + 100
+        assert int(c["fee"]) >= 100 + int(c["gas_limit"]) // 10
+    # after the first simulation, groups are bounded by size rather than by the operation gas limit
+    assert max(len(op["contents"]) for op in chain.injected) > 4
+    assert {r.op_hash for r in results} == {op_hash for ops in chain.blocks.values() for op_hash in
+                                            [o["hash"] for o in ops]}
+
+
+def test_failures_are_reported_per_call(chain, acc):
+    market = acc["market"]
+    calls = [batch.buy_piece(market, 0, 1_000_000), batch.buy_piece(market, 0, 1_500_000),
+             batch.buy_piece(market, 7, 1), batch.buy_piece(market, 1, 1_000_000), batch.buy_piece(market, 2, 500_000)]
+
+    def race(node):
+        # john closes piece 2 between the simulation and the block
+        if not race.done:
+            node.state.market.buy_piece(acc["john"], 2_000_000, 2)
+            node.state.market.buy_piece(acc["jane"], 2_000_000, 2)
+            race.done = True
+    race.done = False
+
+    # every call fits in the first simulation
+    chain.constants["hard_gas_limit_per_block"] = "100000"
+    results, q = run(submit_all(chain, acc, calls, before=race))
+    # simulation drops the calls that fail alone; on chain, piece 2's call fails and backtracks the group
+    assert [(r.status, r.error) for r in results] == [
+        ("applied", None), ("failed", "OVER_CAP_SHARE"), ("failed", "NO_PIECE"), ("applied", None),
+        ("failed", "PIECE_CLOSED")]
+    assert results[0].level == results[3].level == 102
+    assert q.groups == 2
+    assert chain.state.market.contributions[(1, acc["alice"])] == 1_000_000
+
+
+def test_node_errors_after_injection_do_not_fail_the_group(chain, acc):
+    calls = [batch.buy_piece(acc["market"], 0, 1_000_000), batch.buy_piece(acc["market"], 1, 1_000_000)]
+
+    def outage(node):
+        # the node answers 503 to every block read for a while once the group is in the mempool
+        if not outage.done:
+            node.fail_paths["/chains/main/blocks/"] = 503
+            asyncio.get_event_loop().call_later(0.05, node.fail_paths.pop, "/chains/main/blocks/")
+            outage.done = True
+    outage.done = False
+
+    results, q = run(submit_all(chain, acc, calls, before=outage))
+    assert [r.status for r in results] == ["applied"] * 2
+    assert results[0].level == 101 and q.groups == 1
+
+    # the head stops answering: before injection the call fails, after it is only unconfirmed
+    calls = [batch.buy_piece(acc["market"], 2, 1_000_000)]
+    chain.fail_paths["/chains/main/blocks/head/header"] = 503
+    results, q = run(submit_all(chain, acc, calls))
+    assert [r.status for r in results] == ["failed"] and q.groups == 0
+    del chain.fail_paths["/chains/main/blocks/head/header"]
+
+    def down(node):
+        node.fail_paths["/chains/main/blocks/head/header"] = 503
+    results, q = run(submit_all(chain, acc, calls, before=down, confirm_timeout=0.1))
+    assert [(r.status, r.error) for r in results] == [("unconfirmed", None)]
+    assert results[0].op_hash and q.groups == 1
+
+
+def test_preflight_rejects_before_sending(chain, acc):
+    market = acc["market"]
+    calls = [batch.buy_piece(market, 0, 1_500_000), batch.buy_piece(market, 0, 1_000_000),
+             batch.buy_piece(market, 9, 1)]
+    results, q = run(submit_all(chain, acc, calls, preflight=True))
+    assert [(r.status, r.error) for r in results] == [("applied", None), ("rejected", "OVER_CAP_SHARE"),
+                                                      ("rejected", "NO_PIECE")]
+    assert q.sent == 1 and chain.count("run_operation") == 1
+
+
+def test_submit_waits_when_the_queue_is_full(chain, acc):
+    calls = [batch.buy_piece(acc["market"], 0, 10_000) for _ in range(12)]
+
+    async def f():
+        async with AsyncRpc(chain.url) as rpc:
+            q = BatchQueue(rpc, acc["alice"], sign, max_pending=4, max_batch=2, poll_interval=0.005)
+            q.start()
+            futures = []
+
+            async def producer():
+                for c in calls:
+                    futures.append(await q.submit(c))
+            task = asyncio.ensure_future(producer())
+            # nothing is baked: one group waits for inclusion, 4 calls are queued, the producer waits
+            await asyncio.sleep(0.2)
+            blocked = len(futures), task.done()
+            bake = asyncio.ensure_future(baker(chain))
+            await task
+            await q.close()
+            bake.cancel()
+            return blocked, [fut.result().status for fut in futures]
+
+    (queued, done), statuses = run(f())
+    assert queued == 6 and not done
+    assert statuses == ["applied"] * 12
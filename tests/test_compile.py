@@ -0,0 +1,193 @@
+"""
+Tests for the cached compilation (scripts/compile.py), on a scratch
+project and a stand-in for the SmartPy CLI.
+"""
+
+import json
+import os
+import sys
+import textwrap
+
+import pytest
+
+from scripts.compile import build, collect, local_imports
+
+# Stand-in CLI: `fake <calls log> compile <shard.py> <output>`. It checks that the shard is the
+# file with one live target, compiles as Python once the legacy statements are preprocessed,
+# and, when FAKE_SMARTPY_RUNS is set, records its start/end there and waits (at most 10 s)
+# until FAKE_SMARTPY_EXPECTED runs have started.
+FAKE_CLI = textwrap.dedent('''
+    import json, os, re, sys, time
+    _, calls, cmd, shard, out = sys.argv
+    text = open(shard).read()
+    name = re.search(r"runs only target '(.*)' of", text).group(1)
+    compile(re.sub(r"^(\\s*)sp\\.(for|if|else|while)\\b", r"\\1\\2", text, flags=re.M), shard, "exec")
+    assert text.count("sp.add_compilation_target(") == 1, text
+    with open(calls, "a") as f:
+        f.write(name + "\\n")
+    runs = os.environ.get("FAKE_SMARTPY_RUNS")
+    if runs:
+        start = time.time()
+        open(os.path.join(runs, name + ".started"), "w").close()
+        expected = int(os.environ["FAKE_SMARTPY_EXPECTED"])
+        while len([f for f in os.listdir(runs) if f.endswith(".started")]) < expected and time.time() < start + 10:
+            time.sleep(0.01)
+        with open(os.path.join(runs, name + ".json"), "w") as f:
+            json.dump({"start": start, "end": time.time()}, f)
+    if name == "broken":
+        print("Error: cannot compile", name)
+        sys.exit(1)
+    os.makedirs(os.path.join(out, name))
+    for kind in ("contract", "storage"):
+        with open(os.path.join(out, name, "step_000_cont_0_%s.tz" % kind), "w") as f:
+            f.write("%s of %s\\n" % (kind, name))
+''')
+
+BASE = '''
+import smartpy as sp
+
+class Base(sp.Contract):
+    pass
+'''
+
+MARKET = '''
+import smartpy as sp
+import sys
+sys.path.append('..')
+from contracts.base import Base
+
+class Market(Base):
+    def __init__(self, share):
+        self.init(share=share)
+
+sp.add_compilation_target("market", Market(share=sp.address("KT1-placeholder")))
+sp.add_compilation_target("market_lazy", Market(share=sp.address("KT1-placeholder")))
+'''
+
+SHARE = '''
+import smartpy as sp
+
+class Share(sp.Contract):
+    @sp.entry_point
+    def transfer(self, txs):
+        sp.for tx in txs:
+            sp.if tx.amount > 0:
+                pass
+            sp.else:
+                pass
+
+sp.add_compilation_target("share", Share())
+'''
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "contracts").mkdir(parents=True)
+    (root / "contracts" / "base.py").write_text(BASE)
+    (root / "contracts" / "market.py").write_text(MARKET)
+    (root / "contracts" / "share.py").write_text(SHARE)
+    cli = tmp_path / "fake_smartpy.py"
+    cli.write_text(FAKE_CLI)
+    calls = tmp_path / "calls.txt"
+    calls.write_text("")
+
+    class Project:
+        def __init__(self):
+            self.root = str(root)
+            self.smartpy = "%s %s %s" % (sys.executable, cli, calls)
+            self.artifacts = str(tmp_path / "artifacts")
+            self.cache = str(tmp_path / "cache")
+
+        def sources(self):
+            return sorted(str(p) for p in (root / "contracts").glob("*.py"))
+
+        def build(self, **kwargs):
+            calls.write_text("")
+            results = build(collect(self.sources(), root=self.root), self.smartpy, self.artifacts, self.cache,
+                            jobs=4, root=self.root, log=lambda *_: None, **kwargs)
+            return {r["target"]: r["status"] for r in results}, sorted(calls.read_text().split())
+
+        def edit(self, name, old, new):
+            path = root / "contracts" / name
+            path.write_text(path.read_text().replace(old, new))
+
+    return Project()
+
+
+def test_local_imports_are_transitive(project):
+    market = os.path.join(project.root, "contracts", "market.py")
+    assert local_imports(market, project.root) == [os.path.join(project.root, "contracts", "base.py")]
+
+
+def test_first_build_compiles_in_parallel_then_hits(project, tmp_path, monkeypatch):
+    runs = tmp_path / "runs"
+    runs.mkdir()
+    monkeypatch.setenv("FAKE_SMARTPY_RUNS", str(runs))
+    monkeypatch.setenv("FAKE_SMARTPY_EXPECTED", "3")
+    statuses, calls = project.build()
+    assert statuses == {"market": "compiled", "market_lazy": "compiled", "share": "compiled"}
+    assert calls == ["market", "market_lazy", "share"]
+    # every compilation was still going when the last one started
+    times = [json.loads(p.read_text()) for p in runs.glob("*.json")]
+    assert len(times) == 3
+    assert max(t["start"] for t in times) < min(t["end"] for t in times)
+    monkeypatch.delenv("FAKE_SMARTPY_RUNS")
+
+    with open(os.path.join(project.artifacts, "market.tz")) as f:
+        assert f.read() == "contract of market\n"
+    assert os.path.exists(os.path.join(project.artifacts, "share.default_storage.tz"))
+
+    os.remove(os.path.join(project.artifacts, "share.tz"))
+    statuses, calls = project.build()
+    assert set(statuses.values()) == {"cached"}
+    assert calls == []
+    # hits reinstall the artifacts
+    assert os.path.exists(os.path.join(project.artifacts, "share.tz"))
+
+
+def test_only_affected_targets_recompile(project):
+    project.build()
+
+    # a module imported by the market only
+    project.edit("base.py", "pass", "pass  # edited")
+    statuses, calls = project.build()
+    assert calls == ["market", "market_lazy"]
+    assert statuses["share"] == "cached"
+
+    # the initial storage parameters of one target
+    project.edit("market.py", 'sp.add_compilation_target("market_lazy", Market(share=sp.address("KT1-placeholder")))',
+                 'sp.add_compilation_target("market_lazy", Market(share=sp.address("KT1-other")))')
+    statuses, calls = project.build()
+    assert calls == ["market_lazy"]
+    assert statuses["market"] == "cached"
+
+    # the contract code shared by both targets
+    project.edit("market.py", "self.init(share=share)", "self.init(share=share, paused=False)")
+    statuses, calls = project.build()
+    assert calls == ["market", "market_lazy"]
+
+    # the share contract alone
+    project.edit("share.py", "pass", "pass  # edited")
+    statuses, calls = project.build()
+    assert calls == ["share"]
+
+
+def test_force_and_failures(project):
+    project.build()
+    statuses, calls = project.build(force=True)
+    assert calls == ["market", "market_lazy", "share"]
+
+    project.edit("share.py", 'add_compilation_target("share"', 'add_compilation_target("broken"')
+    statuses, calls = project.build()
+    assert statuses["broken"] == "failed"
+    # failures are not cached
+    statuses, calls = project.build()
+    assert calls == ["broken"]
+
+
+def test_target_key_depends_on_its_call(project):
+    targets = {t.name: t for t in collect(project.sources(), root=project.root)}
+    keys = {name: t.compute_key("compiler", project.root) for name, t in targets.items()}
+    assert len(set(keys.values())) == 3
+    assert targets["market"].compute_key("other-compiler", project.root) != keys["market"]
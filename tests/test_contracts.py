@@ -8,8 +8,13 @@ import smartpy as sp
 
 import sys
 sys.path.append('..') 
-from contracts.share_fa2 import ShareFA2
+from contracts.share_fa2 import ShareFA2, BalanceOfResponse
 from contracts.market_v1_fa2 import FractionalArtMarketV1_FA2
+from contracts.market_v1_deferred import FractionalArtMarketV1_FA2_Deferred
+from contracts.market_v1_combined import FractionalArtMarketV1_Combined
+from contracts.market_v1_tickets import FractionalArtMarketV1_Tickets
+from contracts.share_ticket_wrapper import ShareTicketWrapper, ShareTicket
+from michelson.pack import pack as local_pack
 
 
 class MockNFT_FA2(sp.Contract):
@@ -123,6 +128,68 @@ class MockNFT_FA2(sp.Contract):
                 self.data.ledger[to_key] = self.data.ledger.get(to_key, 0) + tx.amount
 
 
+class BalanceReceiver(sp.Contract):
+    """
+    FA2 balance_of callback target for testing.
+    Stores the last list of responses it received.
+    """
+    def __init__(self):
+        self.init(responses=sp.list(t=BalanceOfResponse))
+
+    @sp.entry_point
+    def receive_balances(self, responses):
+        sp.set_type(responses, sp.TList(BalanceOfResponse))
+        self.data.responses = responses
+
+
+class TicketWallet(sp.Contract):
+    """
+    Contract holder of share tickets for testing (a high-volume holder).
+    Keeps one joined ticket per token id and counts what it received.
+    """
+    def __init__(self):
+        self.init(
+            tickets=sp.map(tkey=sp.TNat, tvalue=ShareTicket),
+            received=sp.map(tkey=sp.TNat, tvalue=sp.TNat)
+        )
+
+    @sp.entry_point
+    def default(self, ticket):
+        sp.set_type(ticket, ShareTicket)
+        ticket_data, copy = sp.read_ticket(ticket)
+        self.data.received[ticket_data.content] = self.data.received.get(ticket_data.content, 0) + ticket_data.amount
+        with sp.modify_record(self.data, "data") as data:
+            held, tickets = sp.match_tuple(sp.get_and_update(data.tickets, ticket_data.content, sp.none), "held", "tickets")
+            with held.match_cases() as arg:
+                with arg.match("None"):
+                    data.tickets = sp.update_map(tickets, ticket_data.content, sp.some(copy))
+                with arg.match("Some") as t:
+                    data.tickets = sp.update_map(tickets, ticket_data.content, sp.join_tickets_raw((t, copy)))
+
+    @sp.entry_point
+    def buy(self, params):
+        """Funds a piece from this wallet: the market sends the ticket back to %default."""
+        sp.set_type(params, sp.TRecord(market=sp.TAddress, piece_id=sp.TNat).layout(("market", "piece_id")))
+        c = sp.contract(sp.TNat, params.market, entry_point="buy_piece").open_some()
+        sp.transfer(params.piece_id, sp.amount, c)
+
+    @sp.entry_point
+    def send(self, params):
+        """Sends the whole held ticket of `token_id` to `to_`."""
+        sp.set_type(params, sp.TRecord(token_id=sp.TNat, to_=sp.TContract(ShareTicket)).layout(("token_id", "to_")))
+        with sp.modify_record(self.data, "data") as data:
+            held, tickets = sp.match_tuple(sp.get_and_update(data.tickets, params.token_id, sp.none), "held", "tickets")
+            data.tickets = tickets
+            sp.transfer(held.open_some("NO_TICKET"), sp.mutez(0), params.to_)
+
+    @sp.entry_point
+    def forge(self, params):
+        """Issues a ticket with this wallet as ticketer (not a market share)."""
+        sp.set_type(params, sp.TRecord(token_id=sp.TNat, amount=sp.TNat, to_=sp.TContract(ShareTicket))
+                    .layout(("token_id", ("amount", "to_"))))
+        sp.transfer(sp.ticket(params.token_id, params.amount), sp.mutez(0), params.to_)
+
+
 # ============================================================================
 # TEST MODULE: ShareFA2
 # ============================================================================
@@ -378,6 +445,254 @@ def test_share_fa2_multi_token():
     )
 
 
+@sp.add_test(name="ShareFA2 - Coalesced transfer batches")
+def test_share_fa2_transfer_coalescing():
+    scenario = sp.test_scenario()
+    scenario.h1("ShareFA2 - Coalesced Transfer Batches")
+    
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+    carol = sp.test_account("Carol")
+    dave = sp.test_account("Dave")
+    operator = sp.test_account("Operator")
+    
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    share_contract.mint_batch([
+        sp.record(to_=alice.address, token_id=0, amount=1000),
+        sp.record(to_=alice.address, token_id=1, amount=100)
+    ]).run(sender=admin)
+    
+    scenario.h2("Test 1: Same owner and token to many recipients, repeated recipient")
+    share_contract.transfer([
+        sp.record(
+            from_=alice.address,
+            txs=[
+                sp.record(to_=bob.address, token_id=0, amount=100),
+                sp.record(to_=carol.address, token_id=0, amount=200),
+                sp.record(to_=bob.address, token_id=0, amount=50),
+                sp.record(to_=dave.address, token_id=1, amount=10)
+            ]
+        )
+    ]).run(sender=alice)
+    
+    scenario.verify(share_contract.data.ledger[sp.pair(alice.address, 0)] == 650)
+    scenario.verify(share_contract.data.ledger[sp.pair(bob.address, 0)] == 150)
+    scenario.verify(share_contract.data.ledger[sp.pair(carol.address, 0)] == 200)
+    scenario.verify(share_contract.data.ledger[sp.pair(alice.address, 1)] == 90)
+    scenario.verify(share_contract.data.ledger[sp.pair(dave.address, 1)] == 10)
+    
+    scenario.h2("Test 2: Tokens received earlier in the batch can be sent on")
+    share_contract.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=bob.address,
+            operator=operator.address,
+            token_id=0
+        ))
+    ]).run(sender=bob)
+    share_contract.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=carol.address,
+            operator=operator.address,
+            token_id=0
+        ))
+    ]).run(sender=carol)
+    share_contract.transfer([
+        sp.record(
+            from_=bob.address,
+            txs=[sp.record(to_=carol.address, token_id=0, amount=150)]
+        ),
+        sp.record(
+            from_=carol.address,
+            txs=[
+                sp.record(to_=dave.address, token_id=0, amount=300),
+                sp.record(to_=carol.address, token_id=0, amount=50)
+            ]
+        )
+    ]).run(sender=operator)
+    
+    scenario.verify(share_contract.data.ledger[sp.pair(bob.address, 0)] == 0)
+    scenario.verify(share_contract.data.ledger[sp.pair(carol.address, 0)] == 50)
+    scenario.verify(share_contract.data.ledger[sp.pair(dave.address, 0)] == 300)
+    
+    scenario.h2("Test 3: Order still matters, later credits do not cover an earlier debit")
+    share_contract.transfer([
+        sp.record(
+            from_=dave.address,
+            txs=[
+                sp.record(to_=alice.address, token_id=0, amount=301),
+                sp.record(to_=dave.address, token_id=0, amount=1)
+            ]
+        )
+    ]).run(
+        sender=dave,
+        valid=False,
+        exception="INSUFFICIENT_BALANCE"
+    )
+    
+    scenario.h2("Test 4: Operator rights are per token")
+    share_contract.transfer([
+        sp.record(
+            from_=carol.address,
+            txs=[
+                sp.record(to_=dave.address, token_id=0, amount=1),
+                sp.record(to_=dave.address, token_id=1, amount=0)
+            ]
+        )
+    ]).run(
+        sender=operator,
+        valid=False,
+        exception="NOT_OPERATOR"
+    )
+    
+    scenario.h2("Test 5: A failing tx reverts the whole batch")
+    share_contract.transfer([
+        sp.record(
+            from_=alice.address,
+            txs=[
+                sp.record(to_=bob.address, token_id=0, amount=100),
+                sp.record(to_=bob.address, token_id=0, amount=1000)
+            ]
+        )
+    ]).run(
+        sender=alice,
+        valid=False,
+        exception="INSUFFICIENT_BALANCE"
+    )
+    scenario.verify(share_contract.data.ledger[sp.pair(alice.address, 0)] == 650)
+    scenario.verify(share_contract.data.ledger[sp.pair(bob.address, 0)] == 0)
+
+
+@sp.add_test(name="ShareFA2 - balance_of and get_balances")
+def test_share_fa2_balances():
+    scenario = sp.test_scenario()
+    scenario.h1("ShareFA2 - balance_of and get_balances")
+    
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+    
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    receiver = BalanceReceiver()
+    scenario += receiver
+    
+    share_contract.mint_batch([
+        sp.record(to_=alice.address, token_id=0, amount=1000),
+        sp.record(to_=bob.address, token_id=0, amount=250),
+        sp.record(to_=alice.address, token_id=1, amount=40)
+    ]).run(sender=admin)
+    
+    callback = sp.contract(
+        sp.TList(BalanceOfResponse),
+        receiver.address,
+        entry_point="receive_balances"
+    ).open_some()
+    
+    scenario.h2("Test 1: balance_of calls back with one response per request, in order")
+    share_contract.balance_of(sp.record(
+        requests=[
+            sp.record(owner=bob.address, token_id=0),
+            sp.record(owner=alice.address, token_id=1),
+            sp.record(owner=bob.address, token_id=1),
+            sp.record(owner=alice.address, token_id=0)
+        ],
+        callback=callback
+    )).run(sender=bob)
+    
+    scenario.verify_equal(receiver.data.responses, [
+        sp.record(request=sp.record(owner=bob.address, token_id=0), balance=250),
+        sp.record(request=sp.record(owner=alice.address, token_id=1), balance=40),
+        sp.record(request=sp.record(owner=bob.address, token_id=1), balance=0),
+        sp.record(request=sp.record(owner=alice.address, token_id=0), balance=1000)
+    ])
+    
+    scenario.h2("Test 2: balance_of rejects a token that was never minted")
+    share_contract.balance_of(sp.record(
+        requests=[
+            sp.record(owner=alice.address, token_id=0),
+            sp.record(owner=alice.address, token_id=7)
+        ],
+        callback=callback
+    )).run(
+        sender=bob,
+        valid=False,
+        exception="FA2_TOKEN_UNDEFINED"
+    )
+    
+    scenario.h2("Test 3: get_balances answers a whole list in one view call")
+    balances = scenario.compute(share_contract.get_balances([
+        sp.record(owner=alice.address, token_id=0),
+        sp.record(owner=bob.address, token_id=0),
+        sp.record(owner=alice.address, token_id=7)
+    ]))
+    scenario.verify_equal(balances, [
+        sp.record(request=sp.record(owner=alice.address, token_id=0), balance=1000),
+        sp.record(request=sp.record(owner=bob.address, token_id=0), balance=250),
+        sp.record(request=sp.record(owner=alice.address, token_id=7), balance=0)
+    ])
+    
+    scenario.h2("Test 4: Empty request list")
+    scenario.verify_equal(scenario.compute(share_contract.get_balances([])), [])
+
+
+@sp.add_test(name="ShareFA2 - Batched mint")
+def test_share_fa2_mint_batch():
+    scenario = sp.test_scenario()
+    scenario.h1("ShareFA2 - Batched Mint")
+    
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+    
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    share_contract.mint(
+        sp.record(to_=alice.address, token_id=0, amount=100)
+    ).run(sender=admin)
+    
+    scenario.h2("Test 1: Mint several records, repeated keys and tokens")
+    share_contract.mint_batch([
+        sp.record(to_=alice.address, token_id=0, amount=1000),
+        sp.record(to_=bob.address, token_id=0, amount=500),
+        sp.record(to_=alice.address, token_id=0, amount=250),
+        sp.record(to_=bob.address, token_id=1, amount=2000)
+    ]).run(sender=admin)
+    
+    scenario.verify(share_contract.data.ledger[sp.pair(alice.address, 0)] == 1350)
+    scenario.verify(share_contract.data.ledger[sp.pair(bob.address, 0)] == 500)
+    scenario.verify(share_contract.data.ledger[sp.pair(bob.address, 1)] == 2000)
+    scenario.verify(share_contract.data.total_supply[0] == 1850)
+    scenario.verify(share_contract.data.total_supply[1] == 2000)
+    
+    scenario.h2("Test 2: Empty batch is a no-op")
+    share_contract.mint_batch([]).run(sender=admin)
+    scenario.verify(share_contract.data.total_supply[0] == 1850)
+    
+    scenario.h2("Test 3: Only admin can mint")
+    share_contract.mint_batch([
+        sp.record(to_=bob.address, token_id=0, amount=1)
+    ]).run(
+        sender=alice,
+        valid=False,
+        exception="NOT_ADMIN"
+    )
+    
+    scenario.h2("Test 4: A zero record rejects the whole batch")
+    share_contract.mint_batch([
+        sp.record(to_=bob.address, token_id=0, amount=1),
+        sp.record(to_=bob.address, token_id=0, amount=0)
+    ]).run(
+        sender=admin,
+        valid=False,
+        exception="ZERO_MINT"
+    )
+
+
 # ============================================================================
 # TEST MODULE: FractionalArtMarketV1_FA2
 # ============================================================================
@@ -490,12 +805,16 @@ def test_market_piece_creation():
     # Verify piece created
     scenario.verify(market.data.next_piece_id == 1)
     scenario.verify(market.data.pieces[0].collection_id == 0)
-    scenario.verify(market.data.pieces[0].price == sp.tez(10))
-    scenario.verify(market.data.pieces[0].total_raised == sp.tez(0))
-    scenario.verify(market.data.pieces[0].closed == False)
+    scenario.verify(market.data.funding[0].price == sp.tez(10))
+    scenario.verify(market.data.funding[0].total_raised == sp.tez(0))
+    scenario.verify(market.data.funding[0].closed == False)
     scenario.verify(market.data.pieces[0].nft_fa2 == nft_contract.address)
     scenario.verify(market.data.pieces[0].nft_token_id == 0)
-    scenario.verify(market.data.pieces[0].share_token_id == 0)
+    scenario.verify(scenario.compute(market.get_piece(0)).share_token_id == 0)
+    
+    # Per-buyer cap (20% of 10 tez) and artist fixed at creation
+    scenario.verify(market.data.funding[0].cap_amount == sp.tez(2))
+    scenario.verify(market.data.funding[0].artist == artist.address)
     
     # Verify NFT transferred to market
     scenario.verify(
@@ -618,15 +937,16 @@ def test_market_buying_basic():
     )
     
     # Verify total raised
-    scenario.verify(market.data.pieces[0].total_raised == sp.tez(2))
+    scenario.verify(market.data.funding[0].total_raised == sp.tez(2))
     
     # Verify shares minted (2 tez = 2_000_000 mutez = 2_000_000 shares)
     scenario.verify(
         share_contract.data.ledger[sp.pair(buyer1.address, 0)] == 2_000_000
     )
     
-    # Verify artist received payment (v1 immediate payment)
-    scenario.verify(artist.balance == artist_balance_before + sp.tez(2))
+    # Verify proceeds are held for the artist, not sent
+    scenario.verify(artist.balance == artist_balance_before)
+    scenario.verify(market.data.pending_payouts[artist.address] == sp.tez(2))
     
     scenario.h2("Test 2: Second buyer purchases shares")
     market.buy_piece(0).run(
@@ -637,7 +957,8 @@ def test_market_buying_basic():
     scenario.verify(
         market.data.contributions[sp.pair(0, buyer2.address)] == sp.tez(1)
     )
-    scenario.verify(market.data.pieces[0].total_raised == sp.tez(3))
+    scenario.verify(market.data.funding[0].total_raised == sp.tez(3))
+    scenario.verify(market.data.pending_payouts[artist.address] == sp.tez(3))
     scenario.verify(
         share_contract.data.ledger[sp.pair(buyer2.address, 0)] == 1_000_000
     )
@@ -796,22 +1117,22 @@ def test_market_piece_closure():
     
     scenario.h2("Test 1: Multiple buyers fund the piece")
     market.buy_piece(0).run(sender=buyer1, amount=sp.tez(2))
-    scenario.verify(market.data.pieces[0].closed == False)
+    scenario.verify(market.data.funding[0].closed == False)
     
     market.buy_piece(0).run(sender=buyer2, amount=sp.tez(2))
-    scenario.verify(market.data.pieces[0].closed == False)
+    scenario.verify(market.data.funding[0].closed == False)
     
     market.buy_piece(0).run(sender=buyer3, amount=sp.tez(2))
-    scenario.verify(market.data.pieces[0].closed == False)
+    scenario.verify(market.data.funding[0].closed == False)
     
     market.buy_piece(0).run(sender=buyer4, amount=sp.tez(2))
-    scenario.verify(market.data.pieces[0].closed == False)
+    scenario.verify(market.data.funding[0].closed == False)
     
     scenario.h2("Test 2: Last buyer completes funding - piece closes")
     market.buy_piece(0).run(sender=buyer5, amount=sp.tez(2))
     
-    scenario.verify(market.data.pieces[0].total_raised == sp.tez(10))
-    scenario.verify(market.data.pieces[0].closed == True)
+    scenario.verify(market.data.funding[0].total_raised == sp.tez(10))
+    scenario.verify(market.data.funding[0].closed == True)
     
     scenario.h2("Test 3: Cannot buy from closed piece")
     buyer6 = sp.test_account("Buyer6")
@@ -861,7 +1182,7 @@ def test_market_piece_closure():
     market.buy_piece(1).run(sender=buyer5, amount=sp.tez(1))
     
     # Now at 5 tez total, piece should be closed
-    scenario.verify(market.data.pieces[1].closed == True)
+    scenario.verify(market.data.funding[1].closed == True)
 
 
 @sp.add_test(name="Market - Views")
@@ -935,6 +1256,106 @@ def test_market_views():
         sp.record(piece_id=0, user=buyer.address)
     ))
     scenario.verify(contrib == sp.tez(2))
+    
+    scenario.h2("Test 6: get_piece combines listing and funding state")
+    result = scenario.compute(market.get_piece(0))
+    scenario.verify(result.total_raised == sp.tez(2))
+    scenario.verify(result.closed == False)
+    scenario.verify(result.nft_fa2 == nft_contract.address)
+    scenario.verify(result.nft_token_id == 0)
+    scenario.verify(result.share_token_id == 0)
+
+
+@sp.add_test(name="Market - Bulk Views")
+def test_market_bulk_views():
+    scenario = sp.test_scenario()
+    scenario.h1("Market - Bulk Views (one call per page)")
+    
+    artist = sp.test_account("Artist")
+    buyer1 = sp.test_account("Buyer1")
+    buyer2 = sp.test_account("Buyer2")
+    holder = sp.test_account("Holder")
+    admin = sp.test_account("Admin")
+    
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    market = FractionalArtMarketV1_FA2(share_fa2=share_contract.address)
+    scenario += market
+    share_contract.set_admin(market.address).run(sender=admin)
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    # Pieces 0 (4 tez) and 1 (10 tez) in collection 0 (60% cap)
+    market.create_collection(60).run(sender=artist)
+    for token_id, price in [(0, sp.tez(4)), (1, sp.tez(10))]:
+        nft_contract.mint(sp.record(to_=artist.address, token_id=token_id)).run(sender=artist)
+        nft_contract.update_operators([
+            sp.variant("add_operator", sp.record(
+                owner=artist.address,
+                operator=market.address,
+                token_id=token_id
+            ))
+        ]).run(sender=artist)
+        market.create_piece_from_nft(sp.record(
+            collection_id=0,
+            nft_fa2=nft_contract.address,
+            nft_token_id=token_id,
+            price=price
+        )).run(sender=artist)
+    
+    # Piece 0 closes, buyer2 hands 1 tez of shares to holder, and piece 0 is
+    # finalized (only buyer1's entry pruned); buyer1 also funds piece 1
+    market.buy_piece(0).run(sender=buyer1, amount=sp.tez(2))
+    market.buy_piece(0).run(sender=buyer2, amount=sp.tez(2))
+    share_contract.transfer([
+        sp.record(
+            from_=buyer2.address,
+            txs=[sp.record(to_=holder.address, token_id=0, amount=1_000_000)]
+        )
+    ]).run(sender=buyer2)
+    market.finalize_piece(sp.record(piece_id=0, buyers=[buyer1.address])).run(sender=buyer2)
+    market.buy_piece(1).run(sender=buyer1, amount=sp.tez(3))
+    
+    scenario.h2("Test 1: get_collections, unknown ids are None")
+    scenario.verify_equal(scenario.compute(market.get_collections([0, 5])), [
+        sp.some(sp.record(artist=artist.address, cap_percent=60)),
+        sp.none
+    ])
+    
+    scenario.h2("Test 2: get_pieces keeps request order")
+    pieces = scenario.compute(market.get_pieces([1, 7, 0]))
+    scenario.verify_equal(pieces, [
+        sp.some(scenario.compute(market.get_piece(1))),
+        sp.none,
+        sp.some(scenario.compute(market.get_piece(0)))
+    ])
+    
+    scenario.h2("Test 3: get_piece_range stops at the last piece")
+    page = scenario.compute(market.get_piece_range(sp.record(start=0, count=50)))
+    scenario.verify_equal(page, [
+        scenario.compute(market.get_piece(0)),
+        scenario.compute(market.get_piece(1))
+    ])
+    scenario.verify_equal(scenario.compute(market.get_piece_range(sp.record(start=1, count=1))), [
+        scenario.compute(market.get_piece(1))
+    ])
+    scenario.verify_equal(scenario.compute(market.get_piece_range(sp.record(start=2, count=10))), [])
+    
+    scenario.h2("Test 4: get_user_contributions (finalized piece reads the share balance)")
+    scenario.verify_equal(scenario.compute(market.get_user_contributions(
+        sp.record(user=buyer1.address, piece_ids=[0, 1, 2])
+    )), [sp.some(sp.tez(2)), sp.some(sp.tez(3)), sp.none])
+    scenario.verify_equal(scenario.compute(market.get_user_contributions(
+        sp.record(user=buyer2.address, piece_ids=[1, 0])
+    )), [sp.some(sp.tez(0)), sp.some(sp.tez(1))])
+    # a holder who never bought reads their shares of the finalized piece only
+    scenario.verify_equal(scenario.compute(market.get_user_contributions(
+        sp.record(user=holder.address, piece_ids=[0, 1])
+    )), [sp.some(sp.tez(1)), sp.some(sp.tez(0))])
+    scenario.verify_equal(scenario.compute(market.get_user_contributions(
+        sp.record(user=buyer2.address, piece_ids=[])
+    )), [])
 
 
 @sp.add_test(name="Market - Edge Cases and Complex Scenarios")
@@ -982,7 +1403,7 @@ def test_market_edge_cases():
     # Single buyer funds entire piece
     market.buy_piece(0).run(sender=buyer, amount=sp.tez(5))
     
-    scenario.verify(market.data.pieces[0].closed == True)
+    scenario.verify(market.data.funding[0].closed == True)
     scenario.verify(
         share_contract.data.ledger[sp.pair(buyer.address, 0)] == 5_000_000
     )
@@ -1070,10 +1491,10 @@ def test_market_edge_cases():
             )
         ).run(sender=artist)
     
-    # Each piece should have different share_token_id
-    scenario.verify(market.data.pieces[3].share_token_id == 3)
-    scenario.verify(market.data.pieces[4].share_token_id == 4)
-    scenario.verify(market.data.pieces[5].share_token_id == 5)
+    # Each piece's shares use its own token_id (= piece_id)
+    scenario.verify(scenario.compute(market.get_piece(3)).share_token_id == 3)
+    scenario.verify(scenario.compute(market.get_piece(4)).share_token_id == 4)
+    scenario.verify(scenario.compute(market.get_piece(5)).share_token_id == 5)
     
     # Buyer can fully fund each piece separately (100% cap)
     buyer3 = sp.test_account("Buyer3")
@@ -1093,6 +1514,832 @@ def test_market_edge_cases():
     )
 
 
+@sp.add_test(name="Market - Basket Purchase (buy_pieces)")
+def test_market_buy_pieces():
+    scenario = sp.test_scenario()
+    scenario.h1("Market - Basket Purchase (buy_pieces)")
+    
+    artist1 = sp.test_account("Artist1")
+    artist2 = sp.test_account("Artist2")
+    buyer = sp.test_account("Buyer")
+    admin = sp.test_account("Admin")
+    
+    # Deploy contracts
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    market = FractionalArtMarketV1_FA2(share_fa2=share_contract.address)
+    scenario += market
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    # Setup
+    share_contract.set_admin(market.address).run(sender=admin)
+    
+    # Artist1: collection 0 (50% cap), pieces 0 and 1 at 10 tez
+    # Artist2: collection 1 (20% cap), piece 2 at 10 tez
+    market.create_collection(50).run(sender=artist1)
+    market.create_collection(20).run(sender=artist2)
+    for token_id, artist, collection_id in [(0, artist1, 0), (1, artist1, 0), (2, artist2, 1)]:
+        nft_contract.mint(sp.record(to_=artist.address, token_id=token_id)).run(sender=artist)
+        nft_contract.update_operators([
+            sp.variant("add_operator", sp.record(
+                owner=artist.address,
+                operator=market.address,
+                token_id=token_id
+            ))
+        ]).run(sender=artist)
+        market.create_piece_from_nft(
+            sp.record(
+                collection_id=collection_id,
+                nft_fa2=nft_contract.address,
+                nft_token_id=token_id,
+                price=sp.tez(10)
+            )
+        ).run(sender=artist)
+    
+    scenario.h2("Test 1: Fund three pieces from two artists in one call")
+    market.buy_pieces([
+        sp.record(piece_id=0, amount=sp.tez(3)),
+        sp.record(piece_id=1, amount=sp.tez(1)),
+        sp.record(piece_id=2, amount=sp.tez(2))
+    ]).run(sender=buyer, amount=sp.tez(6))
+    
+    scenario.verify(market.data.contributions[sp.pair(0, buyer.address)] == sp.tez(3))
+    scenario.verify(market.data.contributions[sp.pair(1, buyer.address)] == sp.tez(1))
+    scenario.verify(market.data.contributions[sp.pair(2, buyer.address)] == sp.tez(2))
+    scenario.verify(market.data.funding[0].total_raised == sp.tez(3))
+    scenario.verify(market.data.funding[2].total_raised == sp.tez(2))
+    
+    # Shares minted 1:1 for every piece
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer.address, 0)] == 3_000_000)
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer.address, 1)] == 1_000_000)
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer.address, 2)] == 2_000_000)
+    
+    # Each artist credited with their pieces' share of the basket
+    scenario.verify(market.data.pending_payouts[artist1.address] == sp.tez(4))
+    scenario.verify(market.data.pending_payouts[artist2.address] == sp.tez(2))
+    
+    scenario.h2("Test 2: Same piece twice counts towards the cap")
+    market.buy_pieces([
+        sp.record(piece_id=0, amount=sp.tez(1)),
+        sp.record(piece_id=0, amount=sp.tez(1))
+    ]).run(sender=buyer, amount=sp.tez(2))
+    
+    scenario.verify(market.data.contributions[sp.pair(0, buyer.address)] == sp.tez(5))
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer.address, 0)] == 5_000_000)
+    
+    scenario.h2("Test 3: Amounts must add up to the sent tez")
+    market.buy_pieces([
+        sp.record(piece_id=1, amount=sp.tez(1))
+    ]).run(
+        sender=buyer,
+        amount=sp.tez(2),
+        valid=False,
+        exception="AMOUNT_MISMATCH"
+    )
+    
+    scenario.h2("Test 4: One item over cap rejects the whole basket")
+    market.buy_pieces([
+        sp.record(piece_id=1, amount=sp.tez(1)),
+        sp.record(piece_id=2, amount=sp.tez(1))  # 2 + 1 > 20% of 10 tez
+    ]).run(
+        sender=buyer,
+        amount=sp.tez(2),
+        valid=False,
+        exception="OVER_CAP_SHARE"
+    )
+    
+    scenario.h2("Test 5: Zero-amount items and missing pieces are rejected")
+    market.buy_pieces([
+        sp.record(piece_id=1, amount=sp.tez(1)),
+        sp.record(piece_id=2, amount=sp.mutez(0))
+    ]).run(
+        sender=buyer,
+        amount=sp.tez(1),
+        valid=False,
+        exception="SEND_TEZ"
+    )
+    
+    market.buy_pieces([
+        sp.record(piece_id=999, amount=sp.tez(1))
+    ]).run(
+        sender=buyer,
+        amount=sp.tez(1),
+        valid=False,
+        exception="NO_PIECE"
+    )
+    
+    scenario.h2("Test 6: Basket can close a piece")
+    buyer2 = sp.test_account("Buyer2")
+    market.buy_pieces([
+        sp.record(piece_id=0, amount=sp.tez(5)),
+        sp.record(piece_id=1, amount=sp.tez(1))
+    ]).run(sender=buyer2, amount=sp.tez(6))
+    
+    scenario.verify(market.data.funding[0].closed == True)
+    scenario.verify(market.data.funding[1].closed == False)
+
+
+@sp.add_test(name="Market - Artist Payouts (withdraw)")
+def test_market_withdraw():
+    scenario = sp.test_scenario()
+    scenario.h1("Market - Artist Payouts (withdraw)")
+    
+    artist = sp.test_account("Artist")
+    buyer1 = sp.test_account("Buyer1")
+    buyer2 = sp.test_account("Buyer2")
+    admin = sp.test_account("Admin")
+    
+    # Deploy contracts
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    market = FractionalArtMarketV1_FA2(share_fa2=share_contract.address)
+    scenario += market
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    # Setup
+    share_contract.set_admin(market.address).run(sender=admin)
+    nft_contract.mint(sp.record(to_=artist.address, token_id=0)).run(sender=artist)
+    nft_contract.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=artist.address,
+            operator=market.address,
+            token_id=0
+        ))
+    ]).run(sender=artist)
+    
+    market.create_collection(50).run(sender=artist)
+    market.create_piece_from_nft(
+        sp.record(
+            collection_id=0,
+            nft_fa2=nft_contract.address,
+            nft_token_id=0,
+            price=sp.tez(10)
+        )
+    ).run(sender=artist)
+    
+    scenario.h2("Test 1: Nothing to withdraw before any sale")
+    market.withdraw().run(
+        sender=artist,
+        valid=False,
+        exception="NOTHING_TO_WITHDRAW"
+    )
+    
+    scenario.h2("Test 2: Proceeds accumulate across contributions")
+    market.buy_piece(0).run(sender=buyer1, amount=sp.tez(2))
+    market.buy_piece(0).run(sender=buyer2, amount=sp.tez(3))
+    market.buy_piece(0).run(sender=buyer1, amount=sp.tez(1))
+    
+    scenario.verify(market.data.pending_payouts[artist.address] == sp.tez(6))
+    scenario.verify(market.balance == sp.tez(6))
+    
+    pending = scenario.compute(market.get_pending_payout(artist.address))
+    scenario.verify(pending == sp.tez(6))
+    
+    scenario.h2("Test 3: Withdraw pays everything in one transfer")
+    artist_balance_before = scenario.compute(artist.balance)
+    market.withdraw().run(sender=artist)
+    
+    scenario.verify(artist.balance == artist_balance_before + sp.tez(6))
+    scenario.verify(market.balance == sp.tez(0))
+    scenario.verify(~market.data.pending_payouts.contains(artist.address))
+    
+    scenario.h2("Test 4: Cannot withdraw twice")
+    market.withdraw().run(
+        sender=artist,
+        valid=False,
+        exception="NOTHING_TO_WITHDRAW"
+    )
+    
+    scenario.h2("Test 5: Only the artist's own proceeds are paid")
+    market.buy_piece(0).run(sender=buyer2, amount=sp.tez(1))
+    market.withdraw().run(
+        sender=buyer1,
+        valid=False,
+        exception="NOTHING_TO_WITHDRAW"
+    )
+    scenario.verify(market.data.pending_payouts[artist.address] == sp.tez(1))
+
+
+@sp.add_test(name="Market (deferred) - Claiming Shares After Close")
+def test_market_deferred_claims():
+    scenario = sp.test_scenario()
+    scenario.h1("Market (deferred) - Claiming Shares After Close")
+    
+    artist = sp.test_account("Artist")
+    buyer1 = sp.test_account("Buyer1")
+    buyer2 = sp.test_account("Buyer2")
+    relayer = sp.test_account("Relayer")
+    outsider = sp.test_account("Outsider")
+    admin = sp.test_account("Admin")
+    
+    # Deploy contracts
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    market = FractionalArtMarketV1_FA2_Deferred(share_fa2=share_contract.address)
+    scenario += market
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    # Setup
+    share_contract.set_admin(market.address).run(sender=admin)
+    nft_contract.mint(sp.record(to_=artist.address, token_id=0)).run(sender=artist)
+    nft_contract.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=artist.address,
+            operator=market.address,
+            token_id=0
+        ))
+    ]).run(sender=artist)
+    
+    market.create_collection(60).run(sender=artist)
+    market.create_piece_from_nft(
+        sp.record(
+            collection_id=0,
+            nft_fa2=nft_contract.address,
+            nft_token_id=0,
+            price=sp.tez(10)
+        )
+    ).run(sender=artist)
+    
+    scenario.h2("Test 1: Funding only records contributions")
+    market.buy_piece(0).run(sender=buyer1, amount=sp.tez(4))
+    market.buy_pieces([
+        sp.record(piece_id=0, amount=sp.tez(2))
+    ]).run(sender=buyer1, amount=sp.tez(2))
+    
+    scenario.verify(market.data.contributions[sp.pair(0, buyer1.address)] == sp.tez(6))
+    scenario.verify(~share_contract.data.ledger.contains(sp.pair(buyer1.address, 0)))
+    scenario.verify(~share_contract.data.total_supply.contains(0))
+    scenario.verify(market.data.pending_payouts[artist.address] == sp.tez(6))
+    
+    scenario.h2("Test 2: Cannot claim while the piece is open")
+    market.claim_shares(
+        sp.record(piece_id=0, buyers=[buyer1.address])
+    ).run(
+        sender=buyer1,
+        valid=False,
+        exception="PIECE_OPEN"
+    )
+    
+    scenario.h2("Test 3: Relayer claims for every buyer once the piece closes")
+    market.buy_piece(0).run(sender=buyer2, amount=sp.tez(4))
+    scenario.verify(market.data.funding[0].closed == True)
+    
+    market.claim_shares(
+        sp.record(piece_id=0, buyers=[buyer1.address, buyer2.address, outsider.address, buyer1.address])
+    ).run(sender=relayer)
+    
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer1.address, 0)] == 6_000_000)
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer2.address, 0)] == 4_000_000)
+    scenario.verify(~share_contract.data.ledger.contains(sp.pair(outsider.address, 0)))
+    scenario.verify(share_contract.data.total_supply[0] == 10_000_000)
+    scenario.verify(scenario.compute(market.is_claimed(
+        sp.record(piece_id=0, user=buyer1.address)
+    )))
+    
+    scenario.h2("Test 4: Claiming again does not mint twice")
+    market.claim_shares(
+        sp.record(piece_id=0, buyers=[buyer1.address, buyer2.address])
+    ).run(sender=buyer2)
+    
+    scenario.verify(share_contract.data.total_supply[0] == 10_000_000)
+    
+    scenario.h2("Test 5: Cannot claim for a missing piece")
+    market.claim_shares(
+        sp.record(piece_id=999, buyers=[buyer1.address])
+    ).run(
+        sender=buyer1,
+        valid=False,
+        exception="NO_PIECE"
+    )
+
+
+@sp.add_test(name="Market (combined) - Embedded Share Ledger")
+def test_market_combined():
+    scenario = sp.test_scenario()
+    scenario.h1("Market (combined) - Embedded Share Ledger vs Two Contracts")
+    
+    artist = sp.test_account("Artist")
+    buyer1 = sp.test_account("Buyer1")
+    buyer2 = sp.test_account("Buyer2")
+    operator = sp.test_account("Operator")
+    admin = sp.test_account("Admin")
+    
+    # Two-contract deployment
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    market = FractionalArtMarketV1_FA2(share_fa2=share_contract.address)
+    scenario += market
+    
+    # Single-contract deployment
+    combined = FractionalArtMarketV1_Combined()
+    scenario += combined
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    share_contract.set_admin(market.address).run(sender=admin)
+    
+    scenario.h2("Same scenario on both deployments")
+    for token_id, m in [(0, market), (1, combined)]:
+        nft_contract.mint(sp.record(to_=artist.address, token_id=token_id)).run(sender=artist)
+        nft_contract.update_operators([
+            sp.variant("add_operator", sp.record(
+                owner=artist.address,
+                operator=m.address,
+                token_id=token_id
+            ))
+        ]).run(sender=artist)
+        m.create_collection(50).run(sender=artist)
+        m.create_piece_from_nft(
+            sp.record(
+                collection_id=0,
+                nft_fa2=nft_contract.address,
+                nft_token_id=token_id,
+                price=sp.tez(10)
+            )
+        ).run(sender=artist)
+        m.buy_piece(0).run(sender=buyer1, amount=sp.tez(3))
+        m.buy_pieces([
+            sp.record(piece_id=0, amount=sp.tez(2)),
+            sp.record(piece_id=0, amount=sp.tez(1))
+        ]).run(sender=buyer2, amount=sp.tez(3))
+        m.buy_piece(0).run(sender=buyer1, amount=sp.tez(2))
+        m.buy_piece(0).run(sender=buyer2, amount=sp.tez(2))
+    
+    scenario.h2("Test 1: Funding state is identical")
+    scenario.verify(combined.data.funding[0].total_raised == market.data.funding[0].total_raised)
+    scenario.verify(combined.data.funding[0].closed == True)
+    scenario.verify(market.data.funding[0].closed == True)
+    scenario.verify(
+        combined.data.contributions[sp.pair(0, buyer1.address)]
+        == market.data.contributions[sp.pair(0, buyer1.address)]
+    )
+    scenario.verify(combined.data.pending_payouts[artist.address] == sp.tez(10))
+    
+    scenario.h2("Test 2: Shares are credited in the embedded ledger")
+    scenario.verify(combined.data.ledger[sp.pair(buyer1.address, 0)] == 5_000_000)
+    scenario.verify(combined.data.ledger[sp.pair(buyer2.address, 0)] == 5_000_000)
+    scenario.verify(combined.data.total_supply[0] == 10_000_000)
+    scenario.verify(
+        combined.data.ledger[sp.pair(buyer1.address, 0)]
+        == share_contract.data.ledger[sp.pair(buyer1.address, 0)]
+    )
+    scenario.verify(combined.data.total_supply[0] == share_contract.data.total_supply[0])
+    
+    scenario.h2("Test 3: FA2 transfer and operators on the combined contract")
+    combined.transfer([
+        sp.record(
+            from_=buyer1.address,
+            txs=[sp.record(to_=buyer2.address, token_id=0, amount=1_000_000)]
+        )
+    ]).run(sender=buyer1)
+    scenario.verify(combined.data.ledger[sp.pair(buyer1.address, 0)] == 4_000_000)
+    scenario.verify(combined.data.ledger[sp.pair(buyer2.address, 0)] == 6_000_000)
+    
+    combined.transfer([
+        sp.record(
+            from_=buyer2.address,
+            txs=[sp.record(to_=buyer1.address, token_id=0, amount=1)]
+        )
+    ]).run(
+        sender=operator,
+        valid=False,
+        exception="NOT_OPERATOR"
+    )
+    
+    combined.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=buyer2.address,
+            operator=operator.address,
+            token_id=0
+        ))
+    ]).run(sender=buyer2)
+    combined.transfer([
+        sp.record(
+            from_=buyer2.address,
+            txs=[sp.record(to_=buyer1.address, token_id=0, amount=6_000_000)]
+        )
+    ]).run(sender=operator)
+    scenario.verify(combined.data.ledger[sp.pair(buyer1.address, 0)] == 10_000_000)
+    scenario.verify_equal(
+        scenario.compute(combined.get_balances([
+            sp.record(owner=buyer1.address, token_id=0),
+            sp.record(owner=buyer2.address, token_id=0)
+        ])),
+        [
+            sp.record(request=sp.record(owner=buyer1.address, token_id=0), balance=10_000_000),
+            sp.record(request=sp.record(owner=buyer2.address, token_id=0), balance=0)
+        ]
+    )
+    
+    combined.transfer([
+        sp.record(
+            from_=buyer2.address,
+            txs=[sp.record(to_=buyer1.address, token_id=0, amount=1)]
+        )
+    ]).run(
+        sender=operator,
+        valid=False,
+        exception="INSUFFICIENT_BALANCE"
+    )
+
+
+@sp.add_test(name="Market (lazy entry points) - Same Behaviour")
+def test_market_lazy_entry_points():
+    scenario = sp.test_scenario()
+    scenario.h1("Market (lazy entry points) - Same Behaviour")
+    
+    artist = sp.test_account("Artist")
+    buyer = sp.test_account("Buyer")
+    admin = sp.test_account("Admin")
+    
+    # Deploy contracts (lazy build)
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    
+    market = FractionalArtMarketV1_FA2(share_fa2=share_contract.address, lazy_entry_points=True)
+    scenario += market
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    share_contract.set_admin(market.address).run(sender=admin)
+    nft_contract.mint(sp.record(to_=artist.address, token_id=0)).run(sender=artist)
+    nft_contract.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=artist.address,
+            operator=market.address,
+            token_id=0
+        ))
+    ]).run(sender=artist)
+    
+    scenario.h2("Test 1: Lazy entry points (create_collection, create_piece_from_nft)")
+    market.create_collection(100).run(sender=artist)
+    market.create_collection(0).run(
+        sender=artist,
+        valid=False,
+        exception="CAP_TOO_LOW"
+    )
+    market.create_piece_from_nft(
+        sp.record(
+            collection_id=0,
+            nft_fa2=nft_contract.address,
+            nft_token_id=0,
+            price=sp.tez(3)
+        )
+    ).run(sender=artist)
+    scenario.verify(nft_contract.data.ledger[sp.pair(market.address, 0)] == 1)
+    
+    scenario.h2("Test 2: Eager buy_piece")
+    market.buy_piece(0).run(sender=buyer, amount=sp.tez(3))
+    scenario.verify(market.data.funding[0].closed == True)
+    scenario.verify(share_contract.data.ledger[sp.pair(buyer.address, 0)] == 3_000_000)
+    
+    scenario.h2("Test 3: Lazy withdraw")
+    market.withdraw().run(sender=artist)
+    scenario.verify(market.balance == sp.tez(0))
+
+
+@sp.add_test(name="Market - Finalizing Closed Pieces")
+def test_market_finalize_piece():
+    scenario = sp.test_scenario()
+    scenario.h1("Market - Finalizing Closed Pieces (contribution pruning)")
+    
+    artist = sp.test_account("Artist")
+    buyer1 = sp.test_account("Buyer1")
+    buyer2 = sp.test_account("Buyer2")
+    outsider = sp.test_account("Outsider")
+    admin = sp.test_account("Admin")
+    
+    # Split, combined and deferred deployments
+    share_contract = ShareFA2(admin=admin.address)
+    scenario += share_contract
+    market = FractionalArtMarketV1_FA2(share_fa2=share_contract.address)
+    scenario += market
+    share_contract.set_admin(market.address).run(sender=admin)
+    
+    combined = FractionalArtMarketV1_Combined()
+    scenario += combined
+    
+    deferred_share = ShareFA2(admin=admin.address)
+    scenario += deferred_share
+    deferred = FractionalArtMarketV1_FA2_Deferred(share_fa2=deferred_share.address)
+    scenario += deferred
+    deferred_share.set_admin(deferred.address).run(sender=admin)
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    # Piece 0 on each: 10 tez, 60% cap; buyer1 6 tez, buyer2 4 tez closes it
+    for token_id, m in [(0, market), (1, combined), (2, deferred)]:
+        nft_contract.mint(sp.record(to_=artist.address, token_id=token_id)).run(sender=artist)
+        nft_contract.update_operators([
+            sp.variant("add_operator", sp.record(
+                owner=artist.address,
+                operator=m.address,
+                token_id=token_id
+            ))
+        ]).run(sender=artist)
+        m.create_collection(60).run(sender=artist)
+        m.create_piece_from_nft(
+            sp.record(
+                collection_id=0,
+                nft_fa2=nft_contract.address,
+                nft_token_id=token_id,
+                price=sp.tez(10)
+            )
+        ).run(sender=artist)
+        m.buy_piece(0).run(sender=buyer1, amount=sp.tez(6))
+        
+        scenario.h2("Cannot finalize an open or missing piece")
+        m.finalize_piece(sp.record(piece_id=0, buyers=[buyer1.address])).run(
+            sender=outsider,
+            valid=False,
+            exception="PIECE_OPEN"
+        )
+        m.finalize_piece(sp.record(piece_id=7, buyers=[buyer1.address])).run(
+            sender=outsider,
+            valid=False,
+            exception="NO_PIECE"
+        )
+        m.buy_piece(0).run(sender=buyer2, amount=sp.tez(4))
+    
+    scenario.h2("Test 1: Before finalize_piece, the recorded contributions answer")
+    share_contract.transfer([
+        sp.record(
+            from_=buyer1.address,
+            txs=[sp.record(to_=buyer2.address, token_id=0, amount=1_000_000)]
+        )
+    ]).run(sender=buyer1)
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=buyer1.address)
+    )) == sp.tez(6))
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=outsider.address)
+    )) == sp.tez(0))
+    
+    scenario.h2("Test 2: Anyone finalizes a closed piece, pruning in batches")
+    market.finalize_piece(sp.record(piece_id=0, buyers=[buyer1.address, outsider.address])).run(sender=outsider)
+    scenario.verify(market.data.finalized.contains(0))
+    scenario.verify(~market.data.contributions.contains(sp.pair(0, buyer1.address)))
+    scenario.verify(market.data.contributions[sp.pair(0, buyer2.address)] == sp.tez(4))
+    
+    # finalized: every user reads their shares, pruned or not, moved before or after
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=buyer1.address)
+    )) == sp.tez(5))
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=buyer2.address)
+    )) == sp.tez(5))
+    share_contract.transfer([
+        sp.record(
+            from_=buyer2.address,
+            txs=[sp.record(to_=outsider.address, token_id=0, amount=1_000_000)]
+        )
+    ]).run(sender=buyer2)
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=outsider.address)
+    )) == sp.tez(1))
+    
+    market.finalize_piece(sp.record(piece_id=0, buyers=[buyer2.address, buyer1.address])).run(sender=buyer2)
+    scenario.verify(~market.data.contributions.contains(sp.pair(0, buyer2.address)))
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=buyer2.address)
+    )) == sp.tez(4))
+    
+    scenario.h2("Test 3: Combined contract reads its own ledger")
+    combined.finalize_piece(sp.record(piece_id=0, buyers=[buyer1.address, buyer2.address])).run(sender=outsider)
+    scenario.verify(combined.data.finalized.contains(0))
+    scenario.verify(~combined.data.contributions.contains(sp.pair(0, buyer1.address)))
+    scenario.verify(scenario.compute(combined.get_user_contribution(
+        sp.record(piece_id=0, user=buyer1.address)
+    )) == sp.tez(6))
+    
+    scenario.h2("Test 4: Deferred keeps unclaimed contributions")
+    deferred.claim_shares(sp.record(piece_id=0, buyers=[buyer1.address])).run(sender=outsider)
+    deferred.finalize_piece(sp.record(piece_id=0, buyers=[buyer1.address, buyer2.address])).run(sender=outsider)
+    scenario.verify(~deferred.data.contributions.contains(sp.pair(0, buyer1.address)))
+    scenario.verify(deferred.data.contributions[sp.pair(0, buyer2.address)] == sp.tez(4))
+    scenario.verify(scenario.compute(deferred.get_user_contribution(
+        sp.record(piece_id=0, user=buyer1.address)
+    )) == sp.tez(6))
+    scenario.verify(scenario.compute(deferred.is_claimed(
+        sp.record(piece_id=0, user=buyer1.address)
+    )))
+    # unclaimed: no shares yet, the contribution still owed counts
+    scenario.verify(scenario.compute(deferred.get_user_contribution(
+        sp.record(piece_id=0, user=buyer2.address)
+    )) == sp.tez(4))
+    
+    # buyer2 can still claim, then be pruned; claiming again mints nothing
+    deferred.claim_shares(sp.record(piece_id=0, buyers=[buyer2.address])).run(sender=outsider)
+    deferred.finalize_piece(sp.record(piece_id=0, buyers=[buyer2.address])).run(sender=outsider)
+    deferred.claim_shares(sp.record(piece_id=0, buyers=[buyer1.address, buyer2.address])).run(sender=outsider)
+    scenario.verify(deferred_share.data.total_supply[0] == 10_000_000)
+    scenario.verify(scenario.compute(deferred.get_user_contribution(
+        sp.record(piece_id=0, user=buyer2.address)
+    )) == sp.tez(4))
+
+
+@sp.add_test(name="Market (tickets) - Ticket Shares and Wrapper")
+def test_market_tickets():
+    scenario = sp.test_scenario()
+    scenario.h1("Market (tickets) - Ticket Shares and FA2 Wrapper")
+    
+    artist = sp.test_account("Artist")
+    holder = sp.test_account("Holder")
+    admin = sp.test_account("Admin")
+    
+    # Deploy contracts: wrapper, tickets market, wallets holding tickets
+    wrapper = ShareTicketWrapper(admin=admin.address)
+    scenario += wrapper
+    
+    market = FractionalArtMarketV1_Tickets(share_fa2=wrapper.address)
+    scenario += market
+    
+    wallet1 = TicketWallet()
+    scenario += wallet1
+    wallet2 = TicketWallet()
+    scenario += wallet2
+    
+    nft_contract = MockNFT_FA2()
+    scenario += nft_contract
+    
+    wrapper.set_ticketer(market.address).run(
+        sender=holder,
+        valid=False,
+        exception="NOT_ADMIN"
+    )
+    wrapper.set_ticketer(market.address).run(sender=admin)
+    
+    nft_contract.mint(sp.record(to_=artist.address, token_id=0)).run(sender=artist)
+    nft_contract.update_operators([
+        sp.variant("add_operator", sp.record(
+            owner=artist.address,
+            operator=market.address,
+            token_id=0
+        ))
+    ]).run(sender=artist)
+    market.create_collection(50).run(sender=artist)
+    market.create_piece_from_nft(
+        sp.record(
+            collection_id=0,
+            nft_fa2=nft_contract.address,
+            nft_token_id=0,
+            price=sp.tez(10)
+        )
+    ).run(sender=artist)
+    
+    scenario.h2("Test 1: Funding sends a ticket to the buyer")
+    wallet1.buy(sp.record(market=market.address, piece_id=0)).run(sender=holder, amount=sp.tez(3))
+    wallet1.buy(sp.record(market=market.address, piece_id=0)).run(sender=holder, amount=sp.tez(2))
+    wallet2.buy(sp.record(market=market.address, piece_id=0)).run(sender=holder, amount=sp.tez(5))
+    
+    scenario.verify(wallet1.data.received[0] == 5_000_000)
+    scenario.verify(wallet2.data.received[0] == 5_000_000)
+    scenario.verify(market.data.contributions[sp.pair(0, wallet1.address)] == sp.tez(5))
+    scenario.verify(market.data.funding[0].closed == True)
+    scenario.verify(market.data.pending_payouts[artist.address] == sp.tez(10))
+    scenario.verify(~wrapper.data.total_supply.contains(0))
+    
+    scenario.h2("Test 2: Wrapping credits the FA2 balance")
+    wrap = sp.contract(ShareTicket, wrapper.address, entry_point="wrap").open_some()
+    wallet1.send(sp.record(token_id=0, to_=wrap)).run(sender=holder)
+    scenario.verify(wrapper.data.ledger[sp.pair(wallet1.address, 0)] == 5_000_000)
+    scenario.verify(wrapper.data.total_supply[0] == 5_000_000)
+    scenario.verify(~wallet1.data.tickets.contains(0))
+    
+    scenario.h2("Test 3: Wrapped balances move with FA2 transfer")
+    wrapper.transfer([
+        sp.record(
+            from_=wallet1.address,
+            txs=[sp.record(to_=holder.address, token_id=0, amount=1_000_000)]
+        )
+    ]).run(
+        sender=holder,
+        valid=False,
+        exception="NOT_OPERATOR"
+    )
+    wallet2.send(sp.record(token_id=0, to_=wrap)).run(sender=holder)
+    wrapper.transfer([
+        sp.record(
+            from_=wallet2.address,
+            txs=[sp.record(to_=wallet1.address, token_id=0, amount=1_000_000)]
+        )
+    ]).run(sender=wallet2.address)
+    scenario.verify(wrapper.data.ledger[sp.pair(wallet1.address, 0)] == 6_000_000)
+    scenario.verify(wrapper.data.ledger[sp.pair(wallet2.address, 0)] == 4_000_000)
+    scenario.verify(wrapper.data.total_supply[0] == 10_000_000)
+    
+    scenario.h2("Test 4: Unwrapping sends a ticket split off the held one")
+    receiver = sp.contract(ShareTicket, wallet2.address).open_some()
+    wrapper.unwrap(sp.record(token_id=0, amount=5_000_000, receiver=receiver)).run(
+        sender=wallet2.address,
+        valid=False,
+        exception="INSUFFICIENT_BALANCE"
+    )
+    wrapper.unwrap(sp.record(token_id=0, amount=0, receiver=receiver)).run(
+        sender=wallet2.address,
+        valid=False,
+        exception="ZERO_AMOUNT"
+    )
+    wrapper.unwrap(sp.record(token_id=0, amount=1_500_000, receiver=receiver)).run(sender=wallet2.address)
+    scenario.verify(wallet2.data.received[0] == 6_500_000)
+    scenario.verify(wrapper.data.ledger[sp.pair(wallet2.address, 0)] == 2_500_000)
+    scenario.verify(wrapper.data.total_supply[0] == 8_500_000)
+    
+    # Unwrapping everything that is left empties the held ticket
+    wrapper.unwrap(sp.record(token_id=0, amount=2_500_000, receiver=receiver)).run(sender=wallet2.address)
+    wrapper.unwrap(sp.record(token_id=0, amount=6_000_000, receiver=receiver)).run(sender=wallet1.address)
+    scenario.verify(wrapper.data.total_supply[0] == 0)
+    scenario.verify(~wrapper.data.tickets.contains(0))
+    scenario.verify(wallet2.data.received[0] == 15_000_000)
+    
+    scenario.h2("Test 5: Tickets from another ticketer are rejected")
+    wallet1.forge(sp.record(token_id=0, amount=1_000_000, to_=wrap)).run(
+        sender=holder,
+        valid=False,
+        exception="BAD_TICKETER"
+    )
+    
+    scenario.h2("Test 6: finalize_piece is disabled, contributions stay the record")
+    market.finalize_piece(sp.record(piece_id=0, buyers=[wallet1.address, wallet2.address])).run(
+        sender=holder,
+        valid=False,
+        exception="FINALIZE_DISABLED"
+    )
+    scenario.verify(~market.data.finalized.contains(0))
+    # wallet2 wraps every ticket it holds, wallet1 holds none: both still read what they paid
+    wallet2.send(sp.record(token_id=0, to_=wrap)).run(sender=holder)
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=wallet2.address)
+    )) == sp.tez(5))
+    scenario.verify(scenario.compute(market.get_user_contribution(
+        sp.record(piece_id=0, user=wallet1.address)
+    )) == sp.tez(5))
+
+
+@sp.add_test(name="Michelson - Local PACK Matches sp.pack")
+def test_local_pack_vectors():
+    scenario = sp.test_scenario()
+    scenario.h1("michelson.pack against sp.pack (big_map key types)")
+    
+    market = sp.address("KT1EFLUVW2a1eCr7yDygD5RaCpP3bGr8Rqyy")
+    
+    NAT = {"prim": "nat"}
+    ADDRESS = {"prim": "address"}
+    
+    # (SmartPy value, Micheline value, Micheline type)
+    vectors = [
+        (sp.nat(0), {"int": "0"}, NAT),
+        (sp.nat(63), {"int": "63"}, NAT),
+        (sp.nat(64), {"int": "64"}, NAT),
+        (sp.nat(1000000), {"int": "1000000"}, NAT),
+        (sp.int(-65), {"int": "-65"}, {"prim": "int"}),
+        (sp.mutez(2500000), {"int": "2500000"}, {"prim": "mutez"}),
+        (sp.address("tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K"), {"string": "tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K"}, ADDRESS),
+        (market, {"string": "KT1EFLUVW2a1eCr7yDygD5RaCpP3bGr8Rqyy"}, ADDRESS),
+        # contributions key: (piece_id, buyer)
+        (
+            sp.pair(sp.nat(3), sp.address("tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K")),
+            {"prim": "Pair", "args": [{"int": "3"}, {"string": "tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K"}]},
+            {"prim": "pair", "args": [NAT, ADDRESS]}
+        ),
+        # ledger key: (owner, token_id)
+        (
+            sp.pair(market, sp.nat(129)),
+            {"prim": "Pair", "args": [{"string": "KT1EFLUVW2a1eCr7yDygD5RaCpP3bGr8Rqyy"}, {"int": "129"}]},
+            {"prim": "pair", "args": [ADDRESS, NAT]}
+        ),
+        # operators key: { owner, operator, token_id }
+        (
+            sp.set_type_expr(
+                sp.record(owner=sp.address("tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K"), operator=market, token_id=7),
+                sp.TRecord(owner=sp.TAddress, operator=sp.TAddress, token_id=sp.TNat)
+                    .layout(("owner", ("operator", "token_id")))
+            ),
+            {"prim": "Pair", "args": [{"string": "tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K"},
+                                      {"string": "KT1EFLUVW2a1eCr7yDygD5RaCpP3bGr8Rqyy"}, {"int": "7"}]},
+            {"prim": "pair", "args": [ADDRESS, ADDRESS, NAT]}
+        ),
+        (sp.string("ab"), {"string": "ab"}, {"prim": "string"}),
+        (sp.bool(True), {"prim": "True"}, {"prim": "bool"}),
+    ]
+    
+    for value, micheline, michelson_type in vectors:
+        scenario.verify(sp.pack(value) == sp.bytes("0x" + local_pack(micheline, michelson_type).hex()))
+
+
 @sp.add_test(name="Integration - Full Workflow")
 def test_full_integration():
     scenario = sp.test_scenario()
@@ -1187,7 +2434,7 @@ def test_full_integration():
     market.buy_piece(2).run(sender=collector2, amount=sp.tez(5))
     
     # Verify piece 2 is fully funded and closed
-    scenario.verify(market.data.pieces[2].closed == True)
+    scenario.verify(market.data.funding[2].closed == True)
     
     scenario.h3("5. Verify share ownership")
     # Collector1 should have shares in piece 0 and piece 2
@@ -1233,8 +2480,8 @@ def test_full_integration():
     market.buy_piece(0).run(sender=buyer6, amount=sp.tez(3))
     market.buy_piece(0).run(sender=buyer7, amount=sp.tez(3))
     
-    scenario.verify(market.data.pieces[0].closed == True)
-    scenario.verify(market.data.pieces[0].total_raised == sp.tez(20))
+    scenario.verify(market.data.funding[0].closed == True)
+    scenario.verify(market.data.funding[0].total_raised == sp.tez(20))
     
     scenario.h3("8. Verify total supply of shares")
     scenario.verify(share_contract.data.total_supply[0] == 20_000_000)
@@ -0,0 +1,191 @@
+"""
+Tests for the indexer, run on recorded blocks (tests/fixtures/indexer).
+"""
+
+import copy
+import json
+import os
+
+import pytest
+
+from indexer.db import Database
+from indexer.layouts import BIG_MAPS
+from indexer.source import FixtureSource
+from indexer.sync import Indexer, ReorgError
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "indexer", "market_blocks.json")
+
+
+@pytest.fixture
+def data():
+    with open(FIXTURE) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def acc(data):
+    return data["accounts"]
+
+
+def make_indexer(path, data):
+    source = FixtureSource(data)
+    return Indexer(Database(str(path)), source, [data["accounts"]["market"], data["accounts"]["share"]], log=lambda *_: None)
+
+
+def dump(db):
+    tables = ("collections", "pieces", "contributions", "pending_payouts", "balances", "total_supply")
+    return {t: db.conn.execute("SELECT * FROM %s ORDER BY 1, 2, 3" % t).fetchall() for t in tables}
+
+
+def test_resolves_big_maps_by_annotation(tmp_path, data, acc):
+    ix = make_indexer(tmp_path / "ix.sqlite", data)
+    ix.resolve_big_maps()
+    maps = ix.db.big_maps()
+    assert maps[13] == (acc["market"], "collections")
+    assert maps[15] == (acc["market"], "funding")
+    assert maps[17] == (acc["market"], "pieces")
+    assert maps[10] == (acc["share"], "ledger")
+    assert maps[12] == (acc["share"], "total_supply")
+    # operators is not indexed
+    assert 11 not in maps
+
+
+def test_full_sync(tmp_path, data, acc):
+    ix = make_indexer(tmp_path / "ix.sqlite", data)
+    assert ix.sync(100) == 106
+    db = ix.db
+    market, share = acc["market"], acc["share"]
+
+    # the failed and backtracked create_collection calls left nothing
+    assert db.conn.execute("SELECT * FROM collections").fetchall() == [(market, 0, acc["bob"], 50)]
+
+    # listing (pieces) and funding state share one row
+    assert db.conn.execute("SELECT * FROM pieces").fetchall() == [
+        (market, 0, 0, acc["nft"], 7, 4_000_000, 2_000_000, acc["bob"], 4_000_000, 1)
+    ]
+    assert dict(db.conn.execute("SELECT user, amount FROM contributions WHERE piece_id = 0").fetchall()) == {
+        acc["alice"]: 2_000_000, acc["john"]: 2_000_000
+    }
+    # withdraw removed the payout entry
+    assert db.conn.execute("SELECT * FROM pending_payouts").fetchall() == []
+
+    assert dict(db.conn.execute("SELECT owner, balance FROM balances WHERE contract = ? AND token_id = 0",
+                                (share,)).fetchall()) == {
+        acc["alice"]: 1_600_000, acc["john"]: 2_000_000, acc["jane"]: 400_000
+    }
+    assert db.conn.execute("SELECT * FROM total_supply").fetchall() == [(share, 0, 4_000_000)]
+    # foreign big_maps (the NFT contract's ledger) are ignored
+    assert db.conn.execute("SELECT count(*) FROM balances WHERE contract = ?", (acc["nft"],)).fetchone() == (0,)
+
+    assert db.checkpoint() == (106, data["blocks"][-1]["hash"])
+
+
+def test_resume_from_checkpoint_matches_one_pass(tmp_path, data):
+    once = make_indexer(tmp_path / "once.sqlite", data)
+    once.sync(100)
+
+    path = tmp_path / "resumed.sqlite"
+    first = make_indexer(path, data)
+    assert first.sync(100, to_level=103) == 103
+    first.db.close()
+
+    second = make_indexer(path, data)
+    assert second.db.checkpoint()[0] == 103
+    # start_level is ignored once a checkpoint exists
+    assert second.sync(0) == 106
+    assert dump(second.db) == dump(once.db)
+
+
+def test_intermediate_state(tmp_path, data, acc):
+    ix = make_indexer(tmp_path / "ix.sqlite", data)
+    ix.sync(100, to_level=103)
+    assert ix.db.conn.execute("SELECT total_raised, closed FROM pieces").fetchall() == [(1_000_000, 0)]
+    assert ix.db.conn.execute("SELECT artist, amount FROM pending_payouts").fetchall() == [(acc["bob"], 1_000_000)]
+
+
+def test_failed_block_rolls_back_and_keeps_checkpoint(tmp_path, data, monkeypatch):
+    ix = make_indexer(tmp_path / "ix.sqlite", data)
+    ix.sync(100, to_level=104)
+    before = dump(ix.db)
+
+    # block 105 decodes the contributions diff first, then breaks on funding
+    def broken(node):
+        raise ValueError("boom")
+    monkeypatch.setattr(BIG_MAPS["funding"], "decode_value", broken)
+    with pytest.raises(ValueError):
+        ix.sync(0)
+
+    assert ix.db.checkpoint()[0] == 104
+    assert dump(ix.db) == before
+
+
+def test_reorg_is_detected(tmp_path, data):
+    ix = make_indexer(tmp_path / "ix.sqlite", data)
+    ix.sync(100, to_level=103)
+
+    forked = copy.deepcopy(data)
+    forked["blocks"][4]["predecessor"] = "BLockOnAnotherBranch"
+    ix.source = FixtureSource(forked)
+    with pytest.raises(ReorgError) as e:
+        ix.sync(0)
+    assert e.value.level == 104
+    assert ix.db.checkpoint()[0] == 103
+
+
+def event(source, tag, payload, status="applied"):
+    return {"kind": "event", "source": source, "nonce": 0, "tag": tag, "payload": payload,
+            "result": {"status": status, "consumed_milligas": "100000"}}
+
+
+def with_event_block(data, acc, status="applied"):
+    """The recorded chain plus a block whose buy_piece emitted events (contribution, mint)."""
+    data = copy.deepcopy(data)
+    last = data["blocks"][-1]
+    contribution = [{"int": "0"}, {"string": acc["jane"]}, {"int": "500000"}, {"int": "4000000"}, {"prim": "True"}]
+    mint = {"prim": "Pair", "args": [{"string": acc["jane"]}, {"int": "0"}, {"int": "500000"}]}
+    data["blocks"].append({
+        "level": last["level"] + 1,
+        "hash": "BLockWithEvents",
+        "predecessor": last["hash"],
+        "operations": [{"hash": "ooEvents", "contents": [{
+            "kind": "transaction",
+            "metadata": {
+                "operation_result": {"status": status},
+                "internal_operation_results": [
+                    event(acc["market"], "contribution", contribution, status),
+                    event(acc["share"], "mint", mint, status),
+                    # not an indexed contract
+                    event(acc["nft"], "mint", mint, status),
+                ],
+            },
+        }]}],
+    })
+    return data
+
+
+def test_events_are_decoded(tmp_path, data, acc):
+    ix = make_indexer(tmp_path / "ix.sqlite", with_event_block(data, acc))
+    ix.sync(100)
+    assert ix.db.events() == [
+        (acc["market"], 107, "ooEvents", "contribution",
+         {"piece_id": 0, "buyer": acc["jane"], "amount": 500_000, "total_raised": 4_000_000, "closed": True}),
+        (acc["share"], 107, "ooEvents", "mint", {"to_": acc["jane"], "token_id": 0, "amount": 500_000}),
+    ]
+    assert [e[3] for e in ix.db.events(contract=acc["share"])] == ["mint"]
+    assert ix.db.events(since_level=108) == []
+
+
+def test_backtracked_events_are_skipped(tmp_path, data, acc):
+    ix = make_indexer(tmp_path / "ix.sqlite", with_event_block(data, acc, status="backtracked"))
+    assert ix.sync(100) == 107
+    assert ix.db.events() == []
+
+
+def test_events_only(tmp_path, data, acc):
+    source = FixtureSource(with_event_block(data, acc))
+    source.scripts = {}
+    ix = Indexer(Database(str(tmp_path / "ix.sqlite")), source, [acc["market"], acc["share"]],
+                 log=lambda *_: None, events_only=True)
+    assert ix.sync(100) == 107
+    assert [e[3] for e in ix.db.events()] == ["contribution", "mint"]
+    assert dump(ix.db)["balances"] == []
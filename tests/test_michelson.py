@@ -0,0 +1,140 @@
+"""
+Tests for the Micheline decoding and address helpers.
+"""
+
+import pytest
+
+from michelson.base58 import Base58Error, decode_address, encode_address, script_expr_hash
+from michelson.micheline import MichelineError, big_map_ids, comb, to_address, to_bool, to_int
+from michelson.pack import key_hash, key_hashes, pack, pack_many, zarith
+
+TZ1 = "tz1e7EgZiGnX8nvAAMKRMu1hLYKZChRLXe2K"
+KT1 = "KT1EFLUVW2a1eCr7yDygD5RaCpP3bGr8Rqyy"
+
+
+def test_address_bytes_roundtrip():
+    raw = decode_address(TZ1)
+    assert len(raw) == 22 and raw[:2] == b"\x00\x00"
+    assert encode_address(raw) == TZ1
+
+    raw = decode_address(KT1)
+    assert raw[0] == 1 and raw[-1] == 0
+    assert encode_address(raw) == KT1
+
+
+def test_address_errors():
+    with pytest.raises(Base58Error):
+        decode_address(TZ1[:-1] + ("y" if TZ1[-1] != "y" else "z"))
+    with pytest.raises(Base58Error):
+        encode_address(b"\x00" * 21)
+
+
+def test_script_expr_hash():
+    # big_map key hash of nat 0 (PACK 0 = 0x050000)
+    assert script_expr_hash(bytes.fromhex("050000")) == "exprtZBwZUeYYYfUs9B9Rg2ywHezVHnCCnmF9WsDQVrs582dSK63dC"
+
+
+def test_to_address_accepts_string_and_bytes():
+    assert to_address({"string": TZ1}) == TZ1
+    assert to_address({"bytes": decode_address(KT1).hex()}) == KT1
+    with pytest.raises(MichelineError):
+        to_address({"int": "1"})
+
+
+def test_comb_reads_nested_flat_and_sequence_pairs():
+    a, b, c = {"int": "1"}, {"int": "2"}, {"prim": "True"}
+    nested = {"prim": "Pair", "args": [a, {"prim": "Pair", "args": [b, c]}]}
+    flat = {"prim": "Pair", "args": [a, b, c]}
+    for node in (nested, flat, [a, b, c]):
+        x, y, z = comb(node, 3)
+        assert (to_int(x), to_int(y), to_bool(z)) == (1, 2, True)
+    # a single field is the value itself
+    assert comb(a, 1) == [a]
+
+
+def test_big_map_ids_follow_annotations():
+    t = {"prim": "pair", "args": [
+        {"prim": "big_map", "args": [{"prim": "nat"}, {"prim": "nat"}], "annots": ["%total_supply"]},
+        {"prim": "address", "annots": ["%admin"]},
+        {"prim": "big_map", "args": [{"prim": "nat"}, {"prim": "nat"}], "annots": ["%ledger"]},
+    ]}
+    v = [{"int": "5"}, {"string": TZ1}, {"int": "9"}]
+    assert big_map_ids(t, v) == {"total_supply": 5, "ledger": 9}
+
+
+NAT = {"prim": "nat"}
+ADDRESS = {"prim": "address"}
+
+
+def nat(n):
+    return {"int": str(n)}
+
+
+def test_zarith():
+    assert [zarith(n).hex() for n in (0, 1, 63, 64, 127, 128, 8191, 8192, -1, -64, -65)] == [
+        "00", "01", "3f", "8001", "bf01", "8002", "bf7f", "808001", "41", "c001", "c101"
+    ]
+
+
+def test_pack_scalars():
+    assert pack(nat(0), NAT).hex() == "050000"
+    assert pack(nat(1_000_000), NAT).hex() == "050080897a"
+    assert pack({"int": "-5"}, {"prim": "int"}).hex() == "050045"
+    assert pack({"string": "ab"}, {"prim": "string"}).hex() == "05010000000261" + "62"
+    assert pack({"bytes": "beef"}, {"prim": "bytes"}).hex() == "050a00000002beef"
+    assert pack({"prim": "True"}, {"prim": "bool"}).hex() == "05030a"
+    assert pack({"prim": "Unit"}, {"prim": "unit"}).hex() == "05030b"
+    assert pack({"prim": "Some", "args": [nat(2)]}, {"prim": "option", "args": [NAT]}).hex() == "0505090002"
+    assert pack({"prim": "None"}, {"prim": "option", "args": [NAT]}).hex() == "050306"
+
+
+def test_pack_addresses_as_bytes():
+    raw = decode_address(TZ1).hex()
+    assert pack({"string": TZ1}, ADDRESS).hex() == "050a00000016" + raw
+    # optimized input packs the same
+    assert pack({"bytes": raw}, ADDRESS) == pack({"string": TZ1}, ADDRESS)
+    with pytest.raises(MichelineError):
+        pack({"string": KT1 + "%mint"}, ADDRESS)
+
+
+def test_pack_contract_key_types():
+    tz1, kt1 = decode_address(TZ1).hex(), decode_address(KT1).hex()
+    # contributions: (piece_id, buyer)
+    contribution = {"prim": "Pair", "args": [nat(3), {"string": TZ1}]}
+    assert pack(contribution, {"prim": "pair", "args": [NAT, ADDRESS]}).hex() == \
+        "0507070003" + "0a00000016" + tz1
+    # ledger: (owner, token_id)
+    ledger = {"prim": "Pair", "args": [{"string": TZ1}, nat(0)]}
+    assert pack(ledger, {"prim": "pair", "args": [ADDRESS, NAT]}).hex() == \
+        "050707" + "0a00000016" + tz1 + "0000"
+    # operators: {owner, operator, token_id}, a right comb: n-ary and nested forms pack the same
+    expected = "050707" + "0a00000016" + tz1 + "0707" + "0a00000016" + kt1 + "0001"
+    flat_type = {"prim": "pair", "args": [ADDRESS, ADDRESS, NAT]}
+    nested_type = {"prim": "pair", "args": [ADDRESS, {"prim": "pair", "args": [ADDRESS, NAT]}]}
+    flat = {"prim": "Pair", "args": [{"string": TZ1}, {"string": KT1}, nat(1)]}
+    nested = {"prim": "Pair", "args": [{"string": TZ1}, {"prim": "Pair", "args": [{"string": KT1}, nat(1)]}]}
+    seq = [{"string": TZ1}, {"string": KT1}, nat(1)]
+    for value in (flat, nested, seq):
+        for t in (flat_type, nested_type):
+            assert pack(value, t).hex() == expected
+
+
+def test_key_hashes_batch():
+    # well-known big_map key hashes of nat 0 and 1
+    assert key_hashes([nat(0), nat(1)], NAT) == [
+        "exprtZBwZUeYYYfUs9B9Rg2ywHezVHnCCnmF9WsDQVrs582dSK63dC",
+        "expru2dKqDfZG8hu4wNGkiyunvq2hdSKuVYtcKta7BWP6Q18oNxKjS",
+    ]
+    keys = [{"prim": "Pair", "args": [nat(i), {"string": TZ1}]} for i in range(5)]
+    t = {"prim": "pair", "args": [NAT, ADDRESS]}
+    assert pack_many(keys, t) == [pack(k, t) for k in keys]
+    assert key_hashes(keys, t)[3] == key_hash(keys[3], t)
+
+
+def test_pack_errors():
+    with pytest.raises(MichelineError):
+        pack(nat(-1), NAT)
+    with pytest.raises(MichelineError):
+        pack({"string": "x"}, NAT)
+    with pytest.raises(MichelineError):
+        pack(nat(0), {"prim": "lambda", "args": [NAT, NAT]})
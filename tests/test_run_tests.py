@@ -0,0 +1,172 @@
+"""
+Tests for the parallel SmartPy test runner (scripts/run_tests.py), on a
+generated legacy SmartPy file and a stand-in for the SmartPy CLI.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from scripts.run_tests import collect, main, run_all, summarize
+from scripts.shards import HEADER_LINES, discover_targets, discover_tests, slug, write_shard
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_CONTRACTS = os.path.join(ROOT, "tests", "test_contracts.py")
+
+# sp.for / sp.if / sp.else: the CLI preprocesses this, plain Python cannot compile it
+SUITE = textwrap.dedent('''
+    import smartpy as sp
+
+    class Counter(sp.Contract):
+        def __init__(self):
+            self.init(n=0)
+
+        @sp.entry_point
+        def add(self, values):
+            sp.for v in values:
+                sp.if v > 0:
+                    self.data.n += v
+                sp.else:
+                    pass
+
+    @sp.add_test(name="Counter - Adds")
+    def adds():
+        pass
+
+    @sp.add_test(name="Counter - Broken")
+    def broken():
+        pass
+
+    @sp.add_test(name="Counter - Skips")
+    def skips():
+        pass
+
+    @sp.add_test(name="Other - Listing")
+    def listing():
+        pass
+
+    sp.add_compilation_target("counter", Counter())
+''')
+
+FAILING = ["Counter - Broken"]
+
+# Stand-in CLI: `fake test <shard.py> <output>`; fails the FAILING tests. Each run records
+# when it started and ended, and waits (at most 10 s) until `expected` runs have started.
+FAKE_CLI = textwrap.dedent('''
+    import json, os, re, sys, time
+    _, cmd, shard, out = sys.argv
+    name = re.search(r"runs only test '(.*)' of", open(shard).read()).group(1)
+    os.makedirs(out)
+    start = time.time()
+    open(os.path.join({started!r}, re.sub(r"\\W+", "_", name)), "w").close()
+    while len(os.listdir({started!r})) < {expected} and time.time() < start + 10:
+        time.sleep(0.01)
+    with open(os.path.join(out, "run.json"), "w") as f:
+        json.dump({{"name": name, "start": start, "end": time.time()}}, f)
+    print("ran", name)
+    sys.exit(1 if name in {failing!r} else 0)
+''')
+
+
+@pytest.fixture
+def suite(tmp_path):
+    path = tmp_path / "suite.py"
+    path.write_text(SUITE)
+    return str(path)
+
+
+def fake_cli(tmp_path, expected=1):
+    started = tmp_path / "started"
+    started.mkdir(exist_ok=True)
+    path = tmp_path / "fake_smartpy.py"
+    path.write_text(FAKE_CLI.format(started=str(started), expected=expected, failing=FAILING))
+    return "%s %s" % (sys.executable, path)
+
+
+def test_discovers_tests_in_legacy_smartpy_file(suite):
+    assert discover_tests(suite) == ["Counter - Adds", "Counter - Broken", "Counter - Skips", "Other - Listing"]
+    assert discover_targets(suite) == ["counter"]
+    # the real suite parses too, and every decorator is found once
+    names = discover_tests(TEST_CONTRACTS)
+    assert len(names) == len(set(names))
+    with open(TEST_CONTRACTS) as f:
+        assert len(names) == f.read().count("@sp.add_test(")
+
+
+def test_shard_is_the_file_with_one_registration(suite, tmp_path):
+    # a stand-in smartpy module that records registrations
+    (tmp_path / "smartpy.py").write_text(textwrap.dedent('''
+        registered = []
+        class Contract:
+            def init(self, **kwargs):
+                pass
+        def entry_point(f):
+            return f
+        def add_test(name, **kwargs):
+            def deco(f):
+                registered.append(("test", name))
+                return f
+            return deco
+        def add_compilation_target(name, contract):
+            registered.append(("target", name))
+    '''))
+    # run it as the CLI does: preprocess the legacy statements, then execute
+    check = ("import smartpy; from scripts.shards import read_source; "
+             "exec(compile(read_source(%r), 'shard.py', 'exec'), {'__name__': '__main__'}); print(smartpy.registered)")
+    for kind, name, expected in (("test", "Counter - Skips", [("test", "Counter - Skips")]),
+                                 ("target", "counter", [("target", "counter")])):
+        shard = write_shard(str(tmp_path / ("shard_%s.py" % slug(name))), suite, name, kind)
+        with open(shard) as f:
+            text = f.read()
+        assert "        sp.for v in values:\n" in text
+        assert len(text.splitlines()) == len(SUITE.splitlines()) + HEADER_LINES
+        out = subprocess.run([sys.executable, "-c", check % shard], capture_output=True, text=True, cwd=str(tmp_path),
+                             env=dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), ROOT])))
+        assert out.returncode == 0, out.stderr
+        assert out.stdout.strip() == repr(expected)
+    with pytest.raises(ValueError):
+        write_shard(str(tmp_path / "missing.py"), suite, "Counter - Missing")
+
+
+def test_runs_shards_in_parallel_with_separate_outputs(suite, tmp_path):
+    out = str(tmp_path / "out")
+    shards = collect([suite], out, keyword="counter -")
+    assert [s.name for s in shards] == ["Counter - Adds", "Counter - Broken", "Counter - Skips"]
+
+    results = run_all(shards, fake_cli(tmp_path, expected=len(shards)), jobs=len(shards), log=lambda *_: None)
+
+    assert [r["name"] for r in results] == [s.name for s in shards]
+    runs = []
+    for s, r in zip(shards, results):
+        assert r["output"] == os.path.join(out, "suite", slug(s.name))
+        with open(os.path.join(r["output"], "output", "run.json")) as f:
+            run = json.load(f)
+        assert run["name"] == s.name
+        runs.append(run)
+        assert r["status"] == ("fail" if s.name in FAILING else "pass")
+    # every run was still going when the last one started
+    assert max(run["start"] for run in runs) < min(run["end"] for run in runs)
+
+    summary = summarize(results, 1.0, len(shards))
+    assert summary["counts"] == {"pass": 2, "fail": 1}
+
+
+def test_main_writes_summary_and_exit_code(suite, tmp_path, capsys):
+    out = tmp_path / "out"
+    cli = fake_cli(tmp_path)
+    assert main([suite, "-k", "Other", "--out", str(out), "--smartpy", cli, "-j", "4"]) == 0
+    summary = json.loads((out / "summary.json").read_text())
+    assert summary["counts"] == {"pass": 1}
+    assert main([suite, "-k", "counter", "--out", str(out), "--smartpy", cli]) == 1
+    assert json.loads((out / "summary.json").read_text())["counts"] == {"pass": 2, "fail": 1}
+    assert "suite/counter_broken/log.txt" in capsys.readouterr().out
+
+
+def test_missing_cli_is_reported_as_error(suite, tmp_path):
+    shards = collect([suite], str(tmp_path), keyword="Other")
+    results = run_all(shards, str(tmp_path / "no-such-smartpy"), jobs=1, log=lambda *_: None)
+    assert [r["status"] for r in results] == ["error"]
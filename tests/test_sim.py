@@ -0,0 +1,267 @@
+"""
+Tests for the reference model (sim/).
+"""
+
+import pytest
+
+from sim.differential import scenario_source
+from sim.loadgen import PROFILES, Profile, capacity, format_report, report
+from sim.loadgen import run as run_load
+from sim.model import Deployment, Op, Rejected, ShareModel
+from sim.workload import Sampler, run
+
+TEZ = 1_000_000
+
+
+def listed(price=10 * TEZ, cap_percent=50):
+    d = Deployment()
+    m = d.market
+    m.create_collection("bob", cap_percent)
+    m.create_piece_from_nft("bob", 0, "nft", 0, price)
+    return d
+
+
+def error(f, *args):
+    with pytest.raises(Rejected) as e:
+        f(*args)
+    return e.value.error
+
+
+def test_listing_errors():
+    d = listed()
+    m = d.market
+    assert error(m.create_collection, "bob", 0) == "CAP_TOO_LOW"
+    assert error(m.create_collection, "bob", 101) == "CAP_TOO_HIGH"
+    assert error(m.create_piece_from_nft, "bob", 9, "nft", 1, TEZ) == "NO_COLLECTION"
+    assert error(m.create_piece_from_nft, "alice", 0, "nft", 1, TEZ) == "NOT_ARTIST"
+    assert error(m.create_piece_from_nft, "bob", 0, "nft", 1, 0) == "BAD_PRICE"
+    # cap_amount rounds down like sp.split_tokens
+    m.create_collection("bob", 33)
+    pid = m.create_piece_from_nft("bob", 1, "nft", 1, 10)
+    assert m.get_cap_amount(pid) == 3
+
+
+def test_buy_piece_rules_and_close():
+    d = listed()
+    m, s = d.market, d.share
+    assert error(m.buy_piece, "alice", TEZ, 7) == "NO_PIECE"
+    assert error(m.buy_piece, "alice", 0, 0) == "SEND_TEZ"
+    assert error(m.buy_piece, "alice", 6 * TEZ, 0) == "OVER_CAP_SHARE"
+
+    m.buy_piece("alice", 4 * TEZ, 0)
+    m.buy_piece("alice", TEZ, 0)
+    assert error(m.buy_piece, "alice", 1, 0) == "OVER_CAP_SHARE"
+    m.buy_piece("john", 4 * TEZ, 0)
+    assert error(m.buy_piece, "jane", 2 * TEZ, 0) == "OVER_PRICE"
+    m.buy_piece("jane", TEZ, 0)
+
+    assert m.get_piece(0)["closed"] is True
+    assert error(m.buy_piece, "jane", 1, 0) == "PIECE_CLOSED"
+    assert s.ledger[("alice", 0)] == 5 * TEZ
+    assert s.total_supply[0] == 10 * TEZ
+    assert m.get_pending_payout("bob") == 10 * TEZ
+
+    assert m.withdraw("bob") == 10 * TEZ
+    assert error(m.withdraw, "bob") == "NOTHING_TO_WITHDRAW"
+    assert m.balance == 0
+
+
+def test_buy_pieces_is_atomic():
+    d = listed()
+    m, s = d.market, d.share
+    before = (m.storage(), s.storage())
+    # second item over the cap once the first is counted
+    assert error(m.buy_pieces, "alice", 6 * TEZ, [(0, 3 * TEZ), (0, 3 * TEZ)]) == "OVER_CAP_SHARE"
+    assert error(m.buy_pieces, "alice", 3 * TEZ, [(0, TEZ), (0, TEZ)]) == "AMOUNT_MISMATCH"
+    assert error(m.buy_pieces, "alice", 0, []) == "SEND_TEZ"
+    assert (m.storage(), s.storage()) == before
+
+    m.buy_pieces("alice", 4 * TEZ, [(0, TEZ), (0, 3 * TEZ)])
+    assert m.get_user_contribution(0, "alice") == 4 * TEZ
+    assert s.ledger[("alice", 0)] == 4 * TEZ
+
+
+def test_failed_mint_reverts_the_buy():
+    d = listed()
+    d.share.admin = "someone-else"
+    before = d.market.storage()
+    assert error(d.market.buy_piece, "alice", TEZ, 0) == "NOT_ADMIN"
+    assert d.market.storage() == before
+
+
+def test_share_transfer_rules():
+    s = ShareModel("admin")
+    s.mint_batch("admin", [("alice", 0, 100), ("alice", 1, 10)])
+    assert error(s.mint, "alice", "alice", 0, 1) == "NOT_ADMIN"
+    assert error(s.mint, "admin", "alice", 0, 0) == "ZERO_MINT"
+    assert error(s.transfer, "bob", [("alice", [("bob", 0, 1)])]) == "NOT_OPERATOR"
+    assert error(s.update_operators, "bob", [("add_operator", "alice", "bob", 0)]) == "NOT_OWNER"
+
+    s.update_operators("alice", [("add_operator", "alice", "op", 0)])
+    # operator on token 0 only
+    assert error(s.transfer, "op", [("alice", [("bob", 0, 1), ("bob", 1, 1)])]) == "NOT_OPERATOR"
+    # in order: bob cannot spend what he receives later in the batch
+    before = s.storage()
+    assert error(s.transfer, "bob", [("bob", [("carol", 0, 5)])]) == "INSUFFICIENT_BALANCE"
+    assert error(s.transfer, "op", [("alice", [("bob", 0, 60), ("bob", 0, 60)])]) == "INSUFFICIENT_BALANCE"
+    assert s.storage() == before
+
+    s.transfer("op", [("alice", [("bob", 0, 60), ("carol", 0, 40)])])
+    assert s.get_balances([("alice", 0), ("bob", 0), ("carol", 0), ("dave", 9)]) == [
+        (("alice", 0), 0), (("bob", 0), 60), (("carol", 0), 40), (("dave", 9), 0)
+    ]
+    assert error(s.balance_of, [("dave", 9)]) == "FA2_TOKEN_UNDEFINED"
+
+
+def test_finalize_piece_prunes_closed_pieces():
+    d = listed()
+    m, s = d.market, d.share
+    m.buy_piece("alice", 5 * TEZ, 0)
+    assert error(m.finalize_piece, "jane", 0, ["alice"]) == "PIECE_OPEN"
+    assert error(m.finalize_piece, "jane", 3, ["alice"]) == "NO_PIECE"
+    m.buy_piece("john", 5 * TEZ, 0)
+    s.transfer("alice", [("alice", [("jane", 0, TEZ)])])
+    # not finalized yet: the recorded contributions answer
+    assert m.get_user_contribution(0, "alice") == 5 * TEZ
+    assert m.get_user_contribution(0, "jane") == 0
+
+    m.finalize_piece("jane", 0, ["alice", "dave"])
+    assert m.finalized == {0}
+    assert (0, "alice") not in m.contributions and (0, "john") in m.contributions
+    # finalized: the share balances answer for everyone, pruned or not
+    assert m.get_user_contribution(0, "alice") == 4 * TEZ
+    assert m.get_user_contribution(0, "jane") == TEZ
+    assert m.get_user_contribution(0, "john") == 5 * TEZ
+    s.transfer("john", [("john", [("alice", 0, 2 * TEZ)])])
+    assert m.get_user_contribution(0, "john") == 3 * TEZ
+    m.finalize_piece("jane", 0, ["john"])
+    assert m.contributions == {} and m.finalized == {0}
+
+
+def test_bulk_views_answer_unknown_ids_with_none():
+    d = listed()
+    m, s = d.market, d.share
+    m.create_piece_from_nft("bob", 0, "nft", 1, 4 * TEZ)
+    m.buy_piece("alice", 5 * TEZ, 0)
+    m.buy_piece("john", 5 * TEZ, 0)
+    s.transfer("alice", [("alice", [("jane", 0, TEZ)])])
+    m.finalize_piece("jane", 0, ["alice"])
+    m.buy_piece("alice", TEZ, 1)
+
+    assert m.get_collections([0, 4]) == [{"artist": "bob", "cap_percent": 50}, None]
+    assert m.get_pieces([1, 9, 0]) == [m.get_piece(1), None, m.get_piece(0)]
+    assert m.get_piece_range(1, 50) == [m.get_piece(1)]
+    assert m.get_piece_range(5, 10) == []
+    # finalized (share balance), recorded, no contribution, unknown
+    assert m.get_user_contributions("alice", [0, 1]) == [4 * TEZ, TEZ]
+    assert m.get_user_contributions("jane", [1, 0, 2]) == [0, TEZ, None]
+
+
+def test_sampler_is_reproducible_and_exercises_rejections():
+    def trace(seed):
+        d = Deployment()
+        return [(op.kind, op.sender, op.amount, repr(op.args), err) for op, err in run(d, Sampler(d, seed=seed), 3000)]
+
+    a = trace(5)
+    assert a == trace(5)
+    assert a != trace(6)
+    errors = {err for *_, err in a if err}
+    assert {"OVER_CAP_SHARE", "PIECE_CLOSED", "NOT_OPERATOR", "PIECE_OPEN"} <= errors
+    # most calls are valid
+    assert sum(1 for *_, err in a if err is None) > len(a) * 0.7
+
+
+def test_model_invariants_hold_at_scale():
+    d = Deployment()
+    run(d, Sampler(d, seed=11), 20000)
+    m, s = d.market, d.share
+    for pid, f in m.funding.items():
+        raised = sum(v for (p, _), v in m.contributions.items() if p == pid)
+        # finalize_piece drops entries of closed pieces
+        assert raised == f.total_raised <= f.price or f.closed and raised < f.total_raised
+        assert f.closed == (f.total_raised == f.price)
+        assert s.total_supply.get(pid, 0) == f.total_raised
+        assert sum(v for (_, t), v in s.ledger.items() if t == pid) == s.total_supply.get(pid, 0)
+    assert m.balance == sum(m.pending_payouts.values())
+
+
+def test_differential_scenario_source():
+    source, trace = scenario_source(seed=3, ops=200)
+    compile(source, "sim_replay.py", "exec")
+    assert len(trace) == 200
+    rejected = [(op, err) for op, err in trace if err]
+    assert rejected
+    op, err = rejected[0]
+    assert "exception=%r" % err in source
+    assert "market.data.next_piece_id ==" in source
+    assert "share.data.admin == market.address" in source
+    assert "market.get_user_contributions(" in source
+
+
+def test_deployment_apply_reports_errors():
+    d = Deployment()
+    assert d.apply(Op("market.create_collection", "bob", 0, (0,))) == "CAP_TOO_LOW"
+    assert d.apply(Op("market.create_collection", "bob", 0, (20,))) is None
+    assert d.apply(Op("market.buy_piece", "alice", TEZ, (0,))) == "NO_PIECE"
+
+
+def test_load_profile_sells_out_with_valid_calls_only():
+    profile = PROFILES["small"].replace(ops=5_000)
+    result = run_load(profile, seed=2, checkpoints=4)
+    assert result["checkpoints"] == run_load(profile, seed=2, checkpoints=4)["checkpoints"]
+    assert result["checkpoints"] != run_load(profile, seed=3, checkpoints=4)["checkpoints"]
+    last = result["checkpoints"][-1]
+    assert last["pieces_listed"] == last["pieces_closed"] == 40
+    assert last["big_maps"]["collections"] == 5
+    assert last["entries"] == sum(last["big_maps"].values())
+    # big_map sizes only grow, apart from the payouts withdraw deletes
+    for a, b in zip(result["checkpoints"], result["checkpoints"][1:]):
+        assert a["ops"] < b["ops"]
+        assert all(b["big_maps"][k] >= a["big_maps"][k] for k in a["big_maps"] if k != "pending_payouts")
+    kinds = set().union(*result["costs"])
+    assert {"market.buy_piece", "market.buy_pieces", "market.withdraw", "share.transfer"} <= kinds
+    assert result["costs"][0]["market.create_piece_from_nft"].summary()["new_entries_per_call"] == 2.0
+
+
+def test_one_percent_pieces_need_a_hundred_buyers():
+    profile = PROFILES["one_percent"].replace(collections=2, pieces=6, buyers=150, open_pieces=3, ops=10_000)
+    d = Deployment()
+    run_load(profile, deployment=d)
+    m = d.market
+    assert all(f.closed for f in m.funding.values()) and len(m.funding) == 6
+    for pid in m.funding:
+        assert len([k for k in m.contributions if k[0] == pid]) >= 100
+
+    with pytest.raises(ValueError):
+        Profile("too_few", buyers=100, caps=((1, 1),))
+
+
+def test_load_finalize_keeps_contributions_to_open_pieces():
+    profile = PROFILES["small"].replace(ops=5_000, finalize_batch=4)
+    d = Deployment()
+    result = run_load(profile, deployment=d)
+    assert result["checkpoints"][-1]["pieces_closed"] == 40
+    assert d.market.contributions == {}
+    assert "market.finalize_piece" in set().union(*result["costs"])
+    # the total footprint shrinks: one finalized entry per closed piece replaces its contributions
+    last = result["checkpoints"][-1]
+    unpruned = run_load(profile.replace(finalize_batch=0))["checkpoints"][-1]
+    assert last["big_maps"]["finalized"] == 40 and unpruned["big_maps"]["finalized"] == 0
+    assert last["entries"] == unpruned["entries"] - unpruned["big_maps"]["contributions"] + 40
+    assert last["entries"] < unpruned["entries"]
+
+
+def test_load_report_with_measured_calls():
+    def driver(op):
+        return {"gas": 2000.0 if op.kind.startswith("market.buy") else 1000.0, "storage_bytes": 70, "op_size": 200}
+
+    constants = {"hard_gas_limit_per_block": "2600000"}
+    rep = report(run_load(PROFILES["small"], seed=1, checkpoints=2, driver=driver), constants)
+    buy = rep["checkpoints"][0]["calls"]["market.buy_piece"]
+    assert buy["measured"] == buy["calls"]
+    assert buy["gas"] == buy["gas_max"] == 2000.0
+    assert buy["ops_per_block_by_gas"] == 1300
+    assert buy["ops_per_block_by_size"] == 512 * 1024 // 200
+    assert buy["ops_per_block"] == 1300
+    assert "ops_per_block" in format_report(rep)
+    assert capacity(0, 0, constants)["ops_per_block"] is None